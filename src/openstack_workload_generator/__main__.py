@@ -1,24 +1,34 @@
 #!/usr/bin/env python3
-import shutil
 import sys
 import os
 import argparse
 import logging
 import time
-from typing import Any
 
-import yaml
-from openstack.connection import Connection
-from openstack.config import loader
-
-from .entities import WorkloadGeneratorDomain
 from .entities.helpers import (
+    LOG_FORMATS,
     setup_logging,
     cloud_checker,
     item_checker,
+    listen_address_checker,
+    positive_int_checker,
+    regression_threshold_checker,
+    shard_list,
     Config,
-    iso_timestamp,
-    deep_merge_dict,
+)
+from .power import POWER_ACTIONS
+from .runner import (
+    aggregate,
+    compare,
+    coordination_run_id,
+    execute_coordinated,
+    execute_run,
+    execute_runs_in_processes,
+    serve_payloads,
+    start_capacity_samplers,
+    stop_capacity_samplers,
+    validate_profile,
+    write_results,
 )
 
 
@@ -30,12 +40,24 @@ parser.add_argument(
     "--log_level", metavar="loglevel", type=str, default="INFO", help="The loglevel"
 )
 
+parser.add_argument(
+    "--log_format",
+    type=str,
+    choices=LOG_FORMATS,
+    default="color",
+    help="The format of the log output, json writes one json document per line "
+    "with the ids of the affected resources as fields",
+)
+
 parser.add_argument(
     "--os_cloud",
     type=cloud_checker,
-    default=os.environ.get("OS_CLOUD", "admin"),
+    nargs="+",
+    default=[os.environ.get("OS_CLOUD", "admin")],
     help="The openstack config to use, defaults to the value of the OS_CLOUD "
-    'environment variable or "admin" if the variable is not set',
+    'environment variable or "admin" if the variable is not set. If more than one cloud is specified, '
+    "the workload is generated on all clouds in parallel and the results are merged "
+    "(inventory hosts and clouds.yaml entries are prefixed with the cloud name)",
 )
 
 parser.add_argument(
@@ -57,6 +79,34 @@ parser.add_argument(
     "(normally the provisioning only waits for machines which use floating ips)",
 )
 
+parser.add_argument(
+    "--measure_readiness",
+    action="store_true",
+    help="Probe the ssh port of all machines of the selected projects concurrently and report the time "
+    "until they are reachable (machines without a floating ip are probed by using the ssh proxy jump host)",
+)
+
+parser.add_argument(
+    "--check_ready_file",
+    action="store_true",
+    help="Also wait for the ready file written by the cloud init script when measuring the readiness, "
+    "this needs ssh login access to the machines",
+)
+
+parser.add_argument(
+    "--report_distribution",
+    action="store_true",
+    help="Report the number of machines per hypervisor and availability zone of the selected projects "
+    "and the imbalance of the distribution",
+)
+
+parser.add_argument(
+    "--metrics_file",
+    type=str,
+    nargs="?",
+    help="Write the collected timing metrics to the specified yaml file",
+)
+
 parser.add_argument(
     "--generate_clouds_yaml",
     type=str,
@@ -94,6 +144,103 @@ exclusive_group_domain.add_argument(
     help="A list of domains to be deleted, all child elements are recursively deleted",
 )
 
+exclusive_group_domain.add_argument(
+    "--sweep_domains",
+    type=item_checker,
+    nargs="+",
+    default=None,
+    metavar="DOMAINNAME",
+    help="Find all resources created by the tool for the specified domains by their tags "
+    "and delete them concurrently, use 'all' to sweep the resources of all domains",
+)
+
+exclusive_group_domain.add_argument(
+    "--validate",
+    action="store_true",
+    help="Only validate the profile specified by --config and render its templates with sample values, "
+    "no connection to a cloud is established",
+)
+
+exclusive_group_domain.add_argument(
+    "--serve_payloads",
+    type=listen_address_checker,
+    default=None,
+    metavar="[HOST:]PORT",
+    help="Serve the payload_scripts of the profile by http for the VMs until the tool is interrupted, "
+    "the profile is reloaded when it changes",
+)
+
+exclusive_group_domain.add_argument(
+    "--aggregate_results",
+    type=str,
+    default=None,
+    metavar="RESULTS_DIRECTORY",
+    help="Aggregate the benchmark results collected by --collect_results offline, the results are joined "
+    "with the metadata of the inventory specified by --ansible_inventory and the percentiles are "
+    "written to --metrics_file",
+)
+
+exclusive_group_domain.add_argument(
+    "--compare_metrics",
+    type=str,
+    nargs=2,
+    default=None,
+    metavar=("BASELINE_FILE", "CURRENT_FILE"),
+    help="Compare the metrics files written by --metrics_file of two runs offline, exits with 1 if the "
+    "median of a metric regressed significantly by more than --regression_threshold, "
+    "the comparison is written to --metrics_file",
+)
+
+parser.add_argument(
+    "--regression_threshold",
+    type=regression_threshold_checker,
+    nargs="+",
+    default=[],
+    metavar="[METRIC_PATTERN=]PERCENT",
+    help="The allowed relative change of the median of the metrics matching the (fnmatch) pattern "
+    "for --compare_metrics, the last matching threshold wins (default 10 for all metrics)",
+)
+
+parser.add_argument(
+    "--aggregate_by",
+    type=str,
+    choices=["hypervisor", "project", "domain"],
+    default="hypervisor",
+    help="Compute the percentiles of the aggregated results per hypervisor, project or domain",
+)
+
+parser.add_argument(
+    "--collect_results",
+    type=str,
+    default=None,
+    metavar="RESULTS_DIRECTORY",
+    help="Accept benchmark results of the VMs as json documents by http when serving the payload "
+    "scripts and store them in the specified directory",
+)
+
+parser.add_argument(
+    "--serve_duration",
+    type=positive_int_checker,
+    default=None,
+    metavar="SECONDS",
+    help="Stop serving the payload scripts after the specified number of seconds",
+)
+
+parser.add_argument(
+    "--run_tag",
+    type=item_checker,
+    default=None,
+    metavar="RUNNAME",
+    help="Tag all created resources additionally with this run name, "
+    "when sweeping only the resources of this run are deleted",
+)
+
+parser.add_argument(
+    "--dry_run",
+    action="store_true",
+    help="Only show the resources which would be deleted by --sweep_domains",
+)
+
 exclusive_group_project = parser.add_mutually_exclusive_group(required=False)
 
 exclusive_group_project.add_argument(
@@ -134,102 +281,179 @@ exclusive_group_machines.add_argument(
     help="A list of vms to be deleted in the created projects",
 )
 
-args = parser.parse_args()
-
-if args.os_cloud == "":
-    sys.exit(1)
-
-setup_logging(args.log_level)
-
-
-def establish_connection():
-    if args.clouds_yaml is None:
-        config = loader.OpenStackConfig()
-    else:
-        LOGGER.info(f"Loading connection configuration from {args.clouds_yaml}")
-        config = loader.OpenStackConfig(config_files=[args.clouds_yaml])
-    cloud_config = config.get_one(args.os_cloud)
-    return Connection(config=cloud_config)
-
-
-time_start = time.time()
-
-Config.load_config(args.config)
-Config.show_effective_config()
-
-if args.create_domains:
-    conn = establish_connection()
-    workload_domains: dict[str, WorkloadGeneratorDomain] = dict()
-    clouds_yaml_data: dict[str, dict[str, Any]] = dict()
-    for domain_name in args.create_domains:
-        domain = WorkloadGeneratorDomain(conn, domain_name)
-        domain.create_and_get_domain()
-        workload_domains[domain_name] = domain
-
-    if args.create_projects:
-        for workload_domain in workload_domains.values():
-            workload_domain.create_and_get_projects(args.create_projects)
-
-        for workload_domain in workload_domains.values():
-            for workload_project in workload_domain.get_projects(args.create_projects):
-                if args.create_machines:
-                    workload_project.get_and_create_machines(
-                        args.create_machines, args.wait_for_machines
-                    )
-                    if args.ansible_inventory:
-                        workload_project.dump_inventory_hosts(args.ansible_inventory)
-                    if args.generate_clouds_yaml:
-                        clouds_yaml_data[
-                            f"{workload_domain.domain_name}-{workload_project.project_name}"
-                        ] = workload_project.get_clouds_yaml_data()
-                elif args.delete_machines:
-                    for machine_obj in workload_project.get_machines(
-                        args.delete_machines
-                    ):
-                        machine_obj.delete_machine()
-
-        if args.generate_clouds_yaml:
-            LOGGER.info(f"Creating a clouds yaml : {args.generate_clouds_yaml}")
-            clouds_yaml_data_new = {"clouds": clouds_yaml_data}
-
-            if os.path.exists(args.generate_clouds_yaml):
-                with open(args.generate_clouds_yaml, "r") as file:
-                    existing_data = yaml.safe_load(file)
-                backup_file = f"{args.generate_clouds_yaml}_{iso_timestamp()}"
-                logging.warning(
-                    f"File {args.generate_clouds_yaml}, making an backup to {backup_file} and adding the new values"
-                )
-                shutil.copy2(
-                    args.generate_clouds_yaml,
-                    f"{args.generate_clouds_yaml}_{iso_timestamp()}",
-                )
-                clouds_yaml_data_new = deep_merge_dict(
-                    existing_data, clouds_yaml_data_new
-                )
-
-            with open(args.generate_clouds_yaml, "w") as file:
-                yaml.dump(
-                    clouds_yaml_data_new,
-                    file,
-                    default_flow_style=False,
-                    explicit_start=True,
-                )
-        sys.exit(0)
-    elif args.delete_projects:
-        conn = establish_connection()
-        for domain_name in args.create_domains:
-            domain_obj = WorkloadGeneratorDomain(conn, domain_name)
-            for project_obj in domain_obj.get_projects(args.delete_projects):
-                project_obj.delete_project()
-        sys.exit(0)
+exclusive_group_machines.add_argument(
+    "--power_action",
+    type=str,
+    choices=sorted(POWER_ACTIONS.keys()),
+    default=None,
+    help="Start, stop or hard reboot all vms in the selected projects concurrently and "
+    "wait until they reached the expected state",
+)
+
+parser.add_argument(
+    "--benchmark_tokens",
+    action="store_true",
+    help="Request project scoped tokens for the users of the selected projects with the rate "
+    "--token_rate, validate them and report the latency percentiles",
+)
+
+parser.add_argument(
+    "--token_requests",
+    type=positive_int_checker,
+    default=10,
+    metavar="NUMBER",
+    help="The number of tokens requested per project by --benchmark_tokens",
+)
+
+parser.add_argument(
+    "--token_rate",
+    type=positive_int_checker,
+    default=50,
+    metavar="REQUESTS_PER_SECOND",
+    help="The rate of the token requests of --benchmark_tokens, at most --concurrency requests "
+    "are executed in parallel",
+)
+
+parser.add_argument(
+    "--sample_capacity",
+    type=str,
+    default=None,
+    metavar="CSV_FILE",
+    help="Sample the hypervisor usage, the quota usage and the server states of the selected domains "
+    "and the network agent states in the background during the run and write them to the csv file "
+    "(one file per cloud, suffixed with the cloud name if more than one cloud is used)",
+)
+
+parser.add_argument(
+    "--sample_interval",
+    type=positive_int_checker,
+    default=30,
+    metavar="SECONDS",
+    help="The interval of --sample_capacity",
+)
+
+parser.add_argument(
+    "--concurrency",
+    type=positive_int_checker,
+    default=16,
+    help="The maximum number of concurrent api requests for bulk operations",
+)
+
+parser.add_argument(
+    "--workers",
+    type=positive_int_checker,
+    default=1,
+    help="Distribute the domains specified by --create_domains or --delete_domains to the "
+    "specified number of worker processes per cloud, every worker uses its own connection",
+)
+
+parser.add_argument(
+    "--coordination_queue",
+    type=str,
+    default=None,
+    metavar="SQLITE_FILE",
+    help="Coordinate multiple generator hosts by a shared work queue in the specified sqlite file "
+    "(e.g. on shared storage), every host claims the domains of all clouds one by one",
+)
+
+parser.add_argument(
+    "--coordination_lease",
+    type=positive_int_checker,
+    default=120,
+    metavar="SECONDS",
+    help="The lease time of a claimed domain, if a host does not renew the lease in time "
+    "the domain is handed to another host",
+)
+
+parser.add_argument(
+    "--coordination_run",
+    type=item_checker,
+    default=None,
+    metavar="RUN_ID",
+    help="The id of the coordinated run, all hosts of a run use the same id and a new id starts "
+    "a new run in the same queue file (defaults to --run_tag)",
+)
+
+parser.add_argument(
+    "--coordination_attempts",
+    type=positive_int_checker,
+    default=3,
+    metavar="ATTEMPTS",
+    help="The number of attempts for a domain of a coordinated run, a failed domain or a domain "
+    "whose lease expired is handed out again until the attempts are used up",
+)
+
+
+def main():
+    args = parser.parse_args()
+
+    if "" in args.os_cloud:
+        sys.exit(1)
+
+    setup_logging(args.log_level, args.log_format)
+
+    time_start = time.time()
+
+    Config.load_config(args.config)
+    Config.show_effective_config()
+
+    if args.validate:
+        sys.exit(validate_profile())
+
+    if args.aggregate_results:
+        sys.exit(aggregate(args))
+
+    if args.compare_metrics:
+        sys.exit(compare(args))
+
+    if args.coordination_queue and coordination_run_id(args) is None:
+        LOGGER.error(
+            "A coordinated run needs --coordination_run or --run_tag, "
+            "all hosts of the run have to use the same id"
+        )
+        sys.exit(1)
+
+    os_clouds = list(dict.fromkeys(args.os_cloud))
+    domain_names = (
+        args.create_domains or args.delete_domains or args.sweep_domains or []
+    )
+
+    jobs: list[tuple[str, list[str], str | None]] = [
+        (os_cloud, shard, os_cloud if len(os_clouds) > 1 else None)
+        for os_cloud in os_clouds
+        for shard in shard_list(domain_names, args.workers)
+    ]
+
+    samplers = start_capacity_samplers(args, os_clouds, domain_names)
+    try:
+        if args.serve_payloads:
+            result = serve_payloads(args)
+        elif args.coordination_queue:
+            LOGGER.info(
+                "Using the shared work queue %s for run %s",
+                args.coordination_queue,
+                coordination_run_id(args),
+            )
+            result = execute_coordinated(args, os_clouds, domain_names)
+        elif len(jobs) == 1:
+            result = execute_run(args, os_clouds[0], domain_names)
+        else:
+            LOGGER.info(
+                "Executing the workload generation for the clouds %s in %d worker processes",
+                ", ".join(os_clouds),
+                len(jobs),
+            )
+            result = execute_runs_in_processes(args, jobs)
+    finally:
+        capacity = stop_capacity_samplers(samplers)
+    result.merge(capacity)
+
+    write_results(args, result)
 
     duration = (time.time() - time_start) / 60
-    LOGGER.info(f"Execution finished after {int(duration)} minutes")
-elif args.delete_domains:
-    conn = establish_connection()
-    for domain_name in args.delete_domains:
-        domain_obj = WorkloadGeneratorDomain(conn, domain_name)
-        domain_obj.delete_domain()
-    sys.exit(0)
-
-sys.exit(0)
+    LOGGER.info("Execution finished after %d minutes", duration)
+    sys.exit(result.exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import csv
+import logging
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from openstack.connection import Connection
+
+LOGGER = logging.getLogger()
+
+# The server states with their own column, all other states are counted as "other"
+SERVER_STATES = ("ACTIVE", "BUILD", "ERROR", "SHUTOFF")
+
+# The attributes of the hypervisors and the columns of their sums
+HYPERVISOR_FIELDS = {
+    "vcpus": "hypervisor_vcpus",
+    "vcpus_used": "hypervisor_vcpus_used",
+    "memory_size": "hypervisor_memory_mb",
+    "memory_used": "hypervisor_memory_used_mb",
+}
+
+CAPACITY_COLUMNS = (
+    "timestamp",
+    "elapsed",
+    *HYPERVISOR_FIELDS.values(),
+    *(f"servers_{state.lower()}" for state in SERVER_STATES),
+    "servers_other",
+    "quota_instances_used",
+    "quota_cores_used",
+    "quota_ram_used_mb",
+    "network_agents_alive",
+    "network_agents_down",
+)
+
+
+class CapacitySampler:
+    # Samples the state of the cloud in a background thread with a fixed number of list calls per
+    # interval: the hypervisors, the tagged servers, the network agents and the quota usage of
+    # quota_projects_per_sample projects (round robin, the totals use the last known usage of the
+    # other projects). The samples are kept in a ring buffer which is appended to the csv file
+    # when it is full and when the sampler is stopped.
+
+    def __init__(
+        self,
+        conn: "Connection",
+        tags: list[str],
+        filename: str,
+        interval: float,
+        buffer_size: int = 60,
+        quota_projects_per_sample: int = 2,
+    ):
+        self.conn = conn
+        self.any_tags = ",".join(tags)
+        self.filename = filename
+        self.interval = interval
+        self.quota_projects_per_sample = quota_projects_per_sample
+        self.buffer: deque[dict[str, Any]] = deque(maxlen=buffer_size)
+        self.peaks: dict[str, float] = dict()
+        self.durations: list[float] = []
+        self._project_ids: list[str] = []
+        self._quota_usage: dict[str, dict[str, int]] = dict()
+        self._next_project = 0
+        self._header_written = False
+        self._started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="capacity-sampler", daemon=True
+        )
+
+    def start(self):
+        LOGGER.info(
+            "Sampling the cloud capacity every %s seconds to %s",
+            self.interval,
+            self.filename,
+        )
+        self._started = time.monotonic()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.buffer.append(self.sample())
+            except Exception as e:
+                LOGGER.warning("Unable to sample the cloud capacity: %s", e)
+            self.durations.append(time.monotonic() - started)
+            if len(self.buffer) == self.buffer.maxlen:
+                self.flush()
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def _sample_hypervisors(self, row: dict[str, Any]):
+        # Newer compute microversions do not report the usage, the columns stay empty then
+        for column in HYPERVISOR_FIELDS.values():
+            row[column] = None
+        for hypervisor in self.conn.compute.hypervisors(details=True):
+            for field, column in HYPERVISOR_FIELDS.items():
+                value = getattr(hypervisor, field, None)
+                if value is not None:
+                    row[column] = (row[column] or 0) + value
+
+    def _sample_servers(self, row: dict[str, Any]):
+        counts = dict.fromkeys(SERVER_STATES, 0)
+        other = 0
+        for server in self.conn.compute.servers(
+            all_projects=True, any_tags=self.any_tags
+        ):
+            if server.status in counts:
+                counts[server.status] += 1
+            else:
+                other += 1
+        for state, count in counts.items():
+            row[f"servers_{state.lower()}"] = count
+        row["servers_other"] = other
+
+    def _sample_quota_usage(self, row: dict[str, Any]):
+        # The project list is refreshed when the round robin starts again
+        if self._next_project >= len(self._project_ids):
+            self._project_ids = [
+                project.id
+                for project in self.conn.identity.projects(any_tags=self.any_tags)
+            ]
+            self._next_project = 0
+            self._quota_usage = {
+                project_id: usage
+                for project_id, usage in self._quota_usage.items()
+                if project_id in self._project_ids
+            }
+        start = self._next_project
+        end = start + self.quota_projects_per_sample
+        for project_id in self._project_ids[start:end]:
+            quota_set = self.conn.compute.get_quota_set(project_id, usage=True)
+            self._quota_usage[project_id] = quota_set.usage or {}
+        self._next_project = end
+
+        for key, column in (
+            ("instances", "quota_instances_used"),
+            ("cores", "quota_cores_used"),
+            ("ram", "quota_ram_used_mb"),
+        ):
+            row[column] = sum(usage.get(key, 0) for usage in self._quota_usage.values())
+
+    def _sample_network_agents(self, row: dict[str, Any]):
+        alive = down = 0
+        for agent in self.conn.network.agents():
+            if agent.is_alive:
+                alive += 1
+            else:
+                down += 1
+        row["network_agents_alive"] = alive
+        row["network_agents_down"] = down
+
+    def sample(self) -> dict[str, Any]:
+        row: dict[str, Any] = {
+            "timestamp": round(time.time(), 1),
+            "elapsed": round(time.monotonic() - self._started, 1),
+        }
+        self._sample_hypervisors(row)
+        self._sample_servers(row)
+        self._sample_quota_usage(row)
+        self._sample_network_agents(row)
+        for column, value in row.items():
+            if value is not None and column not in ("timestamp", "elapsed"):
+                self.peaks[column] = max(self.peaks.get(column, value), value)
+        return row
+
+    def flush(self):
+        if not self.buffer:
+            return
+        with open(self.filename, "a" if self._header_written else "w") as file:
+            writer = csv.DictWriter(file, fieldnames=CAPACITY_COLUMNS)
+            if not self._header_written:
+                writer.writeheader()
+                self._header_written = True
+            while self.buffer:
+                writer.writerow(self.buffer.popleft())
+
+    def metrics(self) -> dict[str, list[float]]:
+        # The sampler runs beside the workers, its metrics are merged into the result afterwards
+        metrics = {
+            f"capacity_peak_{column}": [value] for column, value in self.peaks.items()
+        }
+        if self.durations:
+            metrics["capacity_sample"] = list(self.durations)
+        return metrics
+
+    def log_peaks(self):
+        if not self.peaks:
+            LOGGER.warning("No capacity samples were collected")
+            return
+        utilization = []
+        for used, total, name in (
+            ("hypervisor_vcpus_used", "hypervisor_vcpus", "vcpus"),
+            ("hypervisor_memory_used_mb", "hypervisor_memory_mb", "memory"),
+        ):
+            if self.peaks.get(total):
+                utilization.append(
+                    f"{name}={100 * self.peaks.get(used, 0) / self.peaks[total]:.1f}%"
+                )
+        LOGGER.info(
+            "Peak cloud capacity: %s%s",
+            " ".join(f"{column}={value:g}" for column, value in self.peaks.items()),
+            f", peak utilization: {' '.join(utilization)}" if utilization else "",
+        )
@@ -0,0 +1,157 @@
+import fnmatch
+import logging
+import math
+from dataclasses import asdict, dataclass
+
+import yaml
+
+from .metrics import mann_whitney_p_value, percentile
+
+LOGGER = logging.getLogger()
+
+# A difference is only considered a regression if it is significant on this level
+SIGNIFICANCE_LEVEL = 0.05
+
+# Metrics with fewer samples in one of the runs are reported, but not tested
+MIN_SAMPLES = 5
+
+# For these metrics (throughputs) a lower value is a regression, for all others a higher value
+HIGHER_IS_BETTER_SUFFIXES = ("_per_s",)
+
+
+@dataclass(frozen=True, slots=True)
+class MetricComparison:
+    name: str
+    baseline_count: int
+    current_count: int
+    baseline_p50: float
+    current_p50: float
+    baseline_p95: float
+    current_p95: float
+    p50_change: float
+    p95_change: float
+    p_value: float | None
+    threshold: float
+    verdict: str
+
+
+def load_metrics_samples(filename: str) -> dict[str, list[float]]:
+    # Reads the samples of a file written by --metrics_file
+    with open(filename) as file:
+        data = yaml.safe_load(file)
+    if not isinstance(data, dict) or not isinstance(data.get("samples"), dict):
+        raise ValueError(f"{filename} is not a metrics file written by --metrics_file")
+    return {
+        str(name): [float(value) for value in values]
+        for name, values in data["samples"].items()
+        if values
+    }
+
+
+def _change(baseline: float, current: float) -> float:
+    # The relative change in percent
+    if baseline == 0:
+        return 0.0 if current == 0 else math.copysign(math.inf, current)
+    return 100 * (current - baseline) / abs(baseline)
+
+
+def threshold_for(name: str, thresholds: list[tuple[str, float]]) -> float:
+    # The last matching pattern wins, specific patterns are specified after general ones
+    result = math.inf
+    for pattern, threshold in thresholds:
+        if fnmatch.fnmatchcase(name, pattern):
+            result = threshold
+    return result
+
+
+def compare_metric(
+    name: str, baseline: list[float], current: list[float], threshold: float
+) -> MetricComparison:
+    baseline_p50, current_p50 = percentile(baseline, 50), percentile(current, 50)
+    p50_change = _change(baseline_p50, current_p50)
+    worse = -p50_change if name.endswith(HIGHER_IS_BETTER_SUFFIXES) else p50_change
+
+    p_value: float | None = None
+    if min(len(baseline), len(current)) < MIN_SAMPLES:
+        verdict = "too few samples"
+    else:
+        p_value = mann_whitney_p_value(baseline, current)
+        if p_value >= SIGNIFICANCE_LEVEL:
+            verdict = "unchanged"
+        elif worse > threshold:
+            verdict = "regressed"
+        elif worse < 0:
+            verdict = "improved"
+        else:
+            verdict = "within threshold"
+
+    baseline_p95, current_p95 = percentile(baseline, 95), percentile(current, 95)
+    return MetricComparison(
+        name=name,
+        baseline_count=len(baseline),
+        current_count=len(current),
+        baseline_p50=baseline_p50,
+        current_p50=current_p50,
+        baseline_p95=baseline_p95,
+        current_p95=current_p95,
+        p50_change=p50_change,
+        p95_change=_change(baseline_p95, current_p95),
+        p_value=p_value,
+        threshold=threshold,
+        verdict=verdict,
+    )
+
+
+def compare_runs(
+    baseline: dict[str, list[float]],
+    current: dict[str, list[float]],
+    thresholds: list[tuple[str, float]],
+) -> list[MetricComparison]:
+    for name in sorted(baseline.keys() ^ current.keys()):
+        LOGGER.warning(
+            "Metric %s only exists in the %s run",
+            name,
+            "baseline" if name in baseline else "current",
+        )
+    return [
+        compare_metric(
+            name, baseline[name], current[name], threshold_for(name, thresholds)
+        )
+        for name in sorted(baseline.keys() & current.keys())
+    ]
+
+
+def log_comparisons(comparisons: list[MetricComparison]):
+    message = (
+        "Metric %s: p50 %.3f -> %.3f (%+.1f%%), p95 %.3f -> %.3f (%+.1f%%), "
+        "samples %d/%d, %s%s"
+    )
+    for comparison in comparisons:
+        args = (
+            comparison.name,
+            comparison.baseline_p50,
+            comparison.current_p50,
+            comparison.p50_change,
+            comparison.baseline_p95,
+            comparison.current_p95,
+            comparison.p95_change,
+            comparison.baseline_count,
+            comparison.current_count,
+            (f"p={comparison.p_value:.4f}, " if comparison.p_value is not None else ""),
+            comparison.verdict,
+        )
+        if comparison.verdict == "regressed":
+            LOGGER.error(message + " (threshold %g%%)", *args, comparison.threshold)
+        else:
+            LOGGER.info(message, *args)
+
+
+def write_comparisons(filename: str, comparisons: list[MetricComparison]):
+    LOGGER.info("Writing the comparison to %s", filename)
+    with open(filename, "w") as file:
+        yaml.dump(
+            {comparison.name: asdict(comparison) for comparison in comparisons},
+            file,
+            default_flow_style=False,
+            explicit_start=True,
+        )
@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+LOGGER = logging.getLogger()
+
+SHARD_PENDING = "pending"
+SHARD_CLAIMED = "claimed"
+SHARD_DONE = "done"
+SHARD_FAILED = "failed"
+
+
+class LeaseLost(RuntimeError):
+    pass
+
+
+class Shard:
+
+    def __init__(self, shard_id: int, os_cloud: str, domain_name: str):
+        self.shard_id = shard_id
+        self.os_cloud = os_cloud
+        self.domain_name = domain_name
+
+    def __str__(self) -> str:
+        return f"shard {self.shard_id} ({self.os_cloud}/{self.domain_name})"
+
+
+# A work queue in a sqlite database which can be placed on storage shared by multiple generator hosts.
+# A claimed shard is leased to its owner, the owner has to renew the lease by heartbeats,
+# otherwise the shard is handed out to the next host asking for work. The shards belong to a run,
+# all hosts of a run use the same run id and a queue file can be reused for the next run.
+# A failed shard or a shard whose lease expired is handed out again until max_attempts is reached.
+class WorkQueue:
+
+    def __init__(
+        self,
+        filename: str,
+        run_id: str,
+        owner: str | None = None,
+        max_attempts: int = 3,
+    ):
+        self.filename = filename
+        self.run_id = run_id
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}"
+        self.max_attempts = max_attempts
+        with self._transaction() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS shards ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " run_id TEXT NOT NULL,"
+                " os_cloud TEXT NOT NULL,"
+                " domain_name TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " owner TEXT,"
+                " lease_expires REAL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " result TEXT,"
+                " UNIQUE (run_id, os_cloud, domain_name))"
+            )
+            columns = [row[1] for row in db.execute("PRAGMA table_info(shards)")]
+            if "run_id" not in columns:
+                raise RuntimeError(
+                    f"The work queue {filename} was created by an older version, use a new file"
+                )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        db = sqlite3.connect(self.filename, timeout=60, isolation_level=None)
+        try:
+            # Take the write lock immediately to serialize the claims of concurrent hosts
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        finally:
+            db.close()
+
+    def add_shards(self, os_clouds: list[str], domain_names: list[str]):
+        # All hosts of a run add the same shards, only the first one creates them
+        with self._transaction() as db:
+            for os_cloud in os_clouds:
+                for domain_name in domain_names:
+                    db.execute(
+                        "INSERT OR IGNORE INTO shards (run_id, os_cloud, domain_name, status) "
+                        "VALUES (?, ?, ?, ?)",
+                        (self.run_id, os_cloud, domain_name, SHARD_PENDING),
+                    )
+
+    def claim(self, lease_seconds: float) -> Shard | None:
+        now = time.time()
+        with self._transaction() as db:
+            # A shard whose owners died max_attempts times is not handed out again
+            expired = db.execute(
+                "UPDATE shards SET status = ?, owner = NULL, lease_expires = NULL "
+                "WHERE run_id = ? AND status = ? AND lease_expires < ? AND attempts >= ?",
+                (SHARD_FAILED, self.run_id, SHARD_CLAIMED, now, self.max_attempts),
+            ).rowcount
+            row = db.execute(
+                "SELECT id, os_cloud, domain_name, owner, attempts FROM shards "
+                "WHERE run_id = ? AND (status = ? OR (status = ? AND lease_expires < ?)) "
+                "ORDER BY id LIMIT 1",
+                (self.run_id, SHARD_PENDING, SHARD_CLAIMED, now),
+            ).fetchone()
+            if row is not None:
+                db.execute(
+                    "UPDATE shards SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                    "WHERE id = ?",
+                    (SHARD_CLAIMED, self.owner, now + lease_seconds, row[0]),
+                )
+        if expired:
+            LOGGER.error(
+                "%d shards failed, their leases expired %d times",
+                expired,
+                self.max_attempts,
+            )
+        if row is None:
+            return None
+        shard_id, os_cloud, domain_name, previous_owner, attempts = row
+        shard = Shard(shard_id, os_cloud, domain_name)
+        if previous_owner:
+            LOGGER.warning("Took over %s from %s, lease expired", shard, previous_owner)
+        LOGGER.info(
+            "Claimed %s as %s (attempt %d/%d)",
+            shard,
+            self.owner,
+            attempts + 1,
+            self.max_attempts,
+        )
+        return shard
+
+    def heartbeat(self, shard: Shard, lease_seconds: float) -> bool:
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE shards SET lease_expires = ? WHERE id = ? AND owner = ? AND status = ?",
+                (
+                    time.time() + lease_seconds,
+                    shard.shard_id,
+                    self.owner,
+                    SHARD_CLAIMED,
+                ),
+            )
+            return cursor.rowcount == 1
+
+    def finish(self, shard: Shard, status: str, result: dict | None = None) -> bool:
+        # A failed shard is handed out again if attempts are left
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT attempts FROM shards WHERE id = ? AND owner = ? AND status = ?",
+                (shard.shard_id, self.owner, SHARD_CLAIMED),
+            ).fetchone()
+            if row is None:
+                return False
+            retry = status == SHARD_FAILED and row[0] < self.max_attempts
+            db.execute(
+                "UPDATE shards SET status = ?, owner = ?, result = ?, lease_expires = NULL WHERE id = ?",
+                (
+                    SHARD_PENDING if retry else status,
+                    None if retry else self.owner,
+                    (
+                        json.dumps(result, sort_keys=True)
+                        if result is not None and not retry
+                        else None
+                    ),
+                    shard.shard_id,
+                ),
+            )
+        if retry:
+            LOGGER.warning(
+                "Returning %s to the queue for another attempt (%d/%d failed)",
+                shard,
+                row[0],
+                self.max_attempts,
+            )
+        return True
+
+    def unfinished(self) -> int:
+        with self._transaction() as db:
+            return db.execute(
+                "SELECT COUNT(*) FROM shards WHERE run_id = ? AND status IN (?, ?)",
+                (self.run_id, SHARD_PENDING, SHARD_CLAIMED),
+            ).fetchone()[0]
+
+    def results(self) -> list[tuple[Shard, str, dict | None]]:
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT id, os_cloud, domain_name, status, result FROM shards "
+                "WHERE run_id = ? ORDER BY id",
+                (self.run_id,),
+            ).fetchall()
+        return [
+            (
+                Shard(shard_id, os_cloud, domain_name),
+                status,
+                json.loads(result) if result else None,
+            )
+            for shard_id, os_cloud, domain_name, status, result in rows
+        ]
+
+
+class LeaseKeeper(threading.Thread):
+
+    def __init__(self, queue: WorkQueue, shard: Shard, lease_seconds: float):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.shard = shard
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        # The lease also expires if the heartbeats fail, e.g. when the shared storage is unavailable
+        self.expires = time.time() + lease_seconds
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.lease_seconds / 3):
+            renewed = time.time() + self.lease_seconds
+            try:
+                if not self.queue.heartbeat(self.shard, self.lease_seconds):
+                    LOGGER.error("Lost the lease of %s", self.shard)
+                    self.lost = True
+                    return
+                self.expires = renewed
+            except sqlite3.Error as e:
+                LOGGER.warning("Unable to renew the lease of %s: %s", self.shard, e)
+
+    def check(self):
+        # Called between the stages of the run, another host may already work on the shard
+        if self.lost or time.time() > self.expires:
+            self.lost = True
+            raise LeaseLost(f"Lost the lease of {self.shard}, aborting")
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
@@ -0,0 +1,92 @@
+import logging
+import math
+
+from openstack.connection import Connection
+
+from .entities.project import WorkloadGeneratorProject
+from .metrics import Metrics
+
+LOGGER = logging.getLogger()
+
+
+def imbalance(counts: dict[str, int]) -> dict[str, float]:
+    # max/mean is 1.0 for a perfectly even distribution, the coefficient of variation 0.0
+    values = list(counts.values())
+    if not values:
+        return {}
+    mean = sum(values) / len(values)
+    if mean == 0:
+        return {}
+    stddev = math.sqrt(sum((value - mean) ** 2 for value in values) / len(values))
+    return {
+        "max_to_mean": max(values) / mean,
+        "coefficient_of_variation": stddev / mean,
+        "unused": float(values.count(0)),
+    }
+
+
+def _log_counts(kind: str, counts: dict[str, int]):
+    width = max(len(name) for name in counts)
+    LOGGER.info(
+        "Machines per %s:\n%s",
+        kind,
+        "\n".join(
+            f"{name.ljust(width)}  {count}"
+            for name, count in sorted(
+                counts.items(), key=lambda item: (-item[1], item[0])
+            )
+        ),
+    )
+    stats = imbalance(counts)
+    if stats:
+        LOGGER.info(
+            "Distribution over %d %ss: max/mean=%.2f, coefficient of variation=%.2f, "
+            "without machines=%d",
+            len(counts),
+            kind,
+            stats["max_to_mean"],
+            stats["coefficient_of_variation"],
+            stats["unused"],
+        )
+    for count in counts.values():
+        Metrics.record(f"machines_per_{kind}", count)
+    for name, value in stats.items():
+        Metrics.record(f"{kind}_distribution_{name}", value)
+
+
+def report_distribution(
+    conn: Connection, projects: list[WorkloadGeneratorProject]
+) -> dict[str, dict[str, int]]:
+    # The servers are fetched again, the hypervisor is only known after the scheduling
+    hypervisors: dict[str, int] = dict()
+    try:
+        for hypervisor in conn.compute.hypervisors():
+            hypervisors[hypervisor.name] = 0
+    except Exception as e:
+        LOGGER.warning(
+            "Unable to list the hypervisors, hypervisors without machines are not reported: %s",
+            e,
+        )
+    zones: dict[str, int] = dict()
+    unscheduled = 0
+
+    for project in projects:
+        for server in project.list_servers():
+            if not server.hypervisor:
+                unscheduled += 1
+                continue
+            hypervisors[server.hypervisor] = hypervisors.get(server.hypervisor, 0) + 1
+            zone = server.availability_zone or "unknown"
+            zones[zone] = zones.get(zone, 0) + 1
+
+    if unscheduled:
+        LOGGER.warning(
+            "%d machines are not scheduled to a hypervisor and not part of the report",
+            unscheduled,
+        )
+    if not zones:
+        LOGGER.warning("No scheduled machines found for the distribution report")
+        return {}
+    _log_counts("hypervisor", hypervisors)
+    _log_counts("availability_zone", zones)
+    return {"hypervisors": hypervisors, "availability_zones": zones}
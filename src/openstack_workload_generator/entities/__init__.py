@@ -1,5 +1,34 @@
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
 from .helpers import setup_logging, cloud_checker, item_checker, Config
-from .domain import WorkloadGeneratorDomain
-from .project import WorkloadGeneratorProject
-from .network import WorkloadGeneratorNetwork
-from .user import WorkloadGeneratorUser
+
+if TYPE_CHECKING:
+    from .domain import WorkloadGeneratorDomain
+    from .project import WorkloadGeneratorProject
+    from .network import WorkloadGeneratorNetwork
+    from .user import WorkloadGeneratorUser
+
+# The entities import openstacksdk which takes the major part of the startup time,
+# they are imported on first access, --help and the offline modes never load the sdk
+_LAZY_EXPORTS = {
+    "WorkloadGeneratorDomain": ".domain",
+    "WorkloadGeneratorProject": ".project",
+    "WorkloadGeneratorNetwork": ".network",
+    "WorkloadGeneratorUser": ".user",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(_LAZY_EXPORTS[name], __name__), name)
+
+
+__all__ = [
+    "setup_logging",
+    "cloud_checker",
+    "item_checker",
+    "Config",
+    *_LAZY_EXPORTS,
+]
@@ -0,0 +1,75 @@
+import bisect
+import ipaddress
+from typing import Iterable
+
+IPv4Network = ipaddress.IPv4Network
+
+
+def ipv4_network(value: str) -> IPv4Network:
+    try:
+        return ipaddress.IPv4Network(value)
+    except ValueError as e:
+        raise ValueError(f"{value} is not a valid ipv4 network: {e}")
+
+
+class CidrAllocator:
+    # Carves subnets with a fixed prefix length from a supernet in ascending order.
+    # The candidates are computed by their index and the used ranges are merged intervals
+    # of indexes, allocating thousands of subnets never enumerates the supernet.
+
+    def __init__(
+        self, supernet: str, prefix_length: int, used: Iterable[str] = ()
+    ) -> None:
+        self.supernet = ipv4_network(supernet)
+        if not self.supernet.prefixlen <= prefix_length <= 32:
+            raise ValueError(
+                f"The prefix length {prefix_length} does not fit into {self.supernet}"
+            )
+        self.prefix_length = prefix_length
+        self._size = 1 << (32 - prefix_length)
+        self._capacity = 1 << (prefix_length - self.supernet.prefixlen)
+        self._next = 0
+        self._starts: list[int] = []
+        self._ends: list[int] = []
+        for network in used:
+            self.reserve(network)
+
+    def reserve(self, network: str):
+        # Blocks all candidates overlapping the network, e.g. existing subnets
+        reserved = ipaddress.ip_network(network, strict=False)
+        if reserved.version != 4 or not reserved.overlaps(self.supernet):
+            return
+        base = int(self.supernet.network_address)
+        first = (max(int(reserved.network_address), base) - base) // self._size
+        last = (
+            min(int(reserved.broadcast_address), int(self.supernet.broadcast_address))
+            - base
+        ) // self._size
+
+        # Merge with the overlapping or adjacent intervals
+        index = bisect.bisect_left(self._ends, first - 1)
+        while index < len(self._starts) and self._starts[index] <= last + 1:
+            first = min(first, self._starts[index])
+            last = max(last, self._ends[index])
+            del self._starts[index]
+            del self._ends[index]
+        self._starts.insert(index, first)
+        self._ends.insert(index, last)
+
+    def allocate(self) -> IPv4Network:
+        while self._next < self._capacity:
+            index = bisect.bisect_right(self._starts, self._next) - 1
+            if index >= 0 and self._ends[index] >= self._next:
+                self._next = self._ends[index] + 1
+                continue
+            candidate = IPv4Network(
+                (
+                    int(self.supernet.network_address) + self._next * self._size,
+                    self.prefix_length,
+                )
+            )
+            self._next += 1
+            return candidate
+        raise RuntimeError(
+            f"No free /{self.prefix_length} subnet left in {self.supernet}"
+        )
@@ -0,0 +1,184 @@
+import logging
+import time
+from typing import Any
+
+from openstack.connection import Connection
+
+from .helpers import Config, ProjectCache, ResourceIdCache
+from .records import ProjectRecord, ResourceRecord
+from .settings import DEFAULT_MACHINE_CLASS, MachineClass
+from ..metrics import Metrics
+
+LOGGER = logging.getLogger()
+
+# image: ephemeral disk from the image on the hypervisor
+# volume: nova creates a volume from the image for every server
+# golden_volume: the tool clones a prepared bootable volume of the project for every server
+# golden_snapshot: nova creates a volume from a snapshot of the prepared bootable volume for every server
+
+
+class WorkloadGeneratorBootSource:
+    # Cinder clones volumes and creates volumes from snapshots only within the project
+    # of the source, therefore the golden volume is prepared per project
+
+    def __init__(
+        self, conn: Connection, project: ProjectRecord, machine_class: MachineClass
+    ):
+        self.conn = conn
+        self.project = project
+        self.machine_class = machine_class
+        self.strategy = machine_class.boot_source
+        # The golden volumes of other machine classes are created from other images
+        suffix = (
+            ""
+            if machine_class.name == DEFAULT_MACHINE_CLASS
+            else f"-{machine_class.name}"
+        )
+        self.golden_volume_name = f"golden-volume-{project.name}{suffix}"
+        self.golden_snapshot_name = f"golden-snapshot-{project.name}{suffix}"
+        self.obj_golden_volume: ResourceRecord | None = None
+        self.obj_golden_snapshot: ResourceRecord | None = None
+        # The root volumes cloned in advance by clone_golden_volumes, by machine name
+        self.root_volumes: dict[str, str] = dict()
+
+    def log_fields(self, **resource_ids: str) -> dict[str, str]:
+        return {
+            "project_id": self.project.id,
+            "domain_id": self.project.domain_id,
+            **resource_ids,
+        }
+
+    @property
+    def image_id(self) -> str:
+        return ResourceIdCache.image_id(self.conn, self.machine_class.image)
+
+    def _wait_for_available(self, resource: Any):
+        self.conn.block_storage.wait_for_status(
+            resource,
+            status="available",
+            failures=["error"],
+            wait=Config.settings().vm.wait_for_server_timeout,
+        )
+
+    def _create_golden_volume(self) -> ResourceRecord:
+        volume = self.conn.block_storage.find_volume(self.golden_volume_name)
+        if volume:
+            # A golden volume of an interrupted run may still be downloading the image
+            if volume.status != "available":
+                self._wait_for_available(volume)
+            return ResourceRecord.from_resource(volume)
+
+        started = time.monotonic()
+        volume = self.conn.block_storage.create_volume(
+            name=self.golden_volume_name,
+            size=self.machine_class.volume_size_gb,
+            image_id=self.image_id,
+            description="Auto generated boot source",
+        )
+        self._wait_for_available(volume)
+        Metrics.record("golden_volume_creation", time.monotonic() - started)
+        LOGGER.info(
+            "Created golden volume %s/%s in %s",
+            volume.name,
+            volume.id,
+            ProjectCache.lazy_ident(self.project.id),
+            extra=self.log_fields(volume_id=volume.id),
+        )
+        return ResourceRecord.from_resource(volume)
+
+    def _create_golden_snapshot(self, volume: ResourceRecord) -> ResourceRecord:
+        snapshot = self.conn.block_storage.find_snapshot(self.golden_snapshot_name)
+        if snapshot:
+            if snapshot.status != "available":
+                self._wait_for_available(snapshot)
+            return ResourceRecord.from_resource(snapshot)
+
+        snapshot = self.conn.block_storage.create_snapshot(
+            name=self.golden_snapshot_name,
+            volume_id=volume.id,
+            description="Auto generated boot source",
+        )
+        self._wait_for_available(snapshot)
+        LOGGER.info(
+            "Created golden snapshot %s/%s in %s",
+            snapshot.name,
+            snapshot.id,
+            ProjectCache.lazy_ident(self.project.id),
+            extra=self.log_fields(snapshot_id=snapshot.id),
+        )
+        return ResourceRecord.from_resource(snapshot)
+
+    def create_and_get_boot_source(self):
+        if self.strategy not in ("golden_volume", "golden_snapshot"):
+            return
+        if self.obj_golden_volume is None:
+            self.obj_golden_volume = self._create_golden_volume()
+        if self.strategy == "golden_snapshot" and self.obj_golden_snapshot is None:
+            self.obj_golden_snapshot = self._create_golden_snapshot(
+                self.obj_golden_volume
+            )
+
+    def _request_clone(self, machine_name: str) -> Any:
+        if self.obj_golden_volume is None:
+            raise RuntimeError("The golden volume is not created")
+        return self.conn.block_storage.create_volume(
+            name=f"{machine_name}-root",
+            size=self.machine_class.volume_size_gb,
+            source_volume_id=self.obj_golden_volume.id,
+            description="Auto generated",
+        )
+
+    def clone_golden_volumes(self, machine_names: list[str]):
+        # All clones are requested before waiting for the first one, cinder clones them in
+        # parallel instead of one after another during the creation of the servers
+        if self.strategy != "golden_volume" or not machine_names:
+            return
+        started = time.monotonic()
+        volumes = [
+            (machine_name, self._request_clone(machine_name))
+            for machine_name in machine_names
+        ]
+        for machine_name, volume in volumes:
+            self._wait_for_available(volume)
+            Metrics.record("golden_volume_clone", time.monotonic() - started)
+            self.root_volumes[machine_name] = volume.id
+        LOGGER.info(
+            "Cloned %d root volumes from the golden volume in %s",
+            len(volumes),
+            ProjectCache.lazy_ident(self.project.id),
+            extra=self.log_fields(),
+        )
+
+    def _clone_golden_volume(self, machine_name: str) -> str:
+        if machine_name in self.root_volumes:
+            return self.root_volumes.pop(machine_name)
+        started = time.monotonic()
+        volume = self._request_clone(machine_name)
+        self._wait_for_available(volume)
+        Metrics.record("golden_volume_clone", time.monotonic() - started)
+        return volume.id
+
+    def server_arguments(self, machine_name: str) -> dict[str, Any]:
+        # The arguments of create_server which define the root disk of a server
+        if self.strategy == "image":
+            return {"image_id": self.image_id}
+
+        root_disk: dict[str, Any] = {
+            "boot_index": 0,
+            "destination_type": "volume",
+            "volume_size": self.machine_class.volume_size_gb,
+            "delete_on_termination": True,
+        }
+        if self.strategy == "volume":
+            root_disk.update(source_type="image", uuid=self.image_id)
+        elif self.strategy == "golden_volume":
+            root_disk.update(
+                source_type="volume", uuid=self._clone_golden_volume(machine_name)
+            )
+        elif self.strategy == "golden_snapshot":
+            if self.obj_golden_snapshot is None:
+                raise RuntimeError("The golden snapshot is not created")
+            root_disk.update(source_type="snapshot", uuid=self.obj_golden_snapshot.id)
+        else:
+            raise RuntimeError(f"Not implemented: boot source {self.strategy}")
+        return {"block_device_mapping_v2": [root_disk]}
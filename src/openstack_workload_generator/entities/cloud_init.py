@@ -0,0 +1,104 @@
+import base64
+import gzip
+import logging
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from functools import lru_cache
+from typing import Any
+
+import jinja2
+import jinja2.meta
+
+LOGGER = logging.getLogger()
+
+# Nova rejects user data which is larger than 65535 bytes after base64 encoding
+NOVA_USER_DATA_LIMIT = 65535
+
+# The mime subtypes of the cloud-init user data formats, detected by the first line
+CLOUD_INIT_CONTENT_TYPES = [
+    ("#!", "x-shellscript"),
+    ("#cloud-config", "cloud-config"),
+    ("#cloud-boothook", "cloud-boothook"),
+    ("#include", "x-include-url"),
+    ("#part-handler", "part-handler"),
+    ("#upstart-job", "upstart-job"),
+]
+
+# Shell scripts use "{#" for the length of variables, therefore the jinja comments use "{##"
+_ENVIRONMENT = jinja2.Environment(
+    undefined=jinja2.StrictUndefined,
+    keep_trailing_newline=True,
+    comment_start_string="{##",
+    comment_end_string="##}",
+    autoescape=False,
+)
+
+
+@lru_cache(maxsize=32)
+def _compile_template(source: str) -> jinja2.Template:
+    return _ENVIRONMENT.from_string(source)
+
+
+@lru_cache(maxsize=32)
+def _template_variables(source: str) -> tuple[str, ...]:
+    try:
+        return tuple(
+            sorted(jinja2.meta.find_undeclared_variables(_ENVIRONMENT.parse(source)))
+        )
+    except jinja2.TemplateError as e:
+        raise RuntimeError(f"Unable to render the script template: {e}")
+
+
+def _content_type(script: str) -> str:
+    for prefix, content_type in CLOUD_INIT_CONTENT_TYPES:
+        if script.startswith(prefix):
+            return content_type
+    return "x-shellscript"
+
+
+def encode_user_data(script: str) -> str:
+    # A fixed boundary keeps the payload identical across runs and worker processes
+    message = MIMEMultipart(boundary="==owg-user-data-boundary==")
+    part = MIMEText(script, _content_type(script), "utf-8")
+    part.add_header(
+        "Content-Disposition", 'attachment; filename="cloud_init_extra_script"'
+    )
+    message.attach(part)
+    payload = message.as_bytes()
+
+    encoded = base64.b64encode(payload).decode("utf-8")
+    if len(encoded) > NOVA_USER_DATA_LIMIT:
+        # cloud-init detects and decompresses gzip compressed user data, mtime=0 keeps the payload stable
+        encoded = base64.b64encode(gzip.compress(payload, mtime=0)).decode("utf-8")
+        LOGGER.debug(
+            "Compressed user data from %d bytes to %d bytes", len(payload), len(encoded)
+        )
+    if len(encoded) > NOVA_USER_DATA_LIMIT:
+        raise RuntimeError(
+            f"The user data is too large, {len(encoded)} bytes after compression and encoding "
+            f"(limit {NOVA_USER_DATA_LIMIT} bytes)"
+        )
+    return encoded
+
+
+def render_template(template_source: str, context: dict[str, Any]) -> str:
+    try:
+        return _compile_template(template_source).render(**context)
+    except jinja2.TemplateError as e:
+        raise RuntimeError(f"Unable to render the script template: {e}")
+
+
+# Templates which use per machine variables like machine_name render differently for every machine,
+# therefore the cache is small and keyed only by the variables which the template uses
+@lru_cache(maxsize=64)
+def _cached_user_data(template_source: str, values: tuple[tuple[str, Any], ...]) -> str:
+    return encode_user_data(render_template(template_source, dict(values)))
+
+
+def render_user_data(template_source: str, context: dict[str, Any]) -> str:
+    values = tuple(
+        (name, context[name])
+        for name in _template_variables(template_source)
+        if name in context
+    )
+    return _cached_user_data(template_source, values)
@@ -0,0 +1,277 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from openstack.connection import Connection
+
+from .helpers import Config, ProjectCache
+from .machine import WorkloadGeneratorMachine
+from .records import ProjectRecord
+from ..metrics import Metrics
+
+LOGGER = logging.getLogger()
+
+# The data volumes are marked by this metadata key, the names of other volumes can look alike
+DATA_VOLUME_METADATA_KEY = "openstack-workload-generator-data-volume"
+
+
+class WorkloadGeneratorDataVolumes:
+    # The data volumes of all machines of a project are created, attached, detached and deleted
+    # concurrently, the status of all volumes is polled with one list call per interval
+
+    def __init__(
+        self, conn: Connection, project: ProjectRecord, poll_interval: float = 2.0
+    ):
+        self.conn = conn
+        self.project = project
+        self.poll_interval = poll_interval
+        self.settings = Config.settings().vm
+
+    def log_fields(self, **resource_ids: str) -> dict[str, str]:
+        return {
+            "project_id": self.project.id,
+            "domain_id": self.project.domain_id,
+            **resource_ids,
+        }
+
+    @staticmethod
+    def volume_name(machine_name: str, index: int) -> str:
+        return f"{machine_name}-data-{index}"
+
+    @staticmethod
+    def is_data_volume(volume: Any) -> bool:
+        return DATA_VOLUME_METADATA_KEY in (volume.metadata or {})
+
+    def _volumes(self) -> dict[str, Any]:
+        return {volume.id: volume for volume in self.conn.block_storage.volumes()}
+
+    def _data_volumes(self) -> list[Any]:
+        return [
+            volume
+            for volume in self._volumes().values()
+            if WorkloadGeneratorDataVolumes.is_data_volume(volume)
+        ]
+
+    def _concurrently(
+        self, task: Callable[[Any], tuple[str, float]], items: list[Any], action: str
+    ) -> dict[str, float]:
+        # Returns the start times of the successful operations by the resource id
+        def run(item: Any) -> tuple[str, float] | None:
+            try:
+                return task(item)
+            except Exception as e:
+                LOGGER.error(
+                    "Unable to %s in %s: %s",
+                    action,
+                    ProjectCache.lazy_ident(self.project.id),
+                    e,
+                    extra=self.log_fields(),
+                )
+                return None
+
+        with ThreadPoolExecutor(
+            max_workers=self.settings.data_volume_concurrency
+        ) as executor:
+            return dict(result for result in executor.map(run, items) if result)
+
+    def _wait_for(
+        self,
+        started: dict[str, float],
+        list_resources: Callable[[], dict[str, Any]],
+        reached: Callable[[Any | None], bool],
+        metric_name: str,
+        action: str,
+        id_field: str = "volume_id",
+    ) -> bool:
+        # started maps the ids to the start time of the operation, the time until a resource
+        # is observed in the target state is recorded
+        pending = dict(started)
+        failed = 0
+        deadline = time.monotonic() + self.settings.wait_for_server_timeout
+        while pending and time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            resources = list_resources()
+            now = time.monotonic()
+            for resource_id in list(pending):
+                resource = resources.get(resource_id)
+                if resource is not None and str(resource.status).startswith("error"):
+                    LOGGER.error(
+                        "Unable to %s %s in %s, status is %s",
+                        action,
+                        resource_id,
+                        ProjectCache.lazy_ident(self.project.id),
+                        resource.status,
+                        extra=self.log_fields(**{id_field: resource_id}),
+                    )
+                    del pending[resource_id]
+                    failed += 1
+                elif reached(resource):
+                    Metrics.record(metric_name, now - pending.pop(resource_id))
+
+        for resource_id in pending:
+            LOGGER.error(
+                "Unable to %s %s in %s within %s seconds",
+                action,
+                resource_id,
+                ProjectCache.lazy_ident(self.project.id),
+                self.settings.wait_for_server_timeout,
+                extra=self.log_fields(**{id_field: resource_id}),
+            )
+        return failed == 0 and not pending
+
+    def _create_volume(self, name: str) -> tuple[str, float]:
+        started = time.monotonic()
+        arguments: dict[str, Any] = dict()
+        if self.settings.data_volume_type:
+            arguments["volume_type"] = self.settings.data_volume_type
+        if self.settings.data_volume_multiattach:
+            arguments["is_multiattach"] = True
+        volume = self.conn.block_storage.create_volume(
+            name=name,
+            size=self.settings.data_volume_size_gb,
+            description="Auto generated data volume",
+            metadata={DATA_VOLUME_METADATA_KEY: "true"},
+            **arguments,
+        )
+        return volume.id, started
+
+    def _attach_volume(self, attachment: tuple[str, str]) -> tuple[str, float]:
+        server_id, volume_id = attachment
+        started = time.monotonic()
+        self.conn.compute.create_volume_attachment(server_id, volume_id=volume_id)
+        return volume_id, started
+
+    def create_and_attach(self, machines: list[WorkloadGeneratorMachine]) -> bool:
+        if self.settings.data_volumes == 0:
+            return True
+        existing = {volume.name: volume for volume in self._data_volumes()}
+        wanted = {
+            WorkloadGeneratorDataVolumes.volume_name(
+                machine.machine_name, index
+            ): machine
+            for machine in machines
+            if machine.obj is not None
+            for index in range(self.settings.data_volumes)
+        }
+
+        missing = [name for name in wanted if name not in existing]
+        created = self._concurrently(
+            self._create_volume, missing, "create a data volume"
+        )
+        if created:
+            LOGGER.info(
+                "Creating %d data volumes of %d GB in %s",
+                len(created),
+                self.settings.data_volume_size_gb,
+                ProjectCache.lazy_ident(self.project.id),
+                extra=self.log_fields(),
+            )
+        success = self._wait_for(
+            created,
+            self._volumes,
+            lambda volume: volume is not None and volume.status == "available",
+            "data_volume_creation",
+            "create data volume",
+        ) and len(created) == len(missing)
+
+        # Volumes can only be attached to active servers
+        started = time.monotonic()
+        self._wait_for(
+            {
+                machine.obj.id: started
+                for machine in wanted.values()
+                if machine.obj is not None and machine.obj.status != "ACTIVE"
+            },
+            lambda: {server.id: server for server in self.conn.compute.servers()},
+            lambda server: server is not None
+            and server.status == "ACTIVE"
+            and not server.task_state,
+            "data_volume_server_active",
+            "wait for the activation of server",
+            id_field="server_id",
+        )
+
+        attachments = [
+            (machine.obj.id, volume.id)
+            for volume in self._data_volumes()
+            if volume.name in wanted and volume.status == "available"
+            for machine in [wanted[volume.name]]
+            if machine.obj is not None
+        ]
+        attached = self._concurrently(
+            self._attach_volume, attachments, "attach a data volume"
+        )
+        success = (
+            self._wait_for(
+                attached,
+                self._volumes,
+                lambda volume: volume is not None and volume.status == "in-use",
+                "data_volume_attach",
+                "attach data volume",
+            )
+            and len(attached) == len(attachments)
+            and success
+        )
+        if attached:
+            LOGGER.info(
+                "Attached %d data volumes in %s",
+                len(attached),
+                ProjectCache.lazy_ident(self.project.id),
+                extra=self.log_fields(),
+            )
+        return success
+
+    def _detach_volume(self, volume: Any) -> tuple[str, float]:
+        started = time.monotonic()
+        for attachment in volume.attachments:
+            self.conn.compute.delete_volume_attachment(
+                attachment["server_id"], volume.id
+            )
+        return volume.id, started
+
+    def _delete_volume(self, volume_id: str) -> tuple[str, float]:
+        started = time.monotonic()
+        self.conn.block_storage.delete_volume(volume_id, ignore_missing=False)
+        return volume_id, started
+
+    def detach_and_delete(self) -> bool:
+        volumes = self._data_volumes()
+        if not volumes:
+            return True
+
+        attached = [volume for volume in volumes if volume.attachments]
+        detached = self._concurrently(
+            self._detach_volume, attached, "detach a data volume"
+        )
+        success = self._wait_for(
+            detached,
+            self._volumes,
+            lambda volume: volume is not None and volume.status == "available",
+            "data_volume_detach",
+            "detach data volume",
+        ) and len(detached) == len(attached)
+
+        deleted = self._concurrently(
+            self._delete_volume,
+            [volume.id for volume in volumes],
+            "delete a data volume",
+        )
+        success = (
+            self._wait_for(
+                deleted,
+                self._volumes,
+                lambda volume: volume is None,
+                "data_volume_deletion",
+                "delete data volume",
+            )
+            and len(deleted) == len(volumes)
+            and success
+        )
+        LOGGER.warning(
+            "Deleted %d data volumes in %s",
+            len(deleted),
+            ProjectCache.lazy_ident(self.project.id),
+            extra=self.log_fields(),
+        )
+        return success
@@ -5,6 +5,7 @@ from .helpers import DomainCache
 from openstack.connection import Connection
 from openstack.identity.v3.domain import Domain
 from .project import WorkloadGeneratorProject
+from .records import ProjectRecord
 
 from .user import WorkloadGeneratorUser
 
@@ -41,7 +42,7 @@ class WorkloadGeneratorDomain:
         result: dict[str, WorkloadGeneratorProject] = dict()
         for project in conn.identity.projects(domain_id=domain.id):
             result[project.name] = WorkloadGeneratorProject(
-                conn, project.name, domain, user
+                conn, project.name, domain, user, ProjectRecord.from_project(project)
             )
         return result
 
@@ -53,7 +54,11 @@ class WorkloadGeneratorDomain:
             name=self.domain_name, description="Automated creation", enabled=True
         )
         DomainCache.add(self.obj.id, self.obj.name)
-        LOGGER.info(f"Created {DomainCache.ident_by_id(self.obj.id)}")
+        LOGGER.info(
+            "Created %s",
+            DomainCache.lazy_ident(self.obj.id),
+            extra={"domain_id": self.obj.id},
+        )
 
         self.workload_user = WorkloadGeneratorDomain._get_user(
             self.conn, self.domain_name, self.obj
@@ -85,11 +90,17 @@ class WorkloadGeneratorDomain:
         self.workload_user.delete_user()
         self.disable_domain()
         domain = self.conn.identity.delete_domain(self.obj.id)
-        LOGGER.warning(f"Deleted {DomainCache.ident_by_id(self.obj.id)}")
+        LOGGER.warning(
+            "Deleted %s",
+            DomainCache.lazy_ident(self.obj.id),
+            extra={"domain_id": self.obj.id},
+        )
         self.obj = None
         return domain
 
     def create_and_get_projects(self, create_projects: list[str]):
+        # The setup of the projects is completed by setup_projects after the quotas
+        # of all projects were reconciled
         self.workload_user.create_and_get_user()
 
         if "none" in create_projects:
@@ -102,8 +113,14 @@ class WorkloadGeneratorDomain:
                 self.conn, project_name, self.obj, self.workload_user
             )
             project.create_and_get_project()
-            project.get_or_create_ssh_key()
             self.workload_projects[project_name] = project
+
+    @staticmethod
+    def setup_projects(projects: list[WorkloadGeneratorProject]):
+        # Idempotent, existing projects get the networks and routers added to the profile
+        for project in projects:
+            project.create_and_get_network_setup()
+            project.get_or_create_ssh_key()
             project.close_connection()
 
     def create_and_get_machines(self, machines: list[str], wait_for_machines: bool):
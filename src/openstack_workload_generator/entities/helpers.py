@@ -1,10 +1,13 @@
-import inspect
+import atexit
+import json
 import logging
 import os
+import queue
 import sys
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Tuple, Any
+from typing import Callable, Tuple, Any
 import coloredlogs
 
 import re
@@ -12,53 +15,69 @@ import argparse
 
 import yaml
 
+from .settings import STRUCTURED_KEYS, VALUE_RULES, Settings
+
 LOGGER = logging.getLogger()
 
 
 class Config:
-    _config: dict[str, str | dict[str, str] | None] = {
+    _defaults: dict[str, str | dict[str, int] | None] = {
         "admin_domain_password": "yolobanana",
         "admin_vm_password": "yolobanana",
         "admin_vm_ssh_key": "",
         "admin_vm_ssh_keypair_name": "my_ssh_public_key",
         "project_ipv4_subnet": "192.168.200.0/24",
+        "project_ipv4_supernet": "10.128.0.0/9",
+        "project_ipv4_prefix_length": "24",
+        "networks_per_project": "1",
+        "routers_per_project": "1",
         "public_network": "public",
         "network_mtu": "0",
         "number_of_floating_ips_per_project": "1",
+        "network_precreate_ports": "false",
         "vm_flavor": "SCS-1L-1",
         "vm_image": "Ubuntu 24.04",
         "vm_volume_size_gb": "10",
+        "vm_boot_source": "volume",
+        "vm_server_group_policy": "none",
+        "vm_availability_zones": "",
+        "vm_machine_class_seed": "0",
+        "vm_data_volumes": "0",
+        "vm_data_volume_size_gb": "1",
+        "vm_data_volume_type": "",
+        "vm_data_volume_multiattach": "false",
+        "vm_data_volume_concurrency": "8",
+        "image_uploads_per_project": "0",
+        "image_upload_file": "",
+        "image_upload_size_mb": "64",
+        "image_upload_chunk_size_kb": "1024",
+        "image_upload_concurrency": "4",
+        "object_workload_objects": "0",
+        "object_workload_containers": "1",
+        "object_workload_sizes_kb": "4:60,64:30,1024:10",
+        "object_workload_concurrency": "16",
         "verify_ssl_certificate": "false",
         "cloud_init_extra_script": """#!/bin/bash\necho "HELLO WORLD"; date > READY; whoami >> READY""",
         "wait_for_server_timeout": "300",
+        "readiness_timeout": "900",
+        "readiness_concurrency": "500",
+        "readiness_ssh_user": "ubuntu",
+        "readiness_ready_file": "/READY",
     }
 
     _file: str | None = None
+    _effective_config: dict[str, Any] = dict()
+    _settings: Settings | None = None
 
     @staticmethod
-    def get(key: str, regex: str = ".+", multi_line: bool = False) -> str:
-        if key not in Config._config:
-            LOGGER.error(f"{key} not in config")
-            sys.exit(1)
+    def settings() -> Settings:
+        if Config._settings is None:
+            raise RuntimeError("The configuration is not loaded")
+        return Config._settings
 
-        values: list[str] = []
-        if multi_line:
-            values = str(Config._config[key]).splitlines()
-        else:
-            values.append(str(Config._config[key]))
-
-        for value in values:
-            matcher = re.compile(regex, re.MULTILINE | re.DOTALL)
-            if not matcher.fullmatch(value):
-                LOGGER.error(
-                    f"{key} : >>>{value}<<< : does not match to regex >>>{regex}<<<"
-                )
-                sys.exit(1)
-
-        if len(values) > 1:
-            return "\n".join(values)
-        else:
-            return values[0]
+    @staticmethod
+    def use_settings(settings: Settings):
+        Config._settings = settings
 
     @staticmethod
     def load_config(config_file: str):
@@ -76,7 +95,8 @@ class Config:
             )
             LOGGER.info(
                 "Environment variable OPENSTACK_WORKLOAD_MANAGER_PROFILES set,"
-                f" searching for potential {potential_profile_file}"
+                " searching for potential %s",
+                potential_profile_file,
             )
 
         if os.path.exists(config_file):
@@ -87,170 +107,269 @@ class Config:
             Config._file = potential_profile_file
         else:
             LOGGER.error(
-                f"Cannot find a profile at {config_file} or {potential_profile_file}"
+                "Cannot find a profile at %s or %s", config_file, potential_profile_file
             )
             sys.exit(1)
 
         Config._file = os.path.realpath(Config._file)
 
         try:
-            LOGGER.info(f"Reading {Config._file}")
-            with open(str(Config._file), "r") as file_fd:
-                Config._config.update(yaml.safe_load(file_fd))
-
+            LOGGER.info("Reading %s", Config._file)
+            effective_config = Config._read_file(Config._file)
         except Exception as e:
-            LOGGER.error(f"Unable to read configuration: {e}")
+            LOGGER.error("Unable to read configuration: %s", e)
             sys.exit(1)
 
+        try:
+            Config._settings = Settings.from_dict(effective_config)
+        except ValueError as e:
+            LOGGER.error("Invalid configuration in %s: %s", Config._file, e)
+            sys.exit(1)
+        Config._effective_config = effective_config
+
+    @staticmethod
+    def _read_file(config_file: str) -> dict[str, Any]:
+        effective_config: dict[str, Any] = dict(Config._defaults)
+        with open(config_file, "r") as file_fd:
+            effective_config.update(yaml.safe_load(file_fd))
+
+        for key in effective_config.keys():
+            if key not in VALUE_RULES and key not in STRUCTURED_KEYS:
+                LOGGER.warning("Unknown configuration key %s in %s", key, config_file)
+        return effective_config
+
     @staticmethod
-    def check_config(cls):
-        methods = inspect.getmembers(cls, predicate=inspect.isfunction)
-        for name, method in methods:
-            if name.startswith("get_"):  # Check for "get_" prefix
-                method()
-        for quota_type in ["compute_quotas", "block_storage_quotas", "network_quotas"]:
-            if quota_type not in Config._config:
-                continue
-            for key_name in Config._config[quota_type].keys():
-                Config.quota(key_name, quota_type, 0)
+    def file() -> str:
+        if Config._file is None:
+            raise RuntimeError("The configuration is not loaded")
+        return Config._file
+
+    @staticmethod
+    def reload() -> bool:
+        # Used by long running modes, an invalid profile keeps the current settings
+        try:
+            effective_config = Config._read_file(Config.file())
+            settings = Settings.from_dict(effective_config)
+        except Exception as e:
+            LOGGER.error(
+                "Unable to reload the configuration from %s: %s", Config._file, e
+            )
+            return False
+        Config._effective_config = effective_config
+        Config._settings = settings
+        return True
 
     @staticmethod
     def show_effective_config():
-        Config.check_config(Config)
+        if not LOGGER.isEnabledFor(logging.INFO):
+            return
         LOGGER.info(
-            "The effective configuration from %s : \n>>>\n---\n%s\n<<<"
-            % (
-                Config._file,
-                yaml.dump(Config._config, default_flow_style=False, width=10000),
-            )
+            "The effective configuration from %s : \n>>>\n---\n%s\n<<<",
+            Config._file,
+            yaml.dump(Config._effective_config, default_flow_style=False, width=10000),
         )
 
-    @staticmethod
-    def get_public_network() -> str:
-        return Config.get("public_network", "[a-zA-Z][a-zA-Z0-9]*")
+
+class LazyIdent:
+    # Resolved when the log record is formatted, which only happens for enabled levels
+    __slots__ = ("_resolve", "_resource_id")
+
+    def __init__(self, resolve: Callable[[str], str], resource_id: str):
+        self._resolve = resolve
+        self._resource_id = resource_id
+
+    def __str__(self) -> str:
+        return self._resolve(self._resource_id)
+
+
+class DomainCache:
+    _domains: dict[str, str] = dict()
 
     @staticmethod
-    def get_number_of_floating_ips_per_project() -> int:
-        return int(Config.get("number_of_floating_ips_per_project", r"[1-9]\d*"))
+    def ident_by_id(domain_id: str) -> str:
+        if domain_id not in DomainCache._domains:
+            raise RuntimeError(f"There is no domain with id {domain_id}")
+        return f"domain '{DomainCache._domains[domain_id]}/{domain_id}'"
 
     @staticmethod
-    def get_admin_vm_password() -> str:
-        return Config.get("admin_vm_password")
+    def lazy_ident(domain_id: str) -> LazyIdent:
+        return LazyIdent(DomainCache.ident_by_id, domain_id)
 
     @staticmethod
-    def get_vm_flavor() -> str:
-        return Config.get("vm_flavor")
+    def name_by_id(domain_id: str) -> str:
+        if domain_id not in DomainCache._domains:
+            raise RuntimeError(f"There is no domain with id {domain_id}")
+        return DomainCache._domains[domain_id]
 
     @staticmethod
-    def get_cloud_init_extra_script() -> str:
-        return Config.get("cloud_init_extra_script", multi_line=True)
+    def add(domain_id: str, name: str):
+        DomainCache._domains[domain_id] = name
+
+
+class ProjectCache:
+    PROJECT_CACHE: dict[str, dict[str, str]] = dict()
 
     @staticmethod
-    def get_vm_image() -> str:
-        return Config.get("vm_image")
+    def ident_by_id(project_id: str) -> str:
+        if project_id not in ProjectCache.PROJECT_CACHE:
+            raise RuntimeError(f"There is no project with id {project_id}")
+        project = f'{ProjectCache.PROJECT_CACHE[project_id]["name"]}/{project_id}'
+        domain = DomainCache.ident_by_id(
+            ProjectCache.PROJECT_CACHE[project_id]["domain_id"]
+        )
+        return f"project '{project}' in {domain}"
 
     @staticmethod
-    def get_vm_volume_size_gb() -> int:
-        return int(Config.get("vm_volume_size_gb", regex=r"\d+"))
+    def lazy_ident(project_id: str) -> LazyIdent:
+        return LazyIdent(ProjectCache.ident_by_id, project_id)
 
     @staticmethod
-    def get_admin_vm_ssh_keypair_name() -> str:
-        return Config.get("admin_vm_ssh_keypair_name")
+    def add(project_id: str, data: dict[str, str]):
+        ProjectCache.PROJECT_CACHE[project_id] = data
+
+
+class ResourceIdCache:
+    # The ids of the flavors and images by the name, every type is listed once per cloud
+    _ids: dict[tuple[str, str], dict[str, str]] = dict()
 
     @staticmethod
-    def get_wait_for_server_timeout() -> int:
-        return int(Config.get("wait_for_server_timeout", regex=r"\d+"))
+    def _lookup(conn: Any, resource_type: str, name: str) -> str:
+        key = (conn.config.name, resource_type)
+        if key not in ResourceIdCache._ids:
+            resources = (
+                conn.compute.flavors() if resource_type == "flavor" else conn.image.images()
+            )
+            ResourceIdCache._ids[key] = {
+                resource.name: resource.id for resource in resources
+            }
+        if name not in ResourceIdCache._ids[key]:
+            logging.fatal(f"{resource_type.capitalize()} {name} not found")
+            sys.exit(2)
+        return ResourceIdCache._ids[key][name]
 
     @staticmethod
-    def get_project_ipv4_subnet() -> str:
-        return Config.get("project_ipv4_subnet", regex=r"\d+\.\d+\.\d+\.\d+/\d\d")
+    def flavor_id(conn: Any, name: str) -> str:
+        return ResourceIdCache._lookup(conn, "flavor", name)
 
     @staticmethod
-    def get_admin_vm_ssh_key() -> str:
-        return Config.get("admin_vm_ssh_key", r"ssh-\S+\s\S+\s\S+", multi_line=True)
+    def image_id(conn: Any, name: str) -> str:
+        return ResourceIdCache._lookup(conn, "image", name)
+
+
+class ResourceTags:
+    BASE_TAG = "openstack-workload-generator"
+    _run_tag: str | None = None
 
     @staticmethod
-    def get_admin_domain_password() -> str:
-        return Config.get("admin_domain_password", regex=r".{5,}")
+    def set_run_tag(run_tag: str | None):
+        ResourceTags._run_tag = run_tag
 
     @staticmethod
-    def get_verify_ssl_certificate() -> bool:
-        value = Config.get("verify_ssl_certificate", regex=r"true|false|True|False")
-        if value.lower() == "false":
-            return False
-        else:
-            return True
+    def domain_tag(domain_name: str) -> str:
+        return f"owg-domain-{domain_name}"
 
     @staticmethod
-    def configured_quota_names(quota_category: str) -> list[str]:
-        if quota_category in Config._config:
-            value = Config._config[quota_category]
-            if isinstance(value, dict):
-                return list(value.keys())
-        return []
+    def run_tag(run_name: str) -> str:
+        return f"owg-run-{run_name}"
 
     @staticmethod
-    def quota(quota_name: str, quota_category: str, default_value: int) -> int:
-        if quota_category in Config._config:
-            value = Config._config.get(quota_name, default_value)
-            if isinstance(value, int):
-                return value
-            else:
-                LOGGER.error(
-                    f"Quota {quota_category} -> {quota_name} is not an integer"
-                )
-                sys.exit(1)
-        else:
-            return default_value
+    def for_domain(domain_name: str) -> list[str]:
+        tags = [ResourceTags.BASE_TAG, ResourceTags.domain_tag(domain_name)]
+        if ResourceTags._run_tag:
+            tags.append(ResourceTags.run_tag(ResourceTags._run_tag))
+        return tags
 
     @staticmethod
-    def get_network_mtu():
-        return int(Config.get("network_mtu", regex=r"\d+"))
+    def for_domain_id(domain_id: str) -> list[str]:
+        return ResourceTags.for_domain(DomainCache.name_by_id(domain_id))
 
 
-class DomainCache:
-    _domains: dict[str, str] = dict()
+LOG_FORMATS = ["color", "json"]
 
-    @staticmethod
-    def ident_by_id(domain_id: str) -> str:
-        if domain_id not in DomainCache._domains:
-            raise RuntimeError(f"There is no domain with id {domain_id}")
-        return f"domain '{DomainCache._domains[domain_id]}/{domain_id}'"
+_STANDARD_RECORD_ATTRIBUTES = set(
+    logging.LogRecord("", 0, "", 0, "", None, None).__dict__.keys()
+) | {"message", "asctime"}
 
-    @staticmethod
-    def add(domain_id: str, name: str):
-        DomainCache._domains[domain_id] = name
 
+class JsonLinesFormatter(logging.Formatter):
+    # One json document per line, the values passed by "extra" (e.g. resource ids) become fields
 
-class ProjectCache:
-    PROJECT_CACHE: dict[str, dict[str, str]] = dict()
+    def format(self, record: logging.LogRecord) -> str:
+        data: dict[str, Any] = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "file": record.filename,
+            "line": record.lineno,
+            "process": record.process,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_RECORD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    # The queue does not leave the process, the record is passed unformatted and the
+    # message is formatted by the listener thread instead of the calling thread
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class LogPipeline:
+    _listener: QueueListener | None = None
 
     @staticmethod
-    def ident_by_id(project_id: str) -> str:
-        if project_id not in ProjectCache.PROJECT_CACHE:
-            raise RuntimeError(f"There is no project with id {project_id}")
-        project = f'{ProjectCache.PROJECT_CACHE[project_id]["name"]}/{project_id}'
-        domain = DomainCache.ident_by_id(
-            ProjectCache.PROJECT_CACHE[project_id]["domain_id"]
-        )
-        return f"project '{project}' in {domain}"
+    def stop():
+        if LogPipeline._listener is not None:
+            LogPipeline._listener.stop()
+            LogPipeline._listener = None
 
     @staticmethod
-    def add(project_id: str, data: dict[str, str]):
-        ProjectCache.PROJECT_CACHE[project_id] = data
+    def start(handler: logging.Handler, level: str):
+        LogPipeline.stop()
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        logger = logging.getLogger()
+        for existing_handler in list(logger.handlers):
+            logger.removeHandler(existing_handler)
+        logger.addHandler(DeferredQueueHandler(log_queue))
+        logger.setLevel(level)
+        LogPipeline._listener = QueueListener(log_queue, handler)
+        LogPipeline._listener.start()
+
+
+atexit.register(LogPipeline.stop)
 
 
-def setup_logging(log_level: str) -> Tuple[logging.Logger, str]:
+def setup_logging(
+    log_level: str, log_format: str = "color"
+) -> Tuple[logging.Logger, str]:
     log_format_string = (
         "%(asctime)-10s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s"
     )
     logger = logging.getLogger()
     log_file = "STDOUT"
-    logging.basicConfig(format=log_format_string, level=log_level)
 
-    coloredlogs.DEFAULT_FIELD_STYLES["levelname"] = {"bold": True, "color": ""}
-    coloredlogs.install(fmt=log_format_string, level=log_level.upper())
+    handler = logging.StreamHandler()
+    if log_format == "json":
+        handler.setFormatter(JsonLinesFormatter())
+    elif coloredlogs.terminal_supports_colors(handler.stream):
+        coloredlogs.DEFAULT_FIELD_STYLES["levelname"] = {"bold": True, "color": ""}
+        handler.setFormatter(
+            coloredlogs.ColoredFormatter(
+                fmt=log_format_string, datefmt=coloredlogs.DEFAULT_DATE_FORMAT
+            )
+        )
+    else:
+        handler.setFormatter(
+            logging.Formatter(log_format_string, coloredlogs.DEFAULT_DATE_FORMAT)
+        )
 
+    LogPipeline.start(handler, log_level.upper())
     return logger, log_file
 
 
@@ -266,6 +385,33 @@ def item_checker(value: str) -> str:
     return value
 
 
+def positive_int_checker(value: str) -> int:
+    if not re.fullmatch(r"[1-9]\d*", value):
+        raise argparse.ArgumentTypeError("specify a positive integer")
+    return int(value)
+
+
+def regression_threshold_checker(value: str) -> tuple[str, float]:
+    match = re.fullmatch(r"(?:([^=\s]+)=)?(\d+(?:\.\d+)?)", value)
+    if not match:
+        raise argparse.ArgumentTypeError(
+            "specify a threshold as [METRIC_PATTERN=]PERCENT"
+        )
+    return match.group(1) or "*", float(match.group(2))
+
+
+def listen_address_checker(value: str) -> tuple[str, int]:
+    match = re.fullmatch(r"(?:([a-zA-Z0-9.:\-]+|\[[0-9a-fA-F:]+\]):)?(\d{1,5})", value)
+    if not match or int(match.group(2)) > 65535:
+        raise argparse.ArgumentTypeError("specify a listen address as [HOST:]PORT")
+    return (match.group(1) or "0.0.0.0").strip("[]"), int(match.group(2))
+
+
+def shard_list(items: list[str], shards: int) -> list[list[str]]:
+    # Round robin distribution, the result only depends on the order of the items
+    return [items[nr::shards] for nr in range(shards) if items[nr::shards]]
+
+
 def iso_timestamp() -> str:
     return datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
@@ -0,0 +1,124 @@
+import logging
+import mmap
+import os
+import time
+from typing import Iterator
+
+from openstack.connection import Connection
+
+from .helpers import Config, ProjectCache, ResourceTags
+from .records import ProjectRecord
+from ..metrics import Metrics
+
+LOGGER = logging.getLogger()
+
+MEGABYTE = 1024 * 1024
+
+
+def file_chunks(filename: str, chunk_size: int) -> Iterator[bytes]:
+    # The file is memory mapped, only the page cache holds the data and at most one chunk
+    # is copied at a time, independent of the size of the image
+    with open(filename, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, size, chunk_size):
+                end = start + chunk_size
+                yield mapped[start:end]
+
+
+def synthetic_chunks(size: int, chunk_size: int) -> Iterator[bytes | memoryview]:
+    # One random chunk is allocated per upload and sent repeatedly, random data prevents
+    # compression and deduplication in the storage backend
+    chunk = os.urandom(min(chunk_size, size))
+    remaining = size
+    while remaining >= len(chunk):
+        yield chunk
+        remaining -= len(chunk)
+    if remaining:
+        yield memoryview(chunk)[:remaining]
+
+
+class WorkloadGeneratorImageUpload:
+
+    def __init__(self, conn: Connection, project: ProjectRecord):
+        self.conn = conn
+        self.project = project
+        self.settings = Config.settings().image_upload
+
+    def log_fields(self, **resource_ids: str) -> dict[str, str]:
+        return {
+            "project_id": self.project.id,
+            "domain_id": self.project.domain_id,
+            **resource_ids,
+        }
+
+    def image_name(self, index: int) -> str:
+        return f"upload-{self.project.name}-{index}"
+
+    def _images(self) -> list:
+        return [
+            image
+            for image in self.conn.image.images(owner=self.project.id)
+            if image.name and image.name.startswith(f"upload-{self.project.name}-")
+        ]
+
+    def missing_images(self) -> list[str]:
+        existing = {image.name for image in self._images()}
+        return [
+            name
+            for name in map(self.image_name, range(self.settings.count))
+            if name not in existing
+        ]
+
+    def _chunks(self) -> Iterator[bytes | memoryview]:
+        chunk_size = self.settings.chunk_size_kb * 1024
+        if self.settings.file:
+            return file_chunks(self.settings.file, chunk_size)
+        return synthetic_chunks(self.settings.size_mb * MEGABYTE, chunk_size)
+
+    def upload(self, image_name: str) -> int:
+        # Returns the number of uploaded bytes
+        uploaded = 0
+
+        def counted() -> Iterator[bytes | memoryview]:
+            nonlocal uploaded
+            for chunk in self._chunks():
+                uploaded += len(chunk)
+                yield chunk
+
+        started = time.monotonic()
+        image = self.conn.image.create_image(
+            image_name,
+            data=counted(),
+            disk_format="raw",
+            container_format="bare",
+            tags=ResourceTags.for_domain_id(self.project.domain_id),
+            allow_duplicates=True,
+            validate_checksum=False,
+        )
+        duration = time.monotonic() - started
+        Metrics.record("image_upload", duration)
+        Metrics.record("image_upload_mb_per_s", uploaded / MEGABYTE / duration)
+        LOGGER.info(
+            "Uploaded image %s/%s with %.1f MB in %.1f seconds to %s",
+            image.name,
+            image.id,
+            uploaded / MEGABYTE,
+            duration,
+            ProjectCache.lazy_ident(self.project.id),
+            extra=self.log_fields(image_id=image.id),
+        )
+        return uploaded
+
+    def delete_images(self):
+        for image in self._images():
+            self.conn.image.delete_image(image.id, ignore_missing=True)
+            LOGGER.warning(
+                "Deleted image %s/%s in %s",
+                image.name,
+                image.id,
+                ProjectCache.lazy_ident(self.project.id),
+                extra=self.log_fields(image_id=image.id),
+            )
@@ -1,36 +1,82 @@
-import base64
 import logging
-import sys
+import time
+from typing import Any
 
 from openstack.compute.v2.server import Server
 from openstack.connection import Connection
-from openstack.identity.v3.project import Project
-from openstack.network.v2.network import Network
+from openstack.network.v2.port import Port
 
-from .helpers import Config, ProjectCache
+from .boot_source import WorkloadGeneratorBootSource
+from .cloud_init import render_user_data
+from .helpers import (
+    Config,
+    DomainCache,
+    ProjectCache,
+    ResourceIdCache,
+    ResourceTags,
+)
+from .placement import WorkloadGeneratorPlacement
+from .records import NetworkRecord, ProjectRecord, ServerRecord
+from .settings import MachineClass
+from ..metrics import Metrics
 
 LOGGER = logging.getLogger()
 
 
 class WorkloadGeneratorMachine:
+    # Large runs keep ten thousands of machines in memory
+    __slots__ = (
+        "conn",
+        "machine_name",
+        "floating_ip",
+        "internal_ip",
+        "security_group_name_ingress",
+        "security_group_name_egress",
+        "project",
+        "port_id",
+        "obj",
+        "pending_since",
+        "created_in_run",
+    )
 
     def __init__(
         self,
         conn: Connection,
-        project: Project,
+        project: ProjectRecord,
         machine_name: str,
         security_group_name_ingress: str,
         security_group_name_egress: str,
+        record: ServerRecord | None = None,
     ):
         self.conn = conn
         self.machine_name = machine_name
-        self.root_password = Config.get_admin_vm_password()
         self.floating_ip: str | None = None
         self.internal_ip: str | None = None
         self.security_group_name_ingress = security_group_name_ingress
         self.security_group_name_egress = security_group_name_egress
         self.project = project
-        self.obj: Server | None = conn.compute.find_server(self.machine_name)
+        # Only known for machines booted with a pre-created port
+        self.port_id: str | None = None
+        self.obj: ServerRecord | None = record
+        # The start of a create or delete request, until the server reached the final state
+        self.pending_since: float | None = None
+        # Existing machines are reused, their creation time says nothing about this run
+        self.created_in_run = False
+        if record is None:
+            server = conn.compute.find_server(self.machine_name)
+            if server:
+                self.obj = ServerRecord.from_server(server)
+
+    @property
+    def root_password(self) -> str:
+        return Config.settings().vm.admin_password
+
+    def log_fields(self) -> dict[str, str | None]:
+        return {
+            "server_id": self.obj.id if self.obj else None,
+            "project_id": self.project.id,
+            "domain_id": self.project.domain_id,
+        }
 
     @property
     def server_ident(self) -> str:
@@ -38,141 +84,242 @@ class WorkloadGeneratorMachine:
             return "DOES NOT EXIST"
         return f"server {self.obj.name}/{self.obj.id}"
 
-    def get_image_id_by_name(self, image_name):
-        for image in self.conn.image.images():
-            if image.name == image_name:
-                return image.id
-        logging.fatal(f"Image {image_name} not found")
-        sys.exit(2)
-
-    def get_flavor_id_by_name(self, flavor_name):
-        for flavor in self.conn.compute.flavors():
-            if flavor.name == flavor_name:
-                return flavor.id
-        logging.fatal(f"Flavor {flavor_name} not found")
-        sys.exit(2)
-
     def delete_machine(self):
         LOGGER.warning(
-            f"Deleting machine {self.machine_name} in {ProjectCache.ident_by_id(self.project.id)}"
+            "Deleting machine %s in %s",
+            self.machine_name,
+            ProjectCache.lazy_ident(self.project.id),
+            extra=self.log_fields(),
         )
+        self.pending_since = time.monotonic()
         self.conn.delete_server(self.obj.id)
 
     def wait_for_delete(self):
-        self.conn.compute.wait_for_delete(self.obj)
+        self.conn.compute.wait_for_delete(Server.new(id=self.obj.id))
+        if self.pending_since is not None:
+            Metrics.record("server_teardown", time.monotonic() - self.pending_since)
+            self.pending_since = None
         LOGGER.warning(
-            f"Machine {self.machine_name} in {self.obj.project_id} is deleted now"
+            "Machine %s in %s is deleted now",
+            self.machine_name,
+            self.obj.project_id,
+            extra=self.log_fields(),
         )
 
-    def create_or_get_server(self, network: Network, wait_for_machine: bool):
+    def create_or_get_server(
+        self,
+        network: NetworkRecord,
+        machine_class: MachineClass,
+        boot_source: WorkloadGeneratorBootSource,
+        placement: WorkloadGeneratorPlacement,
+        wait_for_machine: bool,
+        machine_index: int = 0,
+        port_id: str | None = None,
+    ):
 
         if self.obj:
             LOGGER.info(
-                f"Server {self.obj.name}/{self.obj.id} in {ProjectCache.ident_by_id(self.obj.project_id)} already exists"
+                "Server %s/%s in %s already exists",
+                self.obj.name,
+                self.obj.id,
+                ProjectCache.lazy_ident(self.obj.project_id),
+                extra=self.log_fields(),
             )
             return
 
         # https://docs.openstack.org/openstacksdk/latest/user/resources/compute/v2/server.html#openstack.compute.v2.server.Server
-        self.obj = self.conn.compute.create_server(
+        # The availability zone chosen by the placement is passed to the cloud-init template
+        placement_arguments = placement.server_arguments()
+        hypervisor_hint = placement_arguments.get("availability_zone")
+        self.pending_since = time.monotonic()
+        server = self.conn.compute.create_server(
             name=self.machine_name,
-            flavor_id=self.get_flavor_id_by_name(Config.get_vm_flavor()),
-            networks=[{"uuid": network.id}],
+            flavor_id=ResourceIdCache.flavor_id(self.conn, machine_class.flavor),
+            **self._network_arguments(network, port_id),
             admin_password=self.root_password,
             description="automatically created",
-            block_device_mapping_v2=[
-                {
-                    "boot_index": 0,
-                    "uuid": self.get_image_id_by_name(Config.get_vm_image()),
-                    "source_type": "image",
-                    "destination_type": "volume",
-                    "volume_size": Config.get_vm_volume_size_gb(),
-                    "delete_on_termination": True,
-                }
-            ],
-            user_data=WorkloadGeneratorMachine._get_user_script(),
-            security_groups=[
-                {"name": self.security_group_name_ingress},
-                {"name": self.security_group_name_egress},
-            ],
-            key_name=Config.get_admin_vm_ssh_keypair_name(),
+            **boot_source.server_arguments(self.machine_name),
+            **placement_arguments,
+            user_data=self._get_user_script(
+                machine_class, machine_index, hypervisor_hint
+            ),
+            key_name=Config.settings().vm.ssh_keypair_name,
+            tags=ResourceTags.for_domain_id(self.project.domain_id),
         )
+        Metrics.record("server_create_api", time.monotonic() - self.pending_since)
+        self.obj = ServerRecord.from_server(server) if server else None
+        self.created_in_run = self.obj is not None
+        self.port_id = port_id
         if wait_for_machine:
             self.wait_for_server()
         if self.obj:
             LOGGER.info(
-                f"Created server {self.obj.name}/{self.obj.id} in {ProjectCache.ident_by_id(network.project_id)}"
-                f" with password >>>{self.root_password}<<<"
+                "Created server %s/%s in %s with password >>>%s<<<",
+                self.obj.name,
+                self.obj.id,
+                ProjectCache.lazy_ident(network.project_id),
+                self.root_password,
+                extra=self.log_fields(),
             )
         else:
             raise RuntimeError(
                 f"Unable to create server {self.machine_name} in {ProjectCache.ident_by_id(network.project_id)}"
             )
 
-    @staticmethod
-    def _get_user_script() -> str:
-        cloud_init_script = "\n".join(Config.get_cloud_init_extra_script())
-        cloud_init_script = base64.b64encode(cloud_init_script.encode("utf-8")).decode(
-            "utf-8"
+    def _network_arguments(
+        self, network: NetworkRecord, port_id: str | None
+    ) -> dict[str, Any]:
+        # The security groups of a pre-created port are already set on the port
+        if port_id:
+            return {"networks": [{"port": port_id}]}
+        return {
+            "networks": [{"uuid": network.id}],
+            "security_groups": [
+                {"name": self.security_group_name_ingress},
+                {"name": self.security_group_name_egress},
+            ],
+        }
+
+    def _get_user_script(
+        self,
+        machine_class: MachineClass,
+        machine_index: int,
+        hypervisor_hint: str | None,
+    ) -> str:
+        # The script is a jinja2 template, the encoded payload is cached per distinct rendered script
+        return render_user_data(
+            machine_class.cloud_init_extra_script,
+            {
+                "cloud_name": self.conn.config.name,
+                "domain_name": DomainCache.name_by_id(self.project.domain_id),
+                "project_name": self.project.name,
+                "machine_name": self.machine_name,
+                "machine_index": machine_index,
+                "hypervisor_hint": hypervisor_hint,
+                "machine_class": machine_class.name,
+            },
         )
-        return cloud_init_script
 
     def update_assigned_ips(self):
-        if self.obj.addresses:
-            for network_name, addresses in self.obj.addresses.items():
-                for address in addresses:
-                    if address["OS-EXT-IPS:type"] == "floating":
-                        if self.floating_ip and self.floating_ip != address["addr"]:
-                            raise RuntimeError(
-                                "More than one address of type 'floating'"
-                            )
-                        self.floating_ip = address["addr"]
-                    elif address["OS-EXT-IPS:type"] == "fixed":
-                        if self.internal_ip and self.internal_ip != address["addr"]:
-                            raise RuntimeError("More than one address of type 'fixed'")
-                        self.internal_ip = address["addr"]
-                    else:
-                        raise NotImplementedError(f"{address} not implemented")
+        for address_type, address in self.obj.addresses:
+            if address_type == "floating":
+                if self.floating_ip and self.floating_ip != address:
+                    raise RuntimeError("More than one address of type 'floating'")
+                self.floating_ip = address
+            elif address_type == "fixed":
+                if self.internal_ip and self.internal_ip != address:
+                    raise RuntimeError("More than one address of type 'fixed'")
+                self.internal_ip = address
+            else:
+                raise NotImplementedError(f"{address_type} {address} not implemented")
 
     def add_floating_ip(self):
-        public_network = self.conn.network.find_network(Config.get_public_network())
+        public_network_name = Config.settings().network.public_network
+        public_network = self.conn.network.find_network(public_network_name)
         if not public_network:
-            LOGGER.error(f"There is no '{public_network}' network")
+            LOGGER.error(
+                "There is no '%s' network", public_network_name, extra=self.log_fields()
+            )
             return
 
         self.update_assigned_ips()
 
         if self.floating_ip:
             LOGGER.info(
-                f"Floating ip is already added to {self.obj.name}/{self.obj.id} in domain {self.project.domain_id}"
+                "Floating ip is already added to %s/%s in domain %s",
+                self.obj.name,
+                self.obj.id,
+                self.project.domain_id,
+                extra=self.log_fields(),
             )
         else:
             LOGGER.info(
-                f"Add floating ip {self.obj.name}/{self.obj.id} in {ProjectCache.ident_by_id(self.project.id)}"
+                "Add floating ip %s/%s in %s",
+                self.obj.name,
+                self.obj.id,
+                ProjectCache.lazy_ident(self.project.id),
+                extra=self.log_fields(),
             )
             self.wait_for_server()
             new_floating_ip = self.conn.network.create_ip(
                 floating_network_id=public_network.id
             )
-            server_port = list(self.conn.network.ports(device_id=self.obj.id))[0]
+            tags = ResourceTags.for_domain_id(self.project.domain_id)
+            self.conn.network.set_tags(new_floating_ip, tags)
+            server_port = (
+                Port.new(id=self.port_id)
+                if self.port_id
+                else list(self.conn.network.ports(device_id=self.obj.id))[0]
+            )
+            self.conn.network.set_tags(server_port, tags)
             self.conn.network.add_ip_to_port(server_port, new_floating_ip)
             self.floating_ip = new_floating_ip.floating_ip_address
 
     def wait_for_server(self):
-        self.conn.compute.wait_for_server(
-            self.obj,
-            wait=Config.get_wait_for_server_timeout(),
+        # The full resource is only fetched while waiting, afterwards the record is updated
+        server = self.conn.compute.wait_for_server(
+            self.conn.compute.get_server(self.obj.id),
+            wait=Config.settings().vm.wait_for_server_timeout,
         )
+        self.obj = ServerRecord.from_server(server)
+        # Machines with floating ips are waited for later, the time still counts from the creation
+        if self.pending_since is not None:
+            Metrics.record(
+                "server_time_to_active", time.monotonic() - self.pending_since
+            )
+            self.pending_since = None
 
-    def start_server(self):
+    def start_server(self) -> bool:
+        if self.obj is None:
+            raise RuntimeError(f"Invalid reference to server for {self.machine_name}")
         if self.obj.status != "ACTIVE":
             self.conn.compute.start_server(self.obj.id)
-            LOGGER.info(f"Server '{self.obj.name}' started successfully.")
+            LOGGER.info(
+                "Server '%s' started successfully.",
+                self.obj.name,
+                extra=self.log_fields(),
+            )
+            return True
         else:
-            LOGGER.info(f"Server '{self.obj.name}' is already running.")
+            LOGGER.info(
+                "Server '%s' is already running.",
+                self.obj.name,
+                extra=self.log_fields(),
+            )
+            return False
 
-    def stop_server(self):
+    def stop_server(self) -> bool:
+        if self.obj is None:
+            raise RuntimeError(f"Invalid reference to server for {self.machine_name}")
         if self.obj.status == "ACTIVE":
             self.conn.compute.stop_server(self.obj.id)
-            LOGGER.info(f"Server '{self.obj.name}' started successfully.")
+            LOGGER.info(
+                "Server '%s' stopped successfully.",
+                self.obj.name,
+                extra=self.log_fields(),
+            )
+            return True
+        else:
+            LOGGER.info(
+                "Server '%s' is not running.", self.obj.name, extra=self.log_fields()
+            )
+            return False
+
+    def reboot_server(self) -> bool:
+        if self.obj is None:
+            raise RuntimeError(f"Invalid reference to server for {self.machine_name}")
+        if self.obj.status == "ACTIVE":
+            self.conn.compute.reboot_server(self.obj.id, "HARD")
+            LOGGER.info(
+                "Server '%s' hard rebooted successfully.",
+                self.obj.name,
+                extra=self.log_fields(),
+            )
+            return True
         else:
-            LOGGER.info(f"Server '{self.obj.name}' is already running.")
+            LOGGER.info(
+                "Server '%s' is not running, not rebooting it.",
+                self.obj.name,
+                extra=self.log_fields(),
+            )
+            return False
@@ -1,58 +1,117 @@
 import logging
+import time
+from typing import Any
 
 from openstack.connection import Connection
 from openstack.exceptions import ResourceNotFound
-from openstack.identity.v3.project import Project
-from openstack.network.v2.network import Network
-from openstack.network.v2.router import Router
-from openstack.network.v2.security_group import SecurityGroup
-from openstack.network.v2.subnet import Subnet
 
-from .helpers import Config, ProjectCache
+from .addressing import CidrAllocator
+from .helpers import Config, ProjectCache, ResourceTags
+from .records import NetworkRecord, ProjectRecord, ResourceRecord
+from ..metrics import Metrics
 
 LOGGER = logging.getLogger()
 
 
 class WorkloadGeneratorNetwork:
+    # A project has networks_per_project networks with one subnet each, the networks are
+    # attached round robin to routers_per_project routers. The first network, subnet and
+    # router keep the names and the subnet of the single network setup.
 
     def __init__(
         self,
         conn: Connection,
-        project: Project,
+        project: ProjectRecord,
         security_group_name_ingress: str,
         security_group_name_egress: str,
     ):
-        self.project: Project = project
+        self.project: ProjectRecord = project
         self.conn = conn
-        self.network_name = f"localnet-{self.project.name}"
-        self.subnet_name = f"localsubnet-{self.project.name}"
-        self.router_name = f"localrouter-{self.project.name}"
         self.security_group_name_ingress = security_group_name_ingress
         self.security_group_name_egress = security_group_name_egress
-        self.obj_network: Network | None = WorkloadGeneratorNetwork._find_network(
-            self.network_name, conn, project
+
+        network_settings = Config.settings().network
+        self.network_names = [
+            self._name("localnet", index)
+            for index in range(network_settings.networks_per_project)
+        ]
+        self.router_names = [
+            self._name("localrouter", index)
+            for index in range(network_settings.routers_per_project)
+        ]
+
+        # One list request per resource type, also for thousands of networks
+        networks = WorkloadGeneratorNetwork._index_by_name(
+            conn.network.networks(project_id=project.id),
+            self.network_names,
+            "network",
+            project,
         )
-        self.obj_subnet: Subnet | None = WorkloadGeneratorNetwork._find_subnet(
-            self.network_name, conn, project
+        all_subnets = list(conn.network.subnets(project_id=project.id))
+        subnets = WorkloadGeneratorNetwork._index_by_name(
+            all_subnets,
+            self.network_names,
+            "subnet",
+            project,
         )
-        self.obj_router: Router | None = WorkloadGeneratorNetwork._find_router(
-            self.router_name, conn, project
+        routers = WorkloadGeneratorNetwork._index_by_name(
+            conn.network.routers(project_id=project.id),
+            self.router_names,
+            "router",
+            project,
         )
-        self.obj_ingress_security_group: SecurityGroup | None = (
+        self.networks: list[NetworkRecord | None] = [
+            NetworkRecord.from_network(networks[name]) if name in networks else None
+            for name in self.network_names
+        ]
+        self.subnets: list[ResourceRecord | None] = [
+            ResourceRecord.from_resource(subnets[name]) if name in subnets else None
+            for name in self.network_names
+        ]
+        self.routers: list[ResourceRecord | None] = [
+            ResourceRecord.from_resource(routers[name]) if name in routers else None
+            for name in self.router_names
+        ]
+        # The new subnets must not overlap any subnet of the project
+        self._used_cidrs: list[str] = [subnet.cidr for subnet in all_subnets]
+        self._allocator: CidrAllocator | None = None
+
+        self.obj_ingress_security_group: ResourceRecord | None = (
             WorkloadGeneratorNetwork._find_security_group(
                 self.security_group_name_ingress, conn, project
             )
         )
-        self.obj_egress_security_group: SecurityGroup | None = (
+        self.obj_egress_security_group: ResourceRecord | None = (
             WorkloadGeneratorNetwork._find_security_group(
                 self.security_group_name_egress, conn, project
             )
         )
 
+    def _name(self, prefix: str, index: int) -> str:
+        if index == 0:
+            return f"{prefix}-{self.project.name}"
+        return f"{prefix}-{self.project.name}-{index}"
+
+    @staticmethod
+    def _index_by_name(
+        resources: Any, names: list[str], kind: str, project: ProjectRecord
+    ) -> dict[str, Any]:
+        wanted = set(names)
+        result: dict[str, Any] = dict()
+        for resource in resources:
+            if resource.name not in wanted:
+                continue
+            if resource.name in result:
+                raise RuntimeError(
+                    f"More than one {kind} with the name {resource.name} in {project.name}"
+                )
+            result[resource.name] = resource
+        return result
+
     @staticmethod
     def _find_security_group(
-        name, conn: Connection, project: Project
-    ) -> SecurityGroup | None:
+        name, conn: Connection, project: ProjectRecord
+    ) -> ResourceRecord | None:
         security_groups = [
             group
             for group in conn.network.security_groups(
@@ -64,209 +123,335 @@ class WorkloadGeneratorNetwork:
                 f"Error fetching security group for project {project.name}/{project.domain_id}"
             )
         elif len(security_groups) == 1:
-            return security_groups[0]
+            return ResourceRecord.from_resource(security_groups[0])
         return None
 
-    @staticmethod
-    def _find_router(name, conn: Connection, project: Project) -> Router | None:
-        routers = [
-            router for router in conn.network.routers(name=name, project_id=project.id)
-        ]
-        if len(routers) == 0:
-            return None
-        elif len(routers) == 1:
-            return routers[0]
-        else:
-            raise RuntimeError(
-                f"More than one router with the name {name} in {project.name}"
-            )
-
-    @staticmethod
-    def _find_network(name, conn: Connection, project: Project) -> Network | None:
-        networks = [
-            network
-            for network in conn.network.networks(name=name, project_id=project.id)
-        ]
-        if len(networks) == 0:
-            return None
-        elif len(networks) == 1:
-            return networks[0]
-        else:
-            raise RuntimeError(
-                f"More the one network with the name {name} in {project.name}"
+    def log_fields(self, **resource_ids: str) -> dict[str, str]:
+        return {
+            "project_id": self.project.id,
+            "domain_id": self.project.domain_id,
+            **resource_ids,
+        }
+
+    def _tags(self) -> list[str]:
+        return ResourceTags.for_domain_id(self.project.domain_id)
+
+    def network_for_machine(self, machine_index: int) -> NetworkRecord:
+        # The machines are spread round robin over the networks
+        networks = [network for network in self.networks if network is not None]
+        if not networks:
+            raise RuntimeError("No Workload network object")
+        return networks[machine_index % len(networks)]
+
+    def _next_cidr(self, index: int) -> str:
+        network_settings = Config.settings().network
+        if index == 0:
+            return network_settings.project_ipv4_subnet
+        if self._allocator is None:
+            self._allocator = CidrAllocator(
+                network_settings.ipv4_supernet,
+                network_settings.ipv4_prefix_length,
+                [network_settings.project_ipv4_subnet, *self._used_cidrs],
             )
+        return str(self._allocator.allocate())
 
-    @staticmethod
-    def _find_subnet(name, conn, project) -> Subnet | None:
-        subnet = [
-            network
-            for network in conn.network.subnets(name=name, project_id=project.id)
-        ]
-        if len(subnet) == 0:
-            return None
-        elif len(subnet) == 1:
-            return subnet[0]
-        else:
-            raise RuntimeError(
-                f"More the one subnet with the name {name} in {project.name}"
+    def create_and_get_network_setup(self) -> list[NetworkRecord]:
+        public_network = self.conn.network.find_network(
+            Config.settings().network.public_network
+        )
+        if not public_network:
+            LOGGER.error(
+                "There is no '%s' network, not adding floating ips",
+                Config.settings().network.public_network,
+                extra=self.log_fields(),
             )
 
-    def create_and_get_network_setup(self) -> Network:
-        network = self.create_and_get_network()
-        subnet = self.create_and_get_subnet()
-        self.create_and_get_router(subnet)
+        networks: list[NetworkRecord] = []
+        for index in range(len(self.networks)):
+            networks.append(self.create_and_get_network(index))
+            subnet_exists = self.subnets[index] is not None
+            subnet = self.create_and_get_subnet(index)
+            if public_network:
+                router_index = index % len(self.routers)
+                router_exists = self.routers[router_index] is not None
+                router = self.create_and_get_router(router_index, public_network)
+                if not subnet_exists or not router_exists:
+                    self.add_subnet_to_router(router, subnet)
         self.create_and_get_ingress_security_group()
         self.create_and_get_egress_security_group()
 
-        return network
+        return networks
 
-    def create_and_get_router(self, subnet: Subnet) -> Router | None:
-        public_network = self.conn.network.find_network(Config.get_public_network())
-        if not public_network:
-            LOGGER.error(
-                f"There is no '{Config.get_public_network()}' network, not adding floating ips"
-            )
-            return None
-
-        if self.obj_router:
-            return self.obj_router
+    def create_and_get_router(self, index: int, public_network: Any) -> ResourceRecord:
+        existing_router = self.routers[index]
+        if existing_router:
+            return existing_router
 
-        self.obj_router = self.conn.network.create_router(
-            name=self.router_name, admin_state_up=True
+        router = self.conn.network.create_router(
+            name=self.router_names[index], admin_state_up=True
         )
-        if not self.obj_router:
-            raise RuntimeError(f"Unable to create Router '{self.router_name}'")
+        if not router:
+            raise RuntimeError(f"Unable to create Router '{self.router_names[index]}'")
+        self.conn.network.set_tags(router, self._tags())
+        obj_router = ResourceRecord.from_resource(router)
+        self.routers[index] = obj_router
 
         LOGGER.info(
-            f"Router '{self.obj_router.name}' created with ID: {self.obj_router.id}"
+            "Router '%s' created with ID: %s",
+            obj_router.name,
+            obj_router.id,
+            extra=self.log_fields(router_id=obj_router.id),
         )
         self.conn.network.update_router(
-            self.obj_router, external_gateway_info={"network_id": public_network.id}
+            obj_router.id, external_gateway_info={"network_id": public_network.id}
         )
         LOGGER.info(
-            f"Router '{self.obj_router.name}' gateway set to external network: {public_network.name}"
+            "Router '%s' gateway set to external network: %s",
+            obj_router.name,
+            public_network.name,
+            extra=self.log_fields(router_id=obj_router.id),
         )
-        self.conn.network.add_interface_to_router(self.obj_router, subnet_id=subnet.id)
+        return obj_router
+
+    def add_subnet_to_router(self, router: ResourceRecord, subnet: ResourceRecord):
+        self.conn.network.add_interface_to_router(router.id, subnet_id=subnet.id)
         LOGGER.info(
-            f"Subnet '{subnet.name}' added to router '{self.obj_router.name}' as an interface"
+            "Subnet '%s' added to router '%s' as an interface",
+            subnet.name,
+            router.name,
+            extra=self.log_fields(router_id=router.id, subnet_id=subnet.id),
         )
 
-        return self.obj_router
+    def create_and_get_network(self, index: int) -> NetworkRecord:
+        existing_network = self.networks[index]
+        if existing_network:
+            return existing_network
 
-    def create_and_get_network(self) -> Network:
-        if self.obj_network:
-            return self.obj_network
-
-        mtu_size = Config.get_network_mtu()
+        network_name = self.network_names[index]
+        mtu_size = Config.settings().network.mtu
         if mtu_size == 0:
-            self.obj_network = self.conn.network.create_network(
-                name=self.network_name,
+            network = self.conn.network.create_network(
+                name=network_name,
                 project_id=self.project.id,
             )
         else:
-            self.obj_network = self.conn.network.create_network(
-                name=self.network_name,
+            network = self.conn.network.create_network(
+                name=network_name,
                 project_id=self.project.id,
                 mtu=mtu_size,
             )
-        if not self.obj_network:
-            raise RuntimeError(f"Unable to create network {self.network_name}")
+        if not network:
+            raise RuntimeError(f"Unable to create network {network_name}")
+        self.conn.network.set_tags(network, self._tags())
+        obj_network = NetworkRecord.from_network(network)
+        self.networks[index] = obj_network
 
         LOGGER.info(
-            f"Created network {self.obj_network.name}/{self.obj_network.id} in {self.project.name}/{self.project.id}"
+            "Created network %s/%s in %s/%s",
+            obj_network.name,
+            obj_network.id,
+            self.project.name,
+            self.project.id,
+            extra=self.log_fields(network_id=obj_network.id),
         )
-        return self.obj_network
+        return obj_network
 
-    def create_and_get_subnet(self) -> Subnet:
-        if self.obj_subnet:
-            return self.obj_subnet
+    def create_and_get_subnet(self, index: int) -> ResourceRecord:
+        existing_subnet = self.subnets[index]
+        if existing_subnet:
+            return existing_subnet
 
-        if not self.obj_network:
+        obj_network = self.networks[index]
+        if not obj_network:
             raise RuntimeError("No network object exists")
 
-        self.obj_subnet = self.conn.network.create_subnet(
-            network_id=self.obj_network.id,
+        subnet = self.conn.network.create_subnet(
+            network_id=obj_network.id,
             project_id=self.project.id,
-            name=self.network_name,
-            cidr=Config.get_project_ipv4_subnet(),
+            name=self.network_names[index],
+            cidr=self._next_cidr(index),
             ip_version="4",
             enable_dhcp=True,
             dns_nameservers=["8.8.8.8", "9.9.9.9"],
         )
 
-        if not self.obj_subnet:
-            raise RuntimeError(f"No subnet created {self.network_name}")
+        if not subnet:
+            raise RuntimeError(f"No subnet created {self.network_names[index]}")
+        self.conn.network.set_tags(subnet, self._tags())
+        obj_subnet = ResourceRecord.from_resource(subnet)
+        self.subnets[index] = obj_subnet
 
         LOGGER.info(
-            f"Created subnet {self.obj_subnet.name}/{self.obj_subnet.id} in {self.project.name}/{self.project.id}"
+            "Created subnet %s/%s with %s in %s/%s",
+            obj_subnet.name,
+            obj_subnet.id,
+            subnet.cidr,
+            self.project.name,
+            self.project.id,
+            extra=self.log_fields(subnet_id=obj_subnet.id),
         )
 
-        return self.obj_subnet
-
-    def delete_network(self):
+        return obj_subnet
 
-        if self.obj_router:
-            ports = self.conn.network.ports(device_id=self.obj_router.id)
-            for port in ports:
-                if port.device_owner == "network:router_interface":
-                    self.conn.network.remove_interface_from_router(
-                        self.obj_router, subnet_id=port.fixed_ips[0]["subnet_id"]
-                    )
-                    LOGGER.warning(
-                        f"Removed interface from subnet: {port.fixed_ips[0]['subnet_id']}"
-                    )
-            self.conn.network.update_router(self.obj_router, external_gateway_info=None)
-            LOGGER.warning(f"Removed gateway from router {self.obj_router.id}")
-            self.conn.delete_router(self.obj_router)
-            LOGGER.warning(
-                f"Deleted router {self.obj_router.id}/{self.obj_router.name}"
+    @staticmethod
+    def port_name(machine_name: str) -> str:
+        return f"port-{machine_name}"
+
+    def create_and_get_ports(
+        self, machine_networks: dict[str, NetworkRecord]
+    ) -> dict[str, str]:
+        # The missing ports of all machines are created by one bulk request, nova attaches
+        # the ports at boot time without creating them in neutron
+        if not self.obj_ingress_security_group or not self.obj_egress_security_group:
+            raise RuntimeError("The security groups do not exist")
+
+        ports: dict[str, str] = {
+            port.name: port.id
+            for port in self.conn.network.ports(project_id=self.project.id)
+            if not port.device_id
+        }
+        missing = [
+            machine_name
+            for machine_name in machine_networks
+            if WorkloadGeneratorNetwork.port_name(machine_name) not in ports
+        ]
+        if missing:
+            started = time.monotonic()
+            # Older neutron releases reject tags in the body, the ports are tagged one by one then
+            tags_in_body = bool(
+                self.conn.network.find_extension("tag-ports-during-bulk-creation")
             )
+            for port in self.conn.network.create_ports(
+                [
+                    {
+                        "name": WorkloadGeneratorNetwork.port_name(machine_name),
+                        "network_id": machine_networks[machine_name].id,
+                        "project_id": self.project.id,
+                        "security_groups": [
+                            self.obj_ingress_security_group.id,
+                            self.obj_egress_security_group.id,
+                        ],
+                        **({"tags": self._tags()} if tags_in_body else {}),
+                    }
+                    for machine_name in missing
+                ]
+            ):
+                if not tags_in_body:
+                    self.conn.network.set_tags(port, self._tags())
+                ports[port.name] = port.id
+            Metrics.record("bulk_port_creation", time.monotonic() - started)
+            LOGGER.info(
+                "Created %d ports with one request in %s",
+                len(missing),
+                ProjectCache.lazy_ident(self.project.id),
+                extra=self.log_fields(),
+            )
+        return {
+            machine_name: ports[WorkloadGeneratorNetwork.port_name(machine_name)]
+            for machine_name in machine_networks
+        }
+
+    def delete_network(self):
+        for obj_router in self.routers:
+            if obj_router:
+                self._delete_router(obj_router)
+        for obj_network in self.networks:
+            if obj_network:
+                self._delete_network(obj_network)
+
+    def _delete_router(self, obj_router: ResourceRecord):
+        ports = self.conn.network.ports(device_id=obj_router.id)
+        for port in ports:
+            if port.device_owner == "network:router_interface":
+                self.conn.network.remove_interface_from_router(
+                    obj_router.id, subnet_id=port.fixed_ips[0]["subnet_id"]
+                )
+                LOGGER.warning(
+                    "Removed interface from subnet: %s",
+                    port.fixed_ips[0]["subnet_id"],
+                    extra=self.log_fields(router_id=obj_router.id),
+                )
+        self.conn.network.update_router(obj_router.id, external_gateway_info=None)
+        LOGGER.warning(
+            "Removed gateway from router %s",
+            obj_router.id,
+            extra=self.log_fields(router_id=obj_router.id),
+        )
+        self.conn.delete_router(obj_router.id)
+        LOGGER.warning(
+            "Deleted router %s/%s",
+            obj_router.id,
+            obj_router.name,
+            extra=self.log_fields(router_id=obj_router.id),
+        )
 
-        if self.obj_network:
-            for subnet_id in self.obj_network.subnet_ids:
-                try:
-                    subnet_obj = self.conn.get_subnet_by_id(subnet_id)
-                    if subnet_obj:
-                        for port in self.conn.network.ports():
-                            # port_subnet_ids = [x["subnet_id"] for x in port.fixed_ips if port.status == "DOWN"]
-                            port_subnet_ids = [x["subnet_id"] for x in port.fixed_ips]
-                            if subnet_obj.id in port_subnet_ids:
-                                LOGGER.warning(f"Delete port {port.id}")
-                                if port.device_owner == "network:router_interface":
-                                    self.conn.network.remove_interface_from_router(
-                                        port.device_id, port_id=port.id
-                                    )
-                                    self.conn.network.delete_router(port.device_id)
-                                else:
-                                    self.conn.network.delete_port(port.id)
+    def _delete_network(self, obj_network: NetworkRecord):
+        # The ports are listed once for all subnets of the network
+        ports = list(self.conn.network.ports(network_id=obj_network.id))
+        for subnet_id in obj_network.subnet_ids:
+            try:
+                subnet_obj = self.conn.get_subnet_by_id(subnet_id)
+                if subnet_obj:
+                    remaining_ports = []
+                    for port in ports:
+                        port_subnet_ids = [x["subnet_id"] for x in port.fixed_ips]
+                        if subnet_obj.id not in port_subnet_ids:
+                            remaining_ports.append(port)
+                            continue
                         LOGGER.warning(
-                            f"Delete subnet {subnet_obj.name} of {ProjectCache.ident_by_id(self.obj_subnet.project_id)}"
+                            "Delete port %s",
+                            port.id,
+                            extra=self.log_fields(port_id=port.id),
                         )
-                        self.conn.network.delete_subnet(
-                            subnet_obj, ignore_missing=False
-                        )
-                except ResourceNotFound:
-                    LOGGER.warning(f"Already deleted subnet {subnet_id}")
-
-            self.conn.network.delete_network(self.obj_network, ignore_missing=False)
-            LOGGER.warning(
-                f"Deleted network {self.obj_network.name} / {self.obj_network.id}"
-            )
+                        if port.device_owner == "network:router_interface":
+                            self.conn.network.remove_interface_from_router(
+                                port.device_id, port_id=port.id
+                            )
+                            self.conn.network.delete_router(port.device_id)
+                        else:
+                            self.conn.network.delete_port(port.id)
+                    ports = remaining_ports
+                    LOGGER.warning(
+                        "Delete subnet %s of %s",
+                        subnet_obj.name,
+                        ProjectCache.lazy_ident(self.project.id),
+                        extra=self.log_fields(subnet_id=subnet_obj.id),
+                    )
+                    self.conn.network.delete_subnet(subnet_obj, ignore_missing=False)
+            except ResourceNotFound:
+                LOGGER.warning(
+                    "Already deleted subnet %s",
+                    subnet_id,
+                    extra=self.log_fields(subnet_id=subnet_id),
+                )
+
+        self.conn.network.delete_network(obj_network.id, ignore_missing=False)
+        LOGGER.warning(
+            "Deleted network %s / %s",
+            obj_network.name,
+            obj_network.id,
+            extra=self.log_fields(network_id=obj_network.id),
+        )
 
-    def create_and_get_ingress_security_group(self) -> SecurityGroup:
+    def create_and_get_ingress_security_group(self) -> ResourceRecord:
         if self.obj_ingress_security_group:
             return self.obj_ingress_security_group
 
         LOGGER.info(
-            f"Creating ingress security group {self.security_group_name_ingress} for {ProjectCache.ident_by_id(self.project.id)}"
+            "Creating ingress security group %s for %s",
+            self.security_group_name_ingress,
+            ProjectCache.lazy_ident(self.project.id),
+            extra=self.log_fields(),
         )
-        self.obj_ingress_security_group = self.conn.network.create_security_group(
+        security_group = self.conn.network.create_security_group(
             name=self.security_group_name_ingress,
             description="Security group to allow SSH access to instances",
         )
 
-        if not self.obj_ingress_security_group:
+        if not security_group:
             raise RuntimeError("No ingress security group was created")
+        self.conn.network.set_tags(security_group, self._tags())
+        self.obj_ingress_security_group = ResourceRecord.from_resource(security_group)
 
         self.conn.network.create_security_group_rule(
             security_group_id=self.obj_ingress_security_group.id,
@@ -287,21 +472,26 @@ class WorkloadGeneratorNetwork:
         )
         return self.obj_ingress_security_group
 
-    def create_and_get_egress_security_group(self) -> SecurityGroup:
+    def create_and_get_egress_security_group(self) -> ResourceRecord:
         if self.obj_egress_security_group:
             return self.obj_egress_security_group
 
         LOGGER.info(
-            f"Creating egress security group {self.security_group_name_egress} for "
-            f"project {self.project.name}/{self.project.domain_id}"
+            "Creating egress security group %s for project %s/%s",
+            self.security_group_name_egress,
+            self.project.name,
+            self.project.domain_id,
+            extra=self.log_fields(),
         )
-        self.obj_egress_security_group = self.conn.network.create_security_group(
+        security_group = self.conn.network.create_security_group(
             name=self.security_group_name_egress,
             description="Security group to allow outgoing access",
         )
 
-        if not self.obj_egress_security_group:
+        if not security_group:
             raise RuntimeError("No ingress security group was created")
+        self.conn.network.set_tags(security_group, self._tags())
+        self.obj_egress_security_group = ResourceRecord.from_resource(security_group)
 
         self.conn.network.create_security_group_rule(
             security_group_id=self.obj_egress_security_group.id,
@@ -0,0 +1,118 @@
+import logging
+import os
+import random
+import time
+
+from openstack.connection import Connection
+
+from .helpers import Config, ProjectCache
+from .records import ProjectRecord
+from ..metrics import Metrics
+
+LOGGER = logging.getLogger()
+
+# The chunk size used to stream the downloaded objects
+DOWNLOAD_CHUNK_SIZE = 65536
+
+
+class PayloadBuffer:
+    # One random buffer of the largest object size is allocated per process, the payloads
+    # of all requests are read only memoryview slices of it
+    _buffer: bytes = b""
+
+    @staticmethod
+    def payload(size: int) -> memoryview:
+        if len(PayloadBuffer._buffer) < size:
+            PayloadBuffer._buffer = os.urandom(size)
+        return memoryview(PayloadBuffer._buffer)[:size]
+
+
+class WorkloadGeneratorObjectStorage:
+    # Uses the connection of the project user, the containers and objects belong to the project
+
+    def __init__(self, conn: Connection, project: ProjectRecord):
+        self.conn = conn
+        self.project = project
+        self.settings = Config.settings().object_workload
+        self.container_prefix = f"owg-{project.name}-"
+
+    def log_fields(self, **resource_ids: str) -> dict[str, str]:
+        return {
+            "project_id": self.project.id,
+            "domain_id": self.project.domain_id,
+            **resource_ids,
+        }
+
+    def container_names(self) -> list[str]:
+        return [
+            f"{self.container_prefix}{index}"
+            for index in range(self.settings.containers)
+        ]
+
+    def planned_objects(self) -> list[tuple[str, str, int]]:
+        # The sizes are drawn from the weighted distribution with the project name as seed,
+        # every run creates the same objects in a project
+        rng = random.Random(self.project.name)
+        sizes, weights = zip(*self.settings.sizes_kb)
+        containers = self.container_names()
+        return [
+            (containers[index % len(containers)], f"object-{index}", size_kb * 1024)
+            for index, size_kb in enumerate(
+                rng.choices(sizes, weights=weights, k=self.settings.objects)
+            )
+        ]
+
+    def create_containers(self):
+        for container_name in self.container_names():
+            self.conn.object_store.create_container(name=container_name)
+        LOGGER.info(
+            "Created %d containers in %s",
+            self.settings.containers,
+            ProjectCache.lazy_ident(self.project.id),
+            extra=self.log_fields(),
+        )
+
+    def put_object(self, container_name: str, object_name: str, size: int):
+        started = time.monotonic()
+        self.conn.object_store.upload_object(
+            container=container_name,
+            name=object_name,
+            data=PayloadBuffer.payload(size),
+        )
+        Metrics.record("object_put", time.monotonic() - started)
+
+    def get_object(self, container_name: str, object_name: str, size: int):
+        # The object is streamed and discarded, the client does not hold the whole object
+        started = time.monotonic()
+        received = 0
+        for chunk in self.conn.object_store.stream_object(
+            object_name, container=container_name, chunk_size=DOWNLOAD_CHUNK_SIZE
+        ):
+            received += len(chunk)
+        Metrics.record("object_get", time.monotonic() - started)
+        if received != size:
+            raise RuntimeError(
+                f"Received {received} bytes of {container_name}/{object_name} instead of {size}"
+            )
+
+    def delete_object(self, container_name: str, object_name: str, size: int):
+        started = time.monotonic()
+        self.conn.object_store.delete_object(
+            object_name, container=container_name, ignore_missing=False
+        )
+        Metrics.record("object_delete", time.monotonic() - started)
+
+    def delete_containers(self):
+        # Also removes the leftovers of failed or interrupted workloads
+        for container in self.conn.object_store.containers(
+            prefix=self.container_prefix
+        ):
+            for obj in self.conn.object_store.objects(container.name):
+                self.conn.object_store.delete_object(obj, container=container.name)
+            self.conn.object_store.delete_container(container.name)
+            LOGGER.warning(
+                "Deleted container %s in %s",
+                container.name,
+                ProjectCache.lazy_ident(self.project.id),
+                extra=self.log_fields(),
+            )
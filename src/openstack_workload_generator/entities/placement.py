@@ -0,0 +1,81 @@
+import logging
+from typing import Any
+
+from openstack.connection import Connection
+
+from .helpers import Config, ProjectCache
+from .records import ProjectRecord, ResourceRecord
+
+LOGGER = logging.getLogger()
+
+
+class WorkloadGeneratorPlacement:
+    # The availability zones are assigned round robin to all machines created by the process,
+    # a counter per project would put the first machine of every project into the same zone
+    _zone_counter: int = 0
+
+    def __init__(self, conn: Connection, project: ProjectRecord):
+        self.conn = conn
+        self.project = project
+        self.policy = Config.settings().vm.server_group_policy
+        self.server_group_name = f"server-group-{project.name}"
+        self.obj_server_group: ResourceRecord | None = None
+
+    def log_fields(self, **resource_ids: str) -> dict[str, str]:
+        return {
+            "project_id": self.project.id,
+            "domain_id": self.project.domain_id,
+            **resource_ids,
+        }
+
+    def _find_server_group(self) -> Any:
+        for server_group in self.conn.compute.server_groups():
+            if server_group.name == self.server_group_name:
+                return server_group
+        return None
+
+    def create_and_get_server_group(self):
+        if self.policy == "none" or self.obj_server_group is not None:
+            return
+        server_group = self._find_server_group()
+        if server_group is None:
+            server_group = self.conn.compute.create_server_group(
+                name=self.server_group_name, policy=self.policy
+            )
+            LOGGER.info(
+                "Created server group %s/%s with policy %s in %s",
+                server_group.name,
+                server_group.id,
+                self.policy,
+                ProjectCache.lazy_ident(self.project.id),
+                extra=self.log_fields(server_group_id=server_group.id),
+            )
+        self.obj_server_group = ResourceRecord(
+            id=server_group.id, name=server_group.name, project_id=self.project.id
+        )
+
+    def delete_server_group(self):
+        server_group = self._find_server_group()
+        if server_group is None:
+            return
+        self.conn.compute.delete_server_group(server_group.id)
+        LOGGER.warning(
+            "Deleted server group %s/%s in %s",
+            server_group.name,
+            server_group.id,
+            ProjectCache.lazy_ident(self.project.id),
+            extra=self.log_fields(server_group_id=server_group.id),
+        )
+
+    def server_arguments(self) -> dict[str, Any]:
+        # The arguments of create_server which define the placement of a server
+        arguments: dict[str, Any] = dict()
+        if self.obj_server_group is not None:
+            arguments["scheduler_hints"] = {"group": self.obj_server_group.id}
+        zones = Config.settings().vm.availability_zones
+        if zones:
+            arguments["availability_zone"] = zones[
+                WorkloadGeneratorPlacement._zone_counter % len(zones)
+            ]
+            WorkloadGeneratorPlacement._zone_counter += 1
+        return arguments
@@ -1,15 +1,19 @@
 import logging
-import os
-import sys
 
-import yaml
 from openstack.compute.v2.keypair import Keypair
 from openstack.connection import Connection
 from openstack.identity.v3.domain import Domain
-from openstack.identity.v3.project import Project
 
-from .helpers import ProjectCache, Config
+from .boot_source import WorkloadGeneratorBootSource
+from .data_volumes import WorkloadGeneratorDataVolumes
+from .helpers import ProjectCache, Config, ResourceTags
+from .image_upload import WorkloadGeneratorImageUpload
+from .placement import WorkloadGeneratorPlacement
 from .machine import WorkloadGeneratorMachine
+from .object_storage import WorkloadGeneratorObjectStorage
+from .records import NetworkRecord, ProjectRecord, ServerRecord
+from ..metrics import Metrics
+from ..readiness import ReadinessTarget, parse_server_timestamp
 from .user import WorkloadGeneratorUser
 from .network import WorkloadGeneratorNetwork
 
@@ -24,6 +28,7 @@ class WorkloadGeneratorProject:
         project_name: str,
         domain: Domain,
         user: WorkloadGeneratorUser,
+        record: ProjectRecord | None = None,
     ):
         self._admin_conn: Connection = admin_conn
         self._project_conn: Connection | None = None
@@ -33,8 +38,8 @@ class WorkloadGeneratorProject:
         self.domain: Domain = domain
         self.ssh_proxy_jump: str | None = None
         self.user: WorkloadGeneratorUser = user
-        self.obj: Project = self._admin_conn.identity.find_project(
-            project_name, domain_id=self.domain.id
+        self.obj: ProjectRecord = record or WorkloadGeneratorProject._find_project(
+            admin_conn, project_name, domain.id
         )
         if self.obj:
             ProjectCache.add(
@@ -58,13 +63,21 @@ class WorkloadGeneratorProject:
         )
         self.ssh_key: Keypair | None = None
 
+    def log_fields(self) -> dict[str, str | None]:
+        return {
+            "project_id": self.obj.id if self.obj else None,
+            "domain_id": self.domain.id,
+        }
+
     @property
     def project_conn(self) -> Connection:
         if self._project_conn:
             return self._project_conn
 
         LOGGER.info(
-            f"Establishing a connection for {ProjectCache.ident_by_id(self.obj.id)}"
+            "Establishing a connection for %s",
+            ProjectCache.lazy_ident(self.obj.id),
+            extra=self.log_fields(),
         )
         self._project_conn = self._admin_conn.connect_as(
             domain_id=self.obj.domain_id,
@@ -78,10 +91,15 @@ class WorkloadGeneratorProject:
             )
         return self._project_conn
 
+    @staticmethod
+    def _find_project(conn: Connection, project_name: str, domain_id: str):
+        project = conn.identity.find_project(project_name, domain_id=domain_id)
+        return ProjectRecord.from_project(project) if project else None
+
     @staticmethod
     def _get_network(
         conn: Connection,
-        obj: Project,
+        obj: ProjectRecord | None,
         security_group_name_ingress: str,
         security_group_name_egress: str,
     ) -> None | WorkloadGeneratorNetwork:
@@ -94,7 +112,7 @@ class WorkloadGeneratorProject:
     @staticmethod
     def _get_machines(
         conn: Connection,
-        obj: Project,
+        obj: ProjectRecord | None,
         security_group_name_ingress: str,
         security_group_name_egress: str,
     ) -> dict[str, WorkloadGeneratorMachine]:
@@ -109,8 +127,8 @@ class WorkloadGeneratorProject:
                 server.name,
                 security_group_name_ingress,
                 security_group_name_egress,
+                record=ServerRecord.from_server(server),
             )
-            workload_server.obj = server
             result[workload_server.machine_name] = workload_server
         return result
 
@@ -123,6 +141,56 @@ class WorkloadGeneratorProject:
                 result.append(self.workload_machines[machine])
         return result
 
+    def list_servers(self) -> list[ServerRecord]:
+        if self.obj is None:
+            return []
+        return [
+            ServerRecord.from_server(server)
+            for server in self._admin_conn.compute.servers(
+                all_projects=True, project_id=self.obj.id
+            )
+        ]
+
+    def refresh_machines(self):
+        servers = {server.name: server for server in self.list_servers()}
+        for name, workload_machine in self.workload_machines.items():
+            if name in servers:
+                workload_machine.obj = servers[name]
+                workload_machine.update_assigned_ips()
+                if workload_machine.floating_ip and not self.ssh_proxy_jump:
+                    self.ssh_proxy_jump = workload_machine.floating_ip
+
+    def get_readiness_targets(self) -> list[ReadinessTarget]:
+        self.refresh_machines()
+        result: list[ReadinessTarget] = []
+        for name, workload_machine in sorted(self.workload_machines.items()):
+            if workload_machine.floating_ip:
+                address, proxy_jump = workload_machine.floating_ip, None
+            elif workload_machine.internal_ip and self.ssh_proxy_jump:
+                address, proxy_jump = workload_machine.internal_ip, self.ssh_proxy_jump
+            else:
+                LOGGER.warning(
+                    "Machine %s in %s has no reachable address, not probing it (use --wait_for_machines)",
+                    name,
+                    ProjectCache.lazy_ident(self.obj.id),
+                    extra=workload_machine.log_fields(),
+                )
+                continue
+            result.append(
+                ReadinessTarget(
+                    name=f"{self.domain.name}/{self.project_name}/{name}",
+                    address=address,
+                    proxy_jump=proxy_jump,
+                    # Reused machines are measured from the start of the probing
+                    created_at=parse_server_timestamp(
+                        workload_machine.obj.created_at
+                        if workload_machine.obj and workload_machine.created_in_run
+                        else None
+                    ),
+                )
+            )
+        return result
+
     def get_role_id_by_name(self, role_name: str, required: bool = True) -> str | None:
         for role in self._admin_conn.identity.roles():
             if role.name == role_name:
@@ -136,7 +204,10 @@ class WorkloadGeneratorProject:
         role_id = self.get_role_id_by_name(role_name, required=required)
         if role_id is None and not required:
             LOGGER.info(
-                f"No such role {role_name} not assigning it to {ProjectCache.ident_by_id(self.obj.id)}"
+                "No such role %s not assigning it to %s",
+                role_name,
+                ProjectCache.lazy_ident(self.obj.id),
+                extra=self.log_fields(),
             )
             return
 
@@ -144,7 +215,11 @@ class WorkloadGeneratorProject:
             user=self.user.obj.id, project=self.obj.id, role=role_id
         )
         LOGGER.info(
-            f"Assigned {role_name} to {self.user.obj.id} for {ProjectCache.ident_by_id(self.obj.id)}"
+            "Assigned %s to %s for %s",
+            role_name,
+            self.user.obj.id,
+            ProjectCache.lazy_ident(self.obj.id),
+            extra=self.log_fields(),
         )
 
     def assign_role_to_global_admin_for_project(self, role_name: str):
@@ -153,90 +228,39 @@ class WorkloadGeneratorProject:
             user=user_id, project=self.obj.id, role=self.get_role_id_by_name(role_name)
         )
         LOGGER.info(
-            f"Assigned global admin {role_name} to {user_id} for {ProjectCache.ident_by_id(self.obj.id)}"
+            "Assigned global admin %s to %s for %s",
+            role_name,
+            user_id,
+            ProjectCache.lazy_ident(self.obj.id),
+            extra=self.log_fields(),
         )
 
-    def _set_quota(self, quota_category: str):
-        if quota_category == "compute_quotas":
-            api_area = "compute"
-            current_quota = self._admin_conn.compute.get_quota_set(self.obj.id)
-        elif quota_category == "block_storage_quotas":
-            api_area = "volume"
-            current_quota = self._admin_conn.volume.get_quota_set(self.obj.id)
-        elif quota_category == "network_quotas":
-            api_area = "network"
-            current_quota = self._admin_conn.get_network_quotas(self.obj.id)
-        else:
-            raise RuntimeError(f"Not implemented: {quota_category}")
-
-        # service_obj = getattr(self._admin_conn, api_area)
-        # current_quota = service_obj.get_quota_set(self.obj.id)
-        LOGGER.debug(f"current quotas for {quota_category} : {current_quota}")
-
-        new_quota = {}
-        for key_name in Config.configured_quota_names(quota_category):
-            try:
-                current_value = getattr(current_quota, key_name)
-            except AttributeError:
-                LOGGER.error(
-                    f"No such {api_area} quota field {key_name} in {current_quota}"
-                )
-                sys.exit()
-
-            new_value = Config.quota(
-                key_name, quota_category, getattr(current_quota, key_name)
-            )
-            if current_value != new_value:
-                LOGGER.info(
-                    f"New {api_area} quota for {ProjectCache.ident_by_id(self.obj.id)}"
-                    f": {key_name} : {current_value} -> {new_value}"
-                )
-                new_quota[key_name] = new_value
-
-        if len(new_quota):
-            set_quota_method = getattr(self._admin_conn, f"set_{api_area}_quotas")
-            set_quota_method(self.obj.id, **new_quota)
-            LOGGER.info(
-                f"Configured {api_area} quotas for {ProjectCache.ident_by_id(self.obj.id)}"
-            )
-        else:
-            LOGGER.info(
-                f"{api_area.capitalize()} quotas for {ProjectCache.ident_by_id(self.obj.id)} not changed"
-            )
-
-    def adapt_quota(self):
-        self._set_quota("compute_quotas")
-        self._set_quota("block_storage_quotas")
-        self._set_quota("network_quotas")
-
-    def create_and_get_project(self) -> Project:
+    def create_and_get_project(self) -> ProjectRecord:
+        # The quotas are reconciled for all projects at once before the network setup
         if self.obj:
-            self.adapt_quota()
-            self.workload_network = WorkloadGeneratorNetwork(
-                self._admin_conn,
-                self.obj,
-                self.security_group_name_ingress,
-                self.security_group_name_egress,
-            )
-            self.workload_network.create_and_get_network_setup()
             return self.obj
 
-        self.obj = self._admin_conn.identity.create_project(
-            name=self.project_name,
-            domain_id=self.domain.id,
-            description="Auto generated",
-            enabled=True,
+        self.obj = ProjectRecord.from_project(
+            self._admin_conn.identity.create_project(
+                name=self.project_name,
+                domain_id=self.domain.id,
+                description="Auto generated",
+                enabled=True,
+                tags=ResourceTags.for_domain_id(self.domain.id),
+            )
         )
         ProjectCache.add(
             self.obj.id, {"name": self.obj.name, "domain_id": self.obj.domain_id}
         )
-        LOGGER.info(f"Created {ProjectCache.ident_by_id(self.obj.id)}")
-        self.adapt_quota()
-
+        LOGGER.info(
+            "Created %s", ProjectCache.lazy_ident(self.obj.id), extra=self.log_fields()
+        )
         self.assign_role_to_user_for_project("manager")
         self.assign_role_to_user_for_project("load-balancer_member", required=False)
         self.assign_role_to_user_for_project("member")
+        return self.obj
 
+    def create_and_get_network_setup(self):
         self.workload_network = WorkloadGeneratorNetwork(
             self.project_conn,
             self.obj,
@@ -245,28 +269,52 @@ class WorkloadGeneratorProject:
         )
         self.workload_network.create_and_get_network_setup()
 
-        return self.obj
-
     def delete_project(self):
+        with Metrics.measure("project_teardown"):
+            self._delete_project()
+
+    def _delete_project(self):
 
         ##########################################################################################
         # CLEANUP THE PROJECT
+        if not WorkloadGeneratorDataVolumes(
+            self.project_conn, self.obj
+        ).detach_and_delete():
+            LOGGER.warning(
+                "Not all data volumes of %s are deleted, leaving them to the project cleanup",
+                ProjectCache.lazy_ident(self.obj.id),
+                extra=self.log_fields(),
+            )
+
         for workload_machine in self.workload_machines.values():
             workload_machine.delete_machine()
 
         for workload_machine in self.workload_machines.values():
             workload_machine.wait_for_delete()
 
+        WorkloadGeneratorPlacement(self.project_conn, self.obj).delete_server_group()
+        WorkloadGeneratorImageUpload(self.project_conn, self.obj).delete_images()
+        if self.project_conn.has_service("object-store"):
+            WorkloadGeneratorObjectStorage(
+                self.project_conn, self.obj
+            ).delete_containers()
+
         self.workload_network.delete_network()
 
-        LOGGER.warning(f"Cleanup of {ProjectCache.ident_by_id(self.obj.id)}")
+        LOGGER.warning(
+            "Cleanup of %s",
+            ProjectCache.lazy_ident(self.obj.id),
+            extra=self.log_fields(),
+        )
         self.project_conn.project_cleanup(dry_run=False, wait_timeout=300)
         # This function before this line should do all the steps above, but because of a bug this
         # does not work as expected currently
         # TODO: add bug report reference
         ##########################################################################################
 
-        LOGGER.warning(f"Deleting {ProjectCache.ident_by_id(self.obj.id)}")
+        LOGGER.warning(
+            "Deleting %s", ProjectCache.lazy_ident(self.obj.id), extra=self.log_fields()
+        )
         ##########################################################################################
         # DELETE THE PROJECT
         # The following function should also the steps beyond
@@ -276,7 +324,12 @@ class WorkloadGeneratorProject:
         # Delete the security groups after deleting the project because the "default" security
         # group not seems to be deletable when the project exists
         for sg in self._admin_conn.network.security_groups(project_id=self.obj.id):
-            LOGGER.warning(f"Deleting security group: {sg.name} ({sg.id})")
+            LOGGER.warning(
+                "Deleting security group: %s (%s)",
+                sg.name,
+                sg.id,
+                extra=self.log_fields(),
+            )
             self._admin_conn.network.delete_security_group(sg.id)
         ##########################################################################################
 
@@ -288,10 +341,55 @@ class WorkloadGeneratorProject:
             self.close_connection()
             return
 
-        floating_ips_amount = Config.get_number_of_floating_ips_per_project()
+        floating_ips_amount = (
+            Config.settings().network.number_of_floating_ips_per_project
+        )
+
+        # The new machines are spread round robin over the networks of the project
+        machine_networks: dict[str, NetworkRecord] = dict()
+        ports: dict[str, str] = dict()
+        new_machines = [
+            (nr, machine_name)
+            for nr, machine_name in enumerate(sorted(machines))
+            if machine_name not in self.workload_machines
+        ]
+        if new_machines:
+            if self.workload_network is None:
+                raise RuntimeError("No Workload network object")
+            for nr, machine_name in new_machines:
+                machine_networks[machine_name] = (
+                    self.workload_network.network_for_machine(nr)
+                )
+            if Config.settings().network.precreate_ports:
+                ports = self.workload_network.create_and_get_ports(machine_networks)
+
+        # Every machine class of the new machines has its own boot source, the root volumes
+        # of the new machines are cloned together before the servers are created
+        boot_sources: dict[str, WorkloadGeneratorBootSource] = dict()
+        class_machines: dict[str, list[str]] = dict()
+        for _, machine_name in new_machines:
+            machine_class = Config.settings().machine_class(
+                self.project_name, machine_name
+            )
+            if machine_class.name not in boot_sources:
+                boot_source = WorkloadGeneratorBootSource(
+                    self.project_conn, self.obj, machine_class
+                )
+                boot_source.create_and_get_boot_source()
+                boot_sources[machine_class.name] = boot_source
+            class_machines.setdefault(machine_class.name, []).append(machine_name)
+        for class_name, machine_names in class_machines.items():
+            boot_sources[class_name].clone_golden_volumes(machine_names)
 
+        placement: WorkloadGeneratorPlacement | None = None
         for nr, machine_name in enumerate(sorted(machines)):
             if machine_name not in self.workload_machines:
+                machine_class = Config.settings().machine_class(
+                    self.project_name, machine_name
+                )
+                if placement is None:
+                    placement = WorkloadGeneratorPlacement(self.project_conn, self.obj)
+                    placement.create_and_get_server_group()
                 machine = WorkloadGeneratorMachine(
                     self.project_conn,
                     self.obj,
@@ -300,14 +398,14 @@ class WorkloadGeneratorProject:
                     self.security_group_name_egress,
                 )
 
-                if (
-                    self.workload_network is None
-                    or self.workload_network.obj_network is None
-                ):
-                    raise RuntimeError("No Workload network object")
-
                 machine.create_or_get_server(
-                    self.workload_network.obj_network, wait_for_machines
+                    machine_networks[machine_name],
+                    machine_class,
+                    boot_sources[machine_class.name],
+                    placement,
+                    wait_for_machines,
+                    nr,
+                    port_id=ports.get(machine_name),
                 )
 
                 if machine.floating_ip:
@@ -320,9 +418,19 @@ class WorkloadGeneratorProject:
                 self.ssh_proxy_jump = self.workload_machines[machine_name].floating_ip
                 floating_ips_amount -= 1
 
+        if Config.settings().vm.data_volumes > 0 and not WorkloadGeneratorDataVolumes(
+            self.project_conn, self.obj
+        ).create_and_attach(
+            [self.workload_machines[machine_name] for machine_name in sorted(machines)]
+        ):
+            raise RuntimeError(
+                f"Unable to create the data volumes of {ProjectCache.ident_by_id(self.obj.id)}"
+            )
+
         self.close_connection()
 
-    def dump_inventory_hosts(self, directory_location: str):
+    def get_inventory_hosts(self) -> dict[str, dict[str, str | dict[str, str]]]:
+        result: dict[str, dict[str, str | dict[str, str]]] = dict()
         for name, workload_machine in self.workload_machines.items():
             if workload_machine.obj is None:
                 raise RuntimeError(
@@ -339,10 +447,8 @@ class WorkloadGeneratorProject:
             data: dict[str, str | dict[str, str]] = {
                 "openstack": {
                     "machine_id": workload_machine.obj.id,
-                    "machine_status": workload_machine.obj.status,
-                    "hypervisor": workload_machine.obj[
-                        "OS-EXT-SRV-ATTR:hypervisor_hostname"
-                    ],
+                    "machine_status": str(workload_machine.obj.status),
+                    "hypervisor": workload_machine.obj.hypervisor or "",
                     "domain": self.domain.name,
                     "project": workload_machine.project.name,
                 },
@@ -355,31 +461,33 @@ class WorkloadGeneratorProject:
             if self.ssh_proxy_jump and not workload_machine.floating_ip:
                 data["ansible_ssh_common_args"] = f"-o ProxyJump={self.ssh_proxy_jump} "
 
-            base_dir = f"{directory_location}/{self.domain.name}-{workload_machine.project.name}-{workload_machine.machine_name}"
-
-            filename = f"{base_dir}/data.yml"
-            os.makedirs(base_dir, exist_ok=True)
-            with open(filename, "w") as file:
-                LOGGER.info(
-                    f"Creating ansible_inventory_file {filename} for host {data['hostname']}"
-                )
-                yaml.dump(data, file, default_flow_style=False, explicit_start=True)
+            result[
+                f"{self.domain.name}-{workload_machine.project.name}-{workload_machine.machine_name}"
+            ] = data
+        return result
 
     def get_or_create_ssh_key(self):
         self.ssh_key = self.project_conn.compute.find_keypair(
-            Config.get_admin_vm_ssh_keypair_name()
+            Config.settings().vm.ssh_keypair_name
         )
         if not self.ssh_key:
             LOGGER.info(
-                f"Create SSH keypair '{Config.get_admin_vm_ssh_keypair_name()} in {ProjectCache.ident_by_id(self.obj.id)}"
+                "Create SSH keypair '%s' in %s",
+                Config.settings().vm.ssh_keypair_name,
+                ProjectCache.lazy_ident(self.obj.id),
+                extra=self.log_fields(),
             )
             self.ssh_key = self.project_conn.compute.create_keypair(
-                name=Config.get_admin_vm_ssh_keypair_name(),
-                public_key=Config.get_admin_vm_ssh_key(),
+                name=Config.settings().vm.ssh_keypair_name,
+                public_key=Config.settings().vm.ssh_key,
             )
 
     def close_connection(self):
-        LOGGER.info(f"Closing connection for {ProjectCache.ident_by_id(self.obj.id)}")
+        LOGGER.info(
+            "Closing connection for %s",
+            ProjectCache.lazy_ident(self.obj.id),
+            extra=self.log_fields(),
+        )
         if self._project_conn:
             self._project_conn.close()
             self._project_conn = None
@@ -394,7 +502,7 @@ class WorkloadGeneratorProject:
                 "user_domain_name": self.domain.name,
                 "password": self.user.user_password,
             },
-            "verify": Config.get_verify_ssl_certificate(),
+            "verify": Config.settings().verify_ssl_certificate,
             "cacert": self.project_conn.verify,
             "identity_api_version": "3",
         }
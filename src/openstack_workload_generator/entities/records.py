@@ -0,0 +1,91 @@
+import sys
+from dataclasses import dataclass
+from typing import Any
+
+from openstack.compute.v2.server import Server
+from openstack.identity.v3.project import Project
+from openstack.network.v2.network import Network
+
+# The entity classes only keep these records instead of the full openstacksdk resources,
+# a resource carries all attributes of the api response and the connection it was fetched with.
+# Repeated values like status and hypervisor names are interned.
+
+
+def _intern(value: str | None) -> str | None:
+    return sys.intern(value) if value is not None else None
+
+
+@dataclass(slots=True)
+class ServerRecord:
+    id: str
+    name: str
+    status: str | None
+    project_id: str
+    addresses: tuple[tuple[str, str], ...]
+    hypervisor: str | None
+    availability_zone: str | None
+    created_at: str | None
+    task_state: str | None
+
+    @staticmethod
+    def from_server(server: Server) -> "ServerRecord":
+        # (type, address) of all networks, the type is "fixed" or "floating"
+        addresses = tuple(
+            (sys.intern(address.get("OS-EXT-IPS:type", "fixed")), address["addr"])
+            for network_addresses in (server.addresses or {}).values()
+            for address in network_addresses
+        )
+        return ServerRecord(
+            id=server.id,
+            name=server.name,
+            status=_intern(server.status),
+            project_id=server.project_id,
+            addresses=addresses,
+            hypervisor=_intern(server.hypervisor_hostname),
+            availability_zone=_intern(server.availability_zone),
+            created_at=server.created_at,
+            task_state=_intern(server.task_state),
+        )
+
+
+@dataclass(slots=True)
+class ProjectRecord:
+    id: str
+    name: str
+    domain_id: str
+
+    @staticmethod
+    def from_project(project: Project) -> "ProjectRecord":
+        return ProjectRecord(
+            id=project.id, name=project.name, domain_id=project.domain_id
+        )
+
+
+@dataclass(slots=True)
+class ResourceRecord:
+    id: str
+    name: str
+    project_id: str
+
+    @staticmethod
+    def from_resource(resource: Any) -> "ResourceRecord":
+        return ResourceRecord(
+            id=resource.id, name=resource.name, project_id=resource.project_id
+        )
+
+
+@dataclass(slots=True)
+class NetworkRecord:
+    id: str
+    name: str
+    project_id: str
+    subnet_ids: tuple[str, ...]
+
+    @staticmethod
+    def from_network(network: Network) -> "NetworkRecord":
+        return NetworkRecord(
+            id=network.id,
+            name=network.name,
+            project_id=network.project_id,
+            subnet_ids=tuple(network.subnet_ids or ()),
+        )
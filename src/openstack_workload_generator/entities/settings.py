@@ -0,0 +1,437 @@
+import random
+import re
+from dataclasses import dataclass
+from typing import Any
+
+from .addressing import ipv4_network
+
+QUOTA_CATEGORIES = ["compute_quotas", "block_storage_quotas", "network_quotas"]
+
+# Configuration keys with structured values which are not validated by a value rule
+STRUCTURED_KEYS = [
+    *QUOTA_CATEGORIES,
+    "payload_scripts",
+    "machine_classes",
+    "machine_class_weights",
+]
+
+PAYLOAD_SCRIPT_NAME = re.compile(r"[a-zA-Z0-9][a-zA-Z0-9._-]*")
+
+
+@dataclass(frozen=True, slots=True)
+class ValueRule:
+    pattern: re.Pattern
+    multi_line: bool = False
+
+
+def _rule(regex: str, multi_line: bool = False) -> ValueRule:
+    return ValueRule(re.compile(regex, re.MULTILINE | re.DOTALL), multi_line)
+
+
+# The patterns are compiled once, every value is validated when the profile is loaded
+VALUE_RULES: dict[str, ValueRule] = {
+    "admin_domain_password": _rule(r".{5,}"),
+    "admin_vm_password": _rule(r".+"),
+    "admin_vm_ssh_key": _rule(r"ssh-\S+\s\S+\s\S+", multi_line=True),
+    "admin_vm_ssh_keypair_name": _rule(r".+"),
+    "project_ipv4_subnet": _rule(r"\d+\.\d+\.\d+\.\d+/\d\d"),
+    "project_ipv4_supernet": _rule(r"\d+\.\d+\.\d+\.\d+/\d\d?"),
+    "project_ipv4_prefix_length": _rule(r"\d\d?"),
+    "networks_per_project": _rule(r"[1-9]\d*"),
+    "routers_per_project": _rule(r"[1-9]\d*"),
+    "public_network": _rule(r"[a-zA-Z][a-zA-Z0-9]*"),
+    "network_mtu": _rule(r"\d+"),
+    "number_of_floating_ips_per_project": _rule(r"[1-9]\d*"),
+    "network_precreate_ports": _rule(r"true|false|True|False"),
+    "vm_flavor": _rule(r".+"),
+    "vm_image": _rule(r".+"),
+    "vm_volume_size_gb": _rule(r"\d+"),
+    "vm_boot_source": _rule(r"image|volume|golden_volume|golden_snapshot"),
+    "vm_server_group_policy": _rule(r"none|anti-affinity|soft-anti-affinity"),
+    "vm_availability_zones": _rule(r"([^,\s]+(,[^,\s]+)*)?"),
+    "vm_machine_class_seed": _rule(r"\S+"),
+    "vm_data_volumes": _rule(r"\d+"),
+    "vm_data_volume_size_gb": _rule(r"[1-9]\d*"),
+    "vm_data_volume_type": _rule(r"\S*"),
+    "vm_data_volume_multiattach": _rule(r"true|false|True|False"),
+    "vm_data_volume_concurrency": _rule(r"[1-9]\d*"),
+    "image_uploads_per_project": _rule(r"\d+"),
+    "image_upload_file": _rule(r"\S*"),
+    "image_upload_size_mb": _rule(r"[1-9]\d*"),
+    "image_upload_chunk_size_kb": _rule(r"[1-9]\d*"),
+    "image_upload_concurrency": _rule(r"[1-9]\d*"),
+    "object_workload_objects": _rule(r"\d+"),
+    "object_workload_containers": _rule(r"[1-9]\d*"),
+    "object_workload_sizes_kb": _rule(r"\d+:[1-9]\d*(,\d+:[1-9]\d*)*"),
+    "object_workload_concurrency": _rule(r"[1-9]\d*"),
+    "verify_ssl_certificate": _rule(r"true|false|True|False"),
+    "cloud_init_extra_script": _rule(r".+", multi_line=True),
+    "wait_for_server_timeout": _rule(r"\d+"),
+    "readiness_timeout": _rule(r"\d+"),
+    "readiness_concurrency": _rule(r"[1-9]\d*"),
+    "readiness_ssh_user": _rule(r"[a-z_][a-z0-9_-]*"),
+    "readiness_ready_file": _rule(r"/\S+"),
+}
+
+
+def validated_value(config: dict[str, Any], key: str) -> str:
+    if key not in config or config[key] is None:
+        raise ValueError(f"{key} not in config")
+    rule = VALUE_RULES[key]
+    value = str(config[key])
+    lines = value.splitlines() if rule.multi_line else [value]
+    if not lines:
+        raise ValueError(f"{key} is empty")
+    for line in lines:
+        if not rule.pattern.fullmatch(line):
+            raise ValueError(
+                f"{key} : >>>{line}<<< : does not match to regex >>>{rule.pattern.pattern}<<<"
+            )
+    return "\n".join(lines)
+
+
+@dataclass(frozen=True, slots=True)
+class QuotaSettings:
+    values: tuple[tuple[str, int], ...] = ()
+
+    def names(self) -> list[str]:
+        return [name for name, _ in self.values]
+
+    def get(self, name: str, default_value: int) -> int:
+        for quota_name, value in self.values:
+            if quota_name == name:
+                return value
+        return default_value
+
+    @staticmethod
+    def from_dict(category: str, data: Any) -> "QuotaSettings":
+        if data is None:
+            return QuotaSettings()
+        if not isinstance(data, dict):
+            raise ValueError(f"{category} is not a dictionary")
+        for name, value in data.items():
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise ValueError(f"Quota {category} -> {name} is not an integer")
+        return QuotaSettings(tuple(sorted(data.items())))
+
+
+def payload_scripts_from_dict(data: Any) -> tuple[tuple[str, str], ...]:
+    if data is None:
+        return ()
+    if not isinstance(data, dict):
+        raise ValueError("payload_scripts is not a dictionary")
+    for name, script in data.items():
+        if not PAYLOAD_SCRIPT_NAME.fullmatch(str(name)):
+            raise ValueError(
+                f"payload_scripts : >>>{name}<<< : does not match to regex >>>{PAYLOAD_SCRIPT_NAME.pattern}<<<"
+            )
+        if not isinstance(script, str):
+            raise ValueError(f"Payload script {name} is not a string")
+    return tuple(sorted(data.items()))
+
+
+# The settings of a machine class and the profile keys of their defaults
+MACHINE_CLASS_KEYS: dict[str, str] = {
+    "flavor": "vm_flavor",
+    "image": "vm_image",
+    "volume_size_gb": "vm_volume_size_gb",
+    "boot_source": "vm_boot_source",
+    "cloud_init_extra_script": "cloud_init_extra_script",
+}
+
+DEFAULT_MACHINE_CLASS = "default"
+
+
+@dataclass(frozen=True, slots=True)
+class MachineClass:
+    name: str
+    weight: int
+    flavor: str
+    image: str
+    volume_size_gb: int
+    boot_source: str
+    cloud_init_extra_script: str
+
+
+def _weight(name: str, weight: Any) -> int:
+    if not isinstance(weight, int) or isinstance(weight, bool) or weight < 0:
+        raise ValueError(
+            f"The weight of machine class {name} is not a positive integer"
+        )
+    return weight
+
+
+def machine_classes_from_dict(
+    data: Any, config: dict[str, Any]
+) -> tuple[MachineClass, ...]:
+    # Without machine classes all machines use the vm_* settings of the profile
+    if data is None:
+        data = {DEFAULT_MACHINE_CLASS: {}}
+    if not isinstance(data, dict) or not data:
+        raise ValueError("machine_classes is not a dictionary")
+
+    machine_classes: list[MachineClass] = []
+    for name, class_config in sorted(data.items()):
+        if not PAYLOAD_SCRIPT_NAME.fullmatch(str(name)):
+            raise ValueError(
+                f"machine_classes : >>>{name}<<< : does not match to regex >>>{PAYLOAD_SCRIPT_NAME.pattern}<<<"
+            )
+        if not isinstance(class_config, dict):
+            raise ValueError(f"Machine class {name} is not a dictionary")
+        for key in class_config:
+            if key not in MACHINE_CLASS_KEYS and key != "weight":
+                raise ValueError(f"Unknown key {key} in machine class {name}")
+
+        # Every value is validated by the rule of the corresponding vm_* setting
+        values = {
+            profile_key: validated_value(
+                {profile_key: class_config.get(key, config.get(profile_key))},
+                profile_key,
+            )
+            for key, profile_key in MACHINE_CLASS_KEYS.items()
+        }
+        machine_classes.append(
+            MachineClass(
+                name=str(name),
+                weight=_weight(name, class_config.get("weight", 1)),
+                flavor=values["vm_flavor"],
+                image=values["vm_image"],
+                volume_size_gb=int(values["vm_volume_size_gb"]),
+                boot_source=values["vm_boot_source"],
+                cloud_init_extra_script=values["cloud_init_extra_script"],
+            )
+        )
+    if sum(machine_class.weight for machine_class in machine_classes) == 0:
+        raise ValueError("The weights of all machine classes are 0")
+    return tuple(machine_classes)
+
+
+def machine_class_weights_from_dict(
+    data: Any, machine_classes: tuple[MachineClass, ...]
+) -> tuple[tuple[str, tuple[tuple[str, int], ...]], ...]:
+    # The weights of the machine classes per project name, overriding the weights of the classes
+    if data is None:
+        return ()
+    if not isinstance(data, dict):
+        raise ValueError("machine_class_weights is not a dictionary")
+    names = {machine_class.name for machine_class in machine_classes}
+    result = []
+    for project_name, weights in sorted(data.items()):
+        if not isinstance(weights, dict) or not weights:
+            raise ValueError(
+                f"The machine class weights of project {project_name} are not a dictionary"
+            )
+        for name, weight in weights.items():
+            if name not in names:
+                raise ValueError(
+                    f"Unknown machine class {name} in the weights of project {project_name}"
+                )
+            _weight(name, weight)
+        if sum(weights.values()) == 0:
+            raise ValueError(
+                f"The machine class weights of project {project_name} are all 0"
+            )
+        result.append((str(project_name), tuple(sorted(weights.items()))))
+    return tuple(result)
+
+
+@dataclass(frozen=True, slots=True)
+class VmSettings:
+    flavor: str
+    image: str
+    volume_size_gb: int
+    boot_source: str
+    server_group_policy: str
+    availability_zones: tuple[str, ...]
+    machine_class_seed: str
+    data_volumes: int
+    data_volume_size_gb: int
+    data_volume_type: str
+    data_volume_multiattach: bool
+    data_volume_concurrency: int
+    admin_password: str
+    ssh_keypair_name: str
+    ssh_key: str
+    cloud_init_extra_script: str
+    wait_for_server_timeout: int
+
+
+@dataclass(frozen=True, slots=True)
+class NetworkSettings:
+    public_network: str
+    project_ipv4_subnet: str
+    ipv4_supernet: str
+    ipv4_prefix_length: int
+    networks_per_project: int
+    routers_per_project: int
+    mtu: int
+    number_of_floating_ips_per_project: int
+    precreate_ports: bool
+
+    def __post_init__(self):
+        ipv4_network(self.project_ipv4_subnet)
+        supernet = ipv4_network(self.ipv4_supernet)
+        if not supernet.prefixlen <= self.ipv4_prefix_length <= 30:
+            raise ValueError(
+                f"project_ipv4_prefix_length {self.ipv4_prefix_length} does not fit into {supernet}"
+            )
+        # Every router is attached to at least one network, additional routers would stay unused
+        if self.routers_per_project > self.networks_per_project:
+            raise ValueError(
+                f"routers_per_project {self.routers_per_project} is larger than "
+                f"networks_per_project {self.networks_per_project}"
+            )
+
+
+@dataclass(frozen=True, slots=True)
+class ReadinessSettings:
+    timeout: int
+    concurrency: int
+    ssh_user: str
+    ready_file: str
+
+
+@dataclass(frozen=True, slots=True)
+class ImageUploadSettings:
+    count: int
+    file: str
+    size_mb: int
+    chunk_size_kb: int
+    concurrency: int
+
+
+@dataclass(frozen=True, slots=True)
+class ObjectWorkloadSettings:
+    objects: int
+    containers: int
+    # The object sizes in KB with their weight
+    sizes_kb: tuple[tuple[int, int], ...]
+    concurrency: int
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    admin_domain_password: str
+    verify_ssl_certificate: bool
+    vm: VmSettings
+    network: NetworkSettings
+    readiness: ReadinessSettings
+    image_upload: ImageUploadSettings
+    object_workload: ObjectWorkloadSettings
+    compute_quotas: QuotaSettings
+    block_storage_quotas: QuotaSettings
+    network_quotas: QuotaSettings
+    payload_scripts: tuple[tuple[str, str], ...] = ()
+    machine_classes: tuple[MachineClass, ...] = ()
+    machine_class_weights: tuple[tuple[str, tuple[tuple[str, int], ...]], ...] = ()
+
+    def machine_class(self, project_name: str, machine_name: str) -> MachineClass:
+        # The class only depends on the seed and the names, adding machines to a project does not
+        # change the classes of the existing machines
+        weights = dict(self.machine_class_weights).get(project_name)
+        if weights is None:
+            weights = tuple(
+                (machine_class.name, machine_class.weight)
+                for machine_class in self.machine_classes
+            )
+        rng = random.Random(
+            f"{self.vm.machine_class_seed}/{project_name}/{machine_name}"
+        )
+        names, class_weights = zip(*weights)
+        name = rng.choices(names, weights=class_weights)[0]
+        for machine_class in self.machine_classes:
+            if machine_class.name == name:
+                return machine_class
+        raise RuntimeError(f"No such machine class {name}")
+
+    def quotas(self, quota_category: str) -> QuotaSettings:
+        if quota_category not in QUOTA_CATEGORIES:
+            raise RuntimeError(f"Not implemented: {quota_category}")
+        return getattr(self, quota_category)
+
+    @staticmethod
+    def from_dict(config: dict[str, Any]) -> "Settings":
+        def value(key: str) -> str:
+            return validated_value(config, key)
+
+        machine_classes = machine_classes_from_dict(
+            config.get("machine_classes"), config
+        )
+        return Settings(
+            admin_domain_password=value("admin_domain_password"),
+            verify_ssl_certificate=value("verify_ssl_certificate").lower() != "false",
+            vm=VmSettings(
+                flavor=value("vm_flavor"),
+                image=value("vm_image"),
+                volume_size_gb=int(value("vm_volume_size_gb")),
+                boot_source=value("vm_boot_source"),
+                server_group_policy=value("vm_server_group_policy"),
+                availability_zones=tuple(
+                    zone for zone in value("vm_availability_zones").split(",") if zone
+                ),
+                machine_class_seed=value("vm_machine_class_seed"),
+                data_volumes=int(value("vm_data_volumes")),
+                data_volume_size_gb=int(value("vm_data_volume_size_gb")),
+                data_volume_type=value("vm_data_volume_type"),
+                data_volume_multiattach=value("vm_data_volume_multiattach").lower()
+                == "true",
+                data_volume_concurrency=int(value("vm_data_volume_concurrency")),
+                admin_password=value("admin_vm_password"),
+                ssh_keypair_name=value("admin_vm_ssh_keypair_name"),
+                ssh_key=value("admin_vm_ssh_key"),
+                cloud_init_extra_script=value("cloud_init_extra_script"),
+                wait_for_server_timeout=int(value("wait_for_server_timeout")),
+            ),
+            network=NetworkSettings(
+                public_network=value("public_network"),
+                project_ipv4_subnet=value("project_ipv4_subnet"),
+                ipv4_supernet=value("project_ipv4_supernet"),
+                ipv4_prefix_length=int(value("project_ipv4_prefix_length")),
+                networks_per_project=int(value("networks_per_project")),
+                routers_per_project=int(value("routers_per_project")),
+                mtu=int(value("network_mtu")),
+                number_of_floating_ips_per_project=int(
+                    value("number_of_floating_ips_per_project")
+                ),
+                precreate_ports=value("network_precreate_ports").lower() == "true",
+            ),
+            readiness=ReadinessSettings(
+                timeout=int(value("readiness_timeout")),
+                concurrency=int(value("readiness_concurrency")),
+                ssh_user=value("readiness_ssh_user"),
+                ready_file=value("readiness_ready_file"),
+            ),
+            image_upload=ImageUploadSettings(
+                count=int(value("image_uploads_per_project")),
+                file=value("image_upload_file"),
+                size_mb=int(value("image_upload_size_mb")),
+                chunk_size_kb=int(value("image_upload_chunk_size_kb")),
+                concurrency=int(value("image_upload_concurrency")),
+            ),
+            object_workload=ObjectWorkloadSettings(
+                objects=int(value("object_workload_objects")),
+                containers=int(value("object_workload_containers")),
+                sizes_kb=tuple(
+                    (int(size), int(weight))
+                    for size, weight in (
+                        item.split(":")
+                        for item in value("object_workload_sizes_kb").split(",")
+                    )
+                ),
+                concurrency=int(value("object_workload_concurrency")),
+            ),
+            compute_quotas=QuotaSettings.from_dict(
+                "compute_quotas", config.get("compute_quotas")
+            ),
+            block_storage_quotas=QuotaSettings.from_dict(
+                "block_storage_quotas", config.get("block_storage_quotas")
+            ),
+            network_quotas=QuotaSettings.from_dict(
+                "network_quotas", config.get("network_quotas")
+            ),
+            payload_scripts=payload_scripts_from_dict(config.get("payload_scripts")),
+            machine_classes=machine_classes,
+            machine_class_weights=machine_class_weights_from_dict(
+                config.get("machine_class_weights"), machine_classes
+            ),
+        )
@@ -14,7 +14,7 @@ class WorkloadGeneratorUser:
     def __init__(self, conn: Connection, user_name: str, domain: Domain):
         self.conn = conn
         self.user_name = user_name
-        self.user_password = Config.get_admin_domain_password()
+        self.user_password = Config.settings().admin_domain_password
         self.domain: Domain = domain
         self.obj = self.conn.identity.find_user(
             user_name, query={"domain_id": self.domain.id}
@@ -25,21 +25,32 @@ class WorkloadGeneratorUser:
         role_id = self.get_role_id_by_name(role_name, mandatory)
 
         if role_id is None:
-            LOGGER.warning(f"Role '{role_name}' not found, not assigning it")
+            LOGGER.warning(
+                "Role '%s' not found, not assigning it",
+                role_name,
+                extra={"user_id": self.obj.id, "domain_id": self.domain.id},
+            )
             return
 
         self.conn.identity.assign_project_role_to_user(
             self.obj.id, self.domain.id, role_id
         )
         LOGGER.info(
-            f"Assigned role '{role_name}' to user '{self.obj.name}' in {DomainCache.ident_by_id(self.domain.id)}"
+            "Assigned role '%s' to user '%s' in %s",
+            role_name,
+            self.obj.name,
+            DomainCache.lazy_ident(self.domain.id),
+            extra={"user_id": self.obj.id, "domain_id": self.domain.id},
         )
 
     def create_and_get_user(self) -> User:
 
         if self.obj:
             LOGGER.info(
-                f"User {self.user_name} already exists in {DomainCache.ident_by_id(self.domain.id)}"
+                "User %s already exists in %s",
+                self.user_name,
+                DomainCache.lazy_ident(self.domain.id),
+                extra={"user_id": self.obj.id, "domain_id": self.domain.id},
             )
             return self.obj
 
@@ -51,8 +62,12 @@ class WorkloadGeneratorUser:
         )
         self.assign_role_to_user("manager")
         LOGGER.info(
-            f"Created user {self.obj.name} / {self.obj.id} with password >>>{self.obj.password}<<< "
-            f"in {DomainCache.ident_by_id(self.domain.id)}"
+            "Created user %s / %s with password >>>%s<<< in %s",
+            self.obj.name,
+            self.obj.id,
+            self.obj.password,
+            DomainCache.lazy_ident(self.domain.id),
+            extra={"user_id": self.obj.id, "domain_id": self.domain.id},
         )
         return self.obj
 
@@ -60,7 +75,13 @@ class WorkloadGeneratorUser:
         if not self.obj:
             return
         self.conn.identity.delete_user(self.obj.id)
-        LOGGER.warning(f"Deleted user: {self.obj.name} / {self.obj.id}")
+        LOGGER.warning(
+            "Deleted user: %s / %s in %s",
+            self.obj.name,
+            self.obj.id,
+            DomainCache.lazy_ident(self.domain.id),
+            extra={"user_id": self.obj.id, "domain_id": self.domain.id},
+        )
         self.obj = None
 
     def get_role_id_by_name(self, role_name, mandatory: bool = True) -> str | None:
@@ -0,0 +1,63 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .entities.helpers import Config, ProjectCache
+from .entities.image_upload import MEGABYTE, WorkloadGeneratorImageUpload
+from .entities.project import WorkloadGeneratorProject
+from .metrics import Metrics
+
+LOGGER = logging.getLogger()
+
+
+def run_image_uploads(projects: list[WorkloadGeneratorProject]) -> bool:
+    # The uploads of all projects share one pool, the parallelism defines the load on glance
+    settings = Config.settings().image_upload
+    if settings.count == 0:
+        return True
+
+    # The project connections are established before the threads use them
+    uploads: list[tuple[WorkloadGeneratorImageUpload, str]] = []
+    for project in projects:
+        uploader = WorkloadGeneratorImageUpload(project.project_conn, project.obj)
+        uploads.extend((uploader, name) for name in uploader.missing_images())
+    if not uploads:
+        LOGGER.info("All %d images per project are already uploaded", settings.count)
+        return True
+
+    def upload(item: tuple[WorkloadGeneratorImageUpload, str]) -> int | None:
+        uploader, image_name = item
+        try:
+            return uploader.upload(image_name)
+        except Exception as e:
+            LOGGER.error(
+                "Unable to upload image %s to %s: %s",
+                image_name,
+                ProjectCache.lazy_ident(uploader.project.id),
+                e,
+                extra=uploader.log_fields(),
+            )
+            return None
+
+    LOGGER.info(
+        "Uploading %d images with a parallelism of %d",
+        len(uploads),
+        settings.concurrency,
+    )
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=settings.concurrency) as executor:
+        results = list(executor.map(upload, uploads))
+    duration = time.monotonic() - started
+
+    uploaded = sum(result for result in results if result is not None)
+    failed = results.count(None)
+    Metrics.record("image_upload_aggregate_mb_per_s", uploaded / MEGABYTE / duration)
+    LOGGER.info(
+        "Uploaded %d images with %.1f MB in %.1f seconds (%.1f MB/s), %d failed",
+        len(uploads) - failed,
+        uploaded / MEGABYTE,
+        duration,
+        uploaded / MEGABYTE / duration,
+        failed,
+    )
+    return failed == 0
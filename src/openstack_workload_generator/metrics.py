@@ -0,0 +1,213 @@
+import bisect
+import fnmatch
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import yaml
+
+LOGGER = logging.getLogger()
+
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+
+# Metrics which are no durations (counts, throughputs, capacities), logged without a unit
+UNITLESS_METRIC_PATTERNS = (
+    "*_per_*",
+    "*_errors",
+    "*_distribution_*",
+    "capacity_peak_*",
+)
+
+# The upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def metric_unit(name: str) -> str:
+    # The metric names of multiple clouds are prefixed with the cloud name
+    base_name = name.rsplit(":", 1)[-1]
+    if any(
+        fnmatch.fnmatchcase(base_name, pattern) for pattern in UNITLESS_METRIC_PATTERNS
+    ):
+        return ""
+    return "s"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        raise ValueError("Unable to compute a percentile of an empty list")
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return ordered[int(rank)]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {"count": 0}
+    result: dict[str, float] = {
+        "count": len(values),
+        "min": min(values),
+        "mean": sum(values) / len(values),
+        "max": max(values),
+    }
+    for pct in DEFAULT_PERCENTILES:
+        result[f"p{pct}"] = percentile(values, pct)
+    return result
+
+
+def mann_whitney_p_value(first: list[float], second: list[float]) -> float:
+    # Two sided p-value of the Mann-Whitney U test with the normal approximation (tie and
+    # continuity corrected), the test makes no assumption about the latency distributions
+    values = sorted([(value, 0) for value in first] + [(value, 1) for value in second])
+    count = len(values)
+    first_rank_sum = 0.0
+    tie_correction = 0.0
+    start = 0
+    while start < count:
+        end = start
+        while end + 1 < count and values[end + 1][0] == values[start][0]:
+            end += 1
+        rank = (start + end) / 2 + 1
+        first_rank_sum += rank * sum(
+            1 for nr in range(start, end + 1) if values[nr][1] == 0
+        )
+        ties = end - start + 1
+        tie_correction += ties**3 - ties
+        start = end + 1
+
+    size_first, size_second = len(first), len(second)
+    u = first_rank_sum - size_first * (size_first + 1) / 2
+    variance = (
+        size_first
+        * size_second
+        / 12
+        * ((count + 1) - tie_correction / (count * (count - 1)))
+    )
+    if variance <= 0:
+        return 1.0
+    z = max(0.0, abs(u - size_first * size_second / 2) - 0.5) / math.sqrt(variance)
+    return min(1.0, math.erfc(z / math.sqrt(2)))
+
+
+class LazyStats:
+    # Formats the statistics of summarize() when the log record is formatted, like LazyIdent
+    __slots__ = ("_stats", "_value_format", "_separator")
+
+    def __init__(
+        self,
+        stats: dict[str, float],
+        value_format: str = "{:.2f}",
+        separator: str = " ",
+    ):
+        self._stats = stats
+        self._value_format = value_format
+        self._separator = separator
+
+    def __str__(self) -> str:
+        return self._separator.join(
+            f"{key}={self._value_format.format(value)}"
+            for key, value in self._stats.items()
+            if key != "count"
+        )
+
+
+def histogram(
+    values: list[float], bounds: tuple[float, ...] = LATENCY_BUCKETS
+) -> list[tuple[float, int]]:
+    # The number of values per bucket, a value belongs to the first bucket with bound >= value,
+    # the last bucket with the bound inf holds all values above the largest bound
+    counts = [0] * (len(bounds) + 1)
+    for value in values:
+        counts[bisect.bisect_left(bounds, value)] += 1
+    return list(zip((*bounds, math.inf), counts))
+
+
+class Metrics:
+    _samples: dict[str, list[float]] = dict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def record(name: str, value: float):
+        with Metrics._lock:
+            Metrics._samples.setdefault(name, []).append(value)
+
+    @staticmethod
+    @contextmanager
+    def measure(name: str) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            Metrics.record(name, time.monotonic() - start)
+
+    @staticmethod
+    def samples(name: str) -> list[float]:
+        with Metrics._lock:
+            return list(Metrics._samples.get(name, []))
+
+    @staticmethod
+    def names() -> list[str]:
+        with Metrics._lock:
+            return sorted(Metrics._samples.keys())
+
+    @staticmethod
+    def export() -> dict[str, list[float]]:
+        with Metrics._lock:
+            return {name: list(values) for name, values in Metrics._samples.items()}
+
+    @staticmethod
+    def replace(samples: dict[str, list[float]]):
+        with Metrics._lock:
+            Metrics._samples = {name: list(values) for name, values in samples.items()}
+
+    @staticmethod
+    def summary() -> dict[str, dict[str, float]]:
+        return {name: summarize(Metrics.samples(name)) for name in Metrics.names()}
+
+    @staticmethod
+    def log_summary():
+        for name, stats in Metrics.summary().items():
+            if not stats["count"]:
+                continue
+            unit = metric_unit(name)
+            LOGGER.info(
+                "Metric %s: count=%d %s",
+                name,
+                stats["count"],
+                LazyStats(stats, "{:.2f}" + unit),
+            )
+
+    @staticmethod
+    def log_histogram(name: str):
+        values = Metrics.samples(name)
+        if not values:
+            return
+        buckets = histogram(values)
+        width = max(count for _, count in buckets)
+        LOGGER.info(
+            "Histogram of %s (%d samples):\n%s",
+            name,
+            len(values),
+            "\n".join(
+                f"{'<=' if math.isfinite(bound) else ' >'} "
+                f"{bound if math.isfinite(bound) else LATENCY_BUCKETS[-1]:>6}s "
+                f"{count:>8} {'#' * round(40 * count / width)}".rstrip()
+                for bound, count in buckets
+            ),
+        )
+
+    @staticmethod
+    def dump(filename: str):
+        data = {
+            "summary": Metrics.summary(),
+            "samples": {name: Metrics.samples(name) for name in Metrics.names()},
+        }
+        LOGGER.info("Writing metrics to %s", filename)
+        with open(filename, "w") as file:
+            yaml.dump(data, file, default_flow_style=False, explicit_start=True)
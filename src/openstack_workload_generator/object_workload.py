@@ -0,0 +1,109 @@
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .entities.helpers import Config, ProjectCache
+from .entities.image_upload import MEGABYTE
+from .entities.object_storage import PayloadBuffer, WorkloadGeneratorObjectStorage
+from .entities.project import WorkloadGeneratorProject
+from .metrics import Metrics
+
+LOGGER = logging.getLogger()
+
+# The operations are executed in this order, every phase runs all objects of all projects
+OBJECT_OPERATIONS = ("put", "get", "delete")
+
+
+ObjectTask = tuple[WorkloadGeneratorObjectStorage, str, str, int]
+
+
+def _execute(operation: str, task: ObjectTask) -> bool:
+    storage, container_name, object_name, size = task
+    try:
+        getattr(storage, f"{operation}_object")(container_name, object_name, size)
+        return True
+    except Exception as e:
+        LOGGER.error(
+            "Unable to %s object %s/%s in %s: %s",
+            operation,
+            container_name,
+            object_name,
+            ProjectCache.lazy_ident(storage.project.id),
+            e,
+            extra=storage.log_fields(),
+        )
+        return False
+
+
+def _delete_containers(projects: list[WorkloadGeneratorProject]) -> bool:
+    failed = 0
+    for project in projects:
+        storage = WorkloadGeneratorObjectStorage(project.project_conn, project.obj)
+        try:
+            storage.delete_containers()
+        except Exception as e:
+            LOGGER.error(
+                "Unable to delete the containers in %s: %s",
+                ProjectCache.lazy_ident(project.obj.id),
+                e,
+                extra=storage.log_fields(),
+            )
+            failed += 1
+    return failed == 0
+
+
+def run_object_workload(projects: list[WorkloadGeneratorProject]) -> bool:
+    settings = Config.settings().object_workload
+    if settings.objects == 0:
+        return True
+
+    failed = 0
+    try:
+        # The payload buffer and the project connections are created before the threads use them
+        PayloadBuffer.payload(max(size for size, _ in settings.sizes_kb) * 1024)
+        tasks: list[ObjectTask] = []
+        for project in projects:
+            storage = WorkloadGeneratorObjectStorage(project.project_conn, project.obj)
+            try:
+                storage.create_containers()
+            except Exception as e:
+                LOGGER.error(
+                    "Unable to create the containers in %s: %s",
+                    ProjectCache.lazy_ident(project.obj.id),
+                    e,
+                    extra=storage.log_fields(),
+                )
+                return False
+            tasks.extend((storage, *planned) for planned in storage.planned_objects())
+
+        # Only the objects which were stored successfully are read and deleted
+        with ThreadPoolExecutor(max_workers=settings.concurrency) as executor:
+            for operation in OBJECT_OPERATIONS:
+                started = time.monotonic()
+                results = list(
+                    executor.map(functools.partial(_execute, operation), tasks)
+                )
+                duration = time.monotonic() - started
+                failed += results.count(False)
+                tasks = [task for task, succeeded in zip(tasks, results) if succeeded]
+
+                transferred = sum(size for _, _, _, size in tasks) / MEGABYTE
+                LOGGER.info(
+                    "Object %s of %d/%d objects in %.1f seconds (%.1f requests/s%s)",
+                    operation,
+                    len(tasks),
+                    len(results),
+                    duration,
+                    len(results) / duration,
+                    (
+                        f", {transferred / duration:.1f} MB/s"
+                        if operation != "delete"
+                        else ""
+                    ),
+                )
+                Metrics.log_histogram(f"object_{operation}")
+    finally:
+        # Also after a failed setup or an interruption, the containers of all projects are removed
+        cleaned = _delete_containers(projects)
+    return failed == 0 and cleaned
@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from http import HTTPStatus
+from urllib.parse import unquote, urlsplit
+
+from .entities.cloud_init import render_template
+from .entities.helpers import Config
+from .metrics import Metrics
+from .results import ResultStore, parse_documents
+
+LOGGER = logging.getLogger()
+
+MAX_HEADER_LINES = 100
+MAX_RESULT_SIZE = 16 * 1024 * 1024
+
+
+class PayloadServer:
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        reload_interval: float = 5.0,
+        stats_interval: float = 60.0,
+        request_timeout: float = 10.0,
+        max_variants: int = 10000,
+        result_store: ResultStore | None = None,
+    ):
+        self.host = host
+        self.port = port
+        self.reload_interval = reload_interval
+        self.stats_interval = stats_interval
+        self.request_timeout = request_timeout
+        self.max_variants = max_variants
+        self.result_store = result_store
+        self.status_counts: dict[int, int] = dict()
+        self._variants: dict[tuple[str, str | None, str | None], tuple[bytes, str]] = (
+            dict()
+        )
+        self._server: asyncio.Server | None = None
+        self._profile_mtime: float | None = None
+
+    def _render_variant(
+        self, name: str, domain_name: str | None, project_name: str | None
+    ) -> tuple[bytes, str] | None:
+        # Every variant is rendered once, the VMs poll the cached body and its etag
+        key = (name, domain_name, project_name)
+        if key in self._variants:
+            return self._variants[key]
+
+        source = dict(Config.settings().payload_scripts).get(name)
+        if source is None:
+            return None
+        body = render_template(
+            source,
+            {
+                "script_name": name,
+                "domain_name": domain_name,
+                "project_name": project_name,
+            },
+        ).encode("utf-8")
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+        if len(self._variants) >= self.max_variants:
+            self._variants.clear()
+        self._variants[key] = (body, etag)
+        return self._variants[key]
+
+    def collect(self, method: str, parts: list[str], body: bytes) -> int:
+        # /results/[<cloud>/]<domain>/<project>/<machine>/<benchmark> with a json document or
+        # json lines, the cloud distinguishes machines of the same name in multi cloud runs
+        if self.result_store is None or len(parts) not in (5, 6):
+            return HTTPStatus.NOT_FOUND
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED
+        try:
+            documents = parse_documents(body)
+        except ValueError as e:
+            LOGGER.warning("Invalid result for %s: %s", "/".join(parts[1:]), e)
+            return HTTPStatus.BAD_REQUEST
+        cloud_name = parts[1] if len(parts) == 6 else ""
+        domain_name, project_name, machine_name, benchmark = parts[-4:]
+        rows = 0
+        for document in documents:
+            rows += self.result_store.append(
+                domain_name,
+                project_name,
+                machine_name,
+                benchmark,
+                document,
+                cloud=cloud_name,
+            )
+        Metrics.record("results_rows_per_request", rows)
+        return HTTPStatus.NO_CONTENT
+
+    def respond(
+        self, method: str, target: str, headers: dict[str, str], body: bytes = b""
+    ) -> tuple[int, dict[str, str], bytes]:
+        parts = [unquote(part) for part in urlsplit(target).path.split("/") if part]
+        if parts and parts[0] == "results":
+            return self.collect(method, parts, body), {}, b""
+
+        if method not in ("GET", "HEAD"):
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"Allow": "GET, HEAD"}, b""
+
+        # /<script>, /<domain>/<script> or /<domain>/<project>/<script>
+        if not 1 <= len(parts) <= 3:
+            return HTTPStatus.NOT_FOUND, {}, b""
+        domain_name = parts[0] if len(parts) > 1 else None
+        project_name = parts[1] if len(parts) > 2 else None
+
+        try:
+            variant = self._render_variant(parts[-1], domain_name, project_name)
+        except RuntimeError as e:
+            LOGGER.error("Unable to serve %s: %s", target, e)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {}, b""
+        if variant is None:
+            return HTTPStatus.NOT_FOUND, {}, b""
+
+        body, etag = variant
+        response_headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Content-Type": "text/plain; charset=utf-8",
+        }
+        if_none_match = headers.get("if-none-match", "")
+        if if_none_match.strip() == "*" or etag in [
+            tag.strip() for tag in if_none_match.split(",")
+        ]:
+            return HTTPStatus.NOT_MODIFIED, response_headers, b""
+        return HTTPStatus.OK, response_headers, body
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        started = time.monotonic()
+        method = "GET"
+        try:
+            request_line = await asyncio.wait_for(
+                reader.readline(), self.request_timeout
+            )
+            headers: dict[str, str] = dict()
+            for _ in range(MAX_HEADER_LINES):
+                line = await asyncio.wait_for(reader.readline(), self.request_timeout)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            content_length = int(headers.get("content-length", "0"))
+            if content_length > MAX_RESULT_SIZE:
+                raise ValueError(f"Request body of {content_length} bytes is too large")
+            body = await asyncio.wait_for(
+                reader.readexactly(content_length), self.request_timeout
+            )
+            status, response_headers, body = self.respond(method, target, headers, body)
+        except (ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            status, response_headers, body = HTTPStatus.BAD_REQUEST, {}, b""
+        except ConnectionError:
+            writer.close()
+            return
+
+        status = HTTPStatus(status)
+        response_headers["Content-Length"] = str(len(body))
+        response_headers["Connection"] = "close"
+        head = f"HTTP/1.1 {status.value} {status.phrase}\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in response_headers.items()
+        )
+        try:
+            writer.write(head.encode("latin-1") + b"\r\n")
+            if method != "HEAD":
+                writer.write(body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+        self.status_counts[status.value] = self.status_counts.get(status.value, 0) + 1
+        Metrics.record("payload_request_duration", time.monotonic() - started)
+
+    async def _watch_profile(self):
+        # Changing the profile switches the scenario of all VMs at their next poll
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                mtime = os.stat(Config.file()).st_mtime
+            except OSError as e:
+                LOGGER.warning("Unable to check the profile %s: %s", Config.file(), e)
+                continue
+            if mtime != self._profile_mtime and Config.reload():
+                self._profile_mtime = mtime
+                self._variants.clear()
+                LOGGER.info(
+                    "Reloaded %d payload scripts from %s",
+                    len(Config.settings().payload_scripts),
+                    Config.file(),
+                )
+
+    async def _report_rate(self):
+        while True:
+            counts_before = dict(self.status_counts)
+            await asyncio.sleep(self.stats_interval)
+            counts = {
+                status: count - counts_before.get(status, 0)
+                for status, count in sorted(self.status_counts.items())
+                if count - counts_before.get(status, 0) > 0
+            }
+            if self.result_store is not None:
+                self.result_store.flush()
+            rate = sum(counts.values()) / self.stats_interval
+            Metrics.record("payload_requests_per_second", rate)
+            LOGGER.info(
+                "Served %.1f requests per second, by status: %s",
+                rate,
+                ", ".join(f"{s}={c}" for s, c in counts.items()) or "none",
+            )
+
+    async def start(self):
+        self._profile_mtime = os.stat(Config.file()).st_mtime
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, backlog=4096
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        if self.result_store is not None:
+            LOGGER.info(
+                "Collecting results at "
+                "http://%s:%d/results/[<cloud>/]<domain>/<project>/<machine>/<benchmark> into %s",
+                self.host,
+                self.port,
+                self.result_store.directory,
+            )
+        LOGGER.info(
+            "Serving the payload scripts %s at http://%s:%d/[<domain>/[<project>/]]<script>",
+            ", ".join(dict(Config.settings().payload_scripts).keys()) or "(none)",
+            self.host,
+            self.port,
+        )
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve(self, duration: float | None = None):
+        await self.start()
+        tasks = [
+            asyncio.create_task(self._watch_profile()),
+            asyncio.create_task(self._report_rate()),
+        ]
+        try:
+            if duration is None:
+                await asyncio.Event().wait()
+            else:
+                await asyncio.sleep(duration)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await self.stop()
+            if self.result_store is not None:
+                self.result_store.flush()
@@ -0,0 +1,145 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from .entities.helpers import ProjectCache
+from .metrics import Metrics
+
+if TYPE_CHECKING:
+    from .entities.machine import WorkloadGeneratorMachine
+    from .entities.project import WorkloadGeneratorProject
+
+LOGGER = logging.getLogger()
+
+# The status a server has to reach after a power action
+POWER_ACTIONS: dict[str, str] = {
+    "start": "ACTIVE",
+    "stop": "SHUTOFF",
+    "reboot": "ACTIVE",
+}
+
+
+class PendingAction:
+
+    def __init__(
+        self,
+        project: "WorkloadGeneratorProject",
+        machine: "WorkloadGeneratorMachine",
+        started: float,
+    ):
+        self.project = project
+        self.machine = machine
+        self.started = started
+
+
+def _issue_power_action(machine: "WorkloadGeneratorMachine", action: str) -> float | None:
+    started = time.monotonic()
+    issued = getattr(machine, f"{action}_server")()
+    if not issued:
+        return None
+    Metrics.record(f"power_{action}_api", time.monotonic() - started)
+    return started
+
+
+def run_power_action(
+    projects: list["WorkloadGeneratorProject"],
+    action: str,
+    concurrency: int,
+    timeout: int,
+    poll_interval: float = 2.0,
+) -> bool:
+    target_status = POWER_ACTIONS[action]
+    metric_name = f"power_{action}_to_{target_status.lower()}"
+    pending: dict[str, PendingAction] = dict()
+    failed = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        machines = [
+            (project, machine, machine.obj.id)
+            for project in projects
+            for machine in project.workload_machines.values()
+            if machine.obj is not None
+        ]
+        LOGGER.info(
+            "Issuing %s for %d machines with a parallelism of %d",
+            action,
+            len(machines),
+            concurrency,
+        )
+        futures = {
+            executor.submit(_issue_power_action, machine, action): (
+                project,
+                machine,
+                server_id,
+            )
+            for project, machine, server_id in machines
+        }
+        for future, (project, machine, server_id) in futures.items():
+            try:
+                started = future.result()
+            except Exception as e:
+                LOGGER.error(
+                    "Unable to %s server %s in %s: %s",
+                    action,
+                    machine.machine_name,
+                    ProjectCache.lazy_ident(project.obj.id),
+                    e,
+                    extra=machine.log_fields(),
+                )
+                failed += 1
+                continue
+            if started is not None:
+                pending[server_id] = PendingAction(project, machine, started)
+
+        # Poll the status of all servers of a project with one list call instead of one call per server
+        deadline = time.monotonic() + timeout
+        while pending and time.monotonic() < deadline:
+            time.sleep(poll_interval)
+            pending_projects = list(
+                {id(p.project): p.project for p in pending.values()}.values()
+            )
+            for servers in executor.map(lambda p: p.list_servers(), pending_projects):
+                now = time.monotonic()
+                for server in servers:
+                    if server.id not in pending:
+                        continue
+                    if server.status == "ERROR":
+                        LOGGER.error(
+                            "Server %s/%s in %s failed to %s",
+                            server.name,
+                            server.id,
+                            ProjectCache.lazy_ident(server.project_id),
+                            action,
+                            extra={
+                                "server_id": server.id,
+                                "project_id": server.project_id,
+                            },
+                        )
+                        failed += 1
+                        del pending[server.id]
+                    elif server.status == target_status and not server.task_state:
+                        entry = pending.pop(server.id)
+                        entry.machine.obj = server
+                        Metrics.record(metric_name, now - entry.started)
+
+    for entry in pending.values():
+        LOGGER.error(
+            "Server %s in %s did not reach %s within %s seconds",
+            entry.machine.machine_name,
+            ProjectCache.lazy_ident(entry.project.obj.id),
+            target_status,
+            timeout,
+            extra=entry.machine.log_fields(),
+        )
+    failed += len(pending)
+
+    latencies = Metrics.samples(metric_name)
+    LOGGER.info(
+        "Power action %s finished: %d machines reached %s, %d failed",
+        action,
+        len(latencies),
+        target_status,
+        failed,
+    )
+    return failed == 0
@@ -0,0 +1,180 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+
+from openstack.connection import Connection
+
+from .entities.helpers import Config, DomainCache, ProjectCache
+from .entities.settings import QUOTA_CATEGORIES
+from .metrics import Metrics
+
+LOGGER = logging.getLogger()
+
+# The api area of a quota category, the quotas are set by conn.set_<area>_quotas
+QUOTA_API_AREAS: dict[str, str] = {
+    "compute_quotas": "compute",
+    "block_storage_quotas": "volume",
+    "network_quotas": "network",
+}
+
+
+@dataclass(slots=True)
+class QuotaChange:
+    project_id: str
+    category: str
+    name: str
+    current: int
+    new: int
+
+
+class QuotaReconciler:
+    # Fetches the quotas of all projects concurrently, computes the difference to the profile
+    # and only sets the changed values, also concurrently
+
+    def __init__(self, conn: Connection, project_ids: list[str], concurrency: int):
+        self.conn = conn
+        self.project_ids = project_ids
+        self.concurrency = concurrency
+
+    def _get_quota(self, project_id: str, category: str) -> Any:
+        if category == "compute_quotas":
+            return self.conn.compute.get_quota_set(project_id)
+        elif category == "block_storage_quotas":
+            return self.conn.volume.get_quota_set(project_id)
+        elif category == "network_quotas":
+            return self.conn.get_network_quotas(project_id)
+        raise RuntimeError(f"Not implemented: {category}")
+
+    def _diff(self, project_id: str, category: str) -> list[QuotaChange]:
+        quota_settings = Config.settings().quotas(category)
+        if not quota_settings.names():
+            return []
+        current_quota = self._get_quota(project_id, category)
+        LOGGER.debug(
+            "current quotas for %s : %s",
+            category,
+            current_quota,
+            extra={"project_id": project_id},
+        )
+
+        changes: list[QuotaChange] = []
+        for name in quota_settings.names():
+            try:
+                current_value = getattr(current_quota, name)
+            except AttributeError:
+                raise RuntimeError(
+                    f"No such {QUOTA_API_AREAS[category]} quota field {name} in {current_quota}"
+                )
+            new_value = quota_settings.get(name, current_value)
+            if current_value != new_value:
+                changes.append(
+                    QuotaChange(project_id, category, name, current_value, new_value)
+                )
+        return changes
+
+    def _apply(self, project_id: str, category: str, changes: list[QuotaChange]):
+        set_quota_method = getattr(self.conn, f"set_{QUOTA_API_AREAS[category]}_quotas")
+        set_quota_method(project_id, **{change.name: change.new for change in changes})
+        LOGGER.debug(
+            "Configured %s quotas for %s",
+            QUOTA_API_AREAS[category],
+            ProjectCache.lazy_ident(project_id),
+            extra={"project_id": project_id},
+        )
+
+    def plan(self) -> list[QuotaChange]:
+        tasks = [
+            (project_id, category)
+            for project_id in self.project_ids
+            for category in QUOTA_CATEGORIES
+        ]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            diffs = list(executor.map(lambda task: self._diff(*task), tasks))
+        return [change for changes in diffs for change in changes]
+
+    def reconcile(self) -> bool:
+        started = time.monotonic()
+        try:
+            changes = self.plan()
+        except Exception as e:
+            LOGGER.error("Unable to fetch the current quotas: %s", e)
+            return False
+
+        grouped: dict[tuple[str, str], list[QuotaChange]] = dict()
+        for change in changes:
+            grouped.setdefault((change.project_id, change.category), []).append(change)
+
+        def apply(item: tuple[tuple[str, str], list[QuotaChange]]) -> bool:
+            (project_id, category), project_changes = item
+            try:
+                self._apply(project_id, category, project_changes)
+                return True
+            except Exception as e:
+                LOGGER.error(
+                    "Unable to set the %s quotas for %s: %s",
+                    QUOTA_API_AREAS[category],
+                    ProjectCache.lazy_ident(project_id),
+                    e,
+                    extra={"project_id": project_id},
+                )
+                return False
+
+        # Only the changes of the successful requests are reported as changed
+        applied: list[QuotaChange] = []
+        failed: list[QuotaChange] = []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for item, success in zip(
+                grouped.items(), executor.map(apply, grouped.items())
+            ):
+                (applied if success else failed).extend(item[1])
+
+        Metrics.record("quota_reconcile", time.monotonic() - started)
+        log_quota_changes(applied, failed, len(self.project_ids))
+        return not failed
+
+
+def _project_name(project_id: str) -> str:
+    project = ProjectCache.PROJECT_CACHE[project_id]
+    return f"{DomainCache.name_by_id(project['domain_id'])}/{project['name']}"
+
+
+def _quota_table(changes: list[QuotaChange]) -> str:
+    rows = [("project", "quota", "current", "new")] + [
+        (
+            _project_name(change.project_id),
+            f"{QUOTA_API_AREAS[change.category]}.{change.name}",
+            str(change.current),
+            str(change.new),
+        )
+        for change in sorted(changes, key=lambda c: (c.project_id, c.category, c.name))
+    ]
+    widths = [max(len(row[column]) for row in rows) for column in range(4)]
+    return "\n".join(
+        "  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip()
+        for row in rows
+    )
+
+
+def log_quota_changes(
+    applied: list[QuotaChange], failed: list[QuotaChange], projects: int
+):
+    if not applied and not failed:
+        LOGGER.info("Quotas of %d projects not changed", projects)
+    if applied:
+        LOGGER.info(
+            "Changed %d quotas of %d/%d projects:\n%s",
+            len(applied),
+            len({change.project_id for change in applied}),
+            projects,
+            _quota_table(applied),
+        )
+    if failed:
+        LOGGER.error(
+            "Unable to change %d quotas of %d/%d projects:\n%s",
+            len(failed),
+            len({change.project_id for change in failed}),
+            projects,
+            _quota_table(failed),
+        )
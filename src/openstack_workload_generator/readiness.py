@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from .metrics import LazyStats, Metrics, summarize
+
+LOGGER = logging.getLogger()
+
+SSH_OPTIONS = [
+    "-o",
+    "BatchMode=yes",
+    "-o",
+    "StrictHostKeyChecking=no",
+    "-o",
+    "UserKnownHostsFile=/dev/null",
+    "-o",
+    "LogLevel=ERROR",
+]
+
+
+@dataclass
+class ReadinessTarget:
+    name: str
+    address: str
+    proxy_jump: str | None = None
+    created_at: float | None = None
+    time_to_ssh: float | None = None
+    time_to_ready: float | None = None
+    error: str | None = None
+
+
+def parse_server_timestamp(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return (
+            datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+            .replace(tzinfo=timezone.utc)
+            .timestamp()
+        )
+    except ValueError:
+        return None
+
+
+class ReadinessProber:
+
+    def __init__(
+        self,
+        targets: list[ReadinessTarget],
+        timeout: int,
+        concurrency: int,
+        ssh_user: str,
+        ready_file: str | None = None,
+        interval: float = 5.0,
+        connect_timeout: float = 5.0,
+        ssh_port: int = 22,
+    ):
+        self.targets = targets
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.ssh_user = ssh_user
+        self.ready_file = ready_file
+        self.interval = interval
+        self.connect_timeout = connect_timeout
+        self.ssh_port = ssh_port
+        self._start = time.time()
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def run(self) -> list[ReadinessTarget]:
+        LOGGER.info(
+            "Probing %d machines for ssh readiness (timeout %ss, concurrency %d)",
+            len(self.targets),
+            self.timeout,
+            self.concurrency,
+        )
+        asyncio.run(self._run())
+        return self.targets
+
+    async def _run(self):
+        self._start = time.time()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self._probe(target) for target in self.targets))
+
+    def _elapsed(self, target: ReadinessTarget) -> float:
+        return time.time() - (target.created_at or self._start)
+
+    async def _retry(self, check, target: ReadinessTarget) -> bool:
+        assert self._semaphore is not None
+        deadline = self._start + self.timeout
+        while time.time() < deadline:
+            async with self._semaphore:
+                try:
+                    if await check(target):
+                        return True
+                except (OSError, asyncio.TimeoutError) as e:
+                    target.error = str(e) or e.__class__.__name__
+            await asyncio.sleep(self.interval)
+        return False
+
+    async def _probe(self, target: ReadinessTarget):
+        if not await self._retry(self._probe_ssh, target):
+            target.error = f"ssh not reachable within {self.timeout}s: {target.error}"
+            return
+        target.time_to_ssh = self._elapsed(target)
+        target.error = None
+
+        if self.ready_file is None:
+            return
+        if not await self._retry(self._probe_ready_file, target):
+            target.error = f"{self.ready_file} not present within {self.timeout}s"
+            return
+        target.time_to_ready = self._elapsed(target)
+
+    def _jump_host(self, target: ReadinessTarget) -> str:
+        return f"{self.ssh_user}@{target.proxy_jump}"
+
+    async def _probe_ssh(self, target: ReadinessTarget) -> bool:
+        if target.proxy_jump is None:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(target.address, self.ssh_port), self.connect_timeout
+            )
+            try:
+                banner = await asyncio.wait_for(reader.readline(), self.connect_timeout)
+            finally:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except OSError:
+                    pass
+            return self._check_banner(target, banner)
+
+        # Forward the ssh port of the internal address through the jump host and read the banner
+        proc = await asyncio.create_subprocess_exec(
+            "ssh",
+            *SSH_OPTIONS,
+            "-o",
+            f"ConnectTimeout={int(self.connect_timeout)}",
+            "-W",
+            f"{target.address}:{self.ssh_port}",
+            self._jump_host(target),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            assert proc.stdout is not None
+            banner = await asyncio.wait_for(
+                proc.stdout.readline(), self.connect_timeout * 2
+            )
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+        return self._check_banner(target, banner)
+
+    @staticmethod
+    def _check_banner(target: ReadinessTarget, banner: bytes) -> bool:
+        # The port may be open before the ssh daemon is started, e.g. by a forwarding jump host
+        if banner.startswith(b"SSH-"):
+            return True
+        target.error = (
+            f"unexpected banner {banner[:40]!r}" if banner else "no ssh banner received"
+        )
+        return False
+
+    async def _probe_ready_file(self, target: ReadinessTarget) -> bool:
+        jump_args = []
+        if target.proxy_jump is not None:
+            jump_args = ["-J", self._jump_host(target)]
+        proc = await asyncio.create_subprocess_exec(
+            "ssh",
+            *SSH_OPTIONS,
+            "-o",
+            f"ConnectTimeout={int(self.connect_timeout)}",
+            *jump_args,
+            f"{self.ssh_user}@{target.address}",
+            "test",
+            "-f",
+            str(self.ready_file),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            return_code = await asyncio.wait_for(proc.wait(), self.connect_timeout * 3)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise
+        return return_code == 0
+
+
+def report_readiness(targets: list[ReadinessTarget]) -> bool:
+    for target in sorted(targets, key=lambda t: t.name):
+        if target.error:
+            LOGGER.warning(
+                "Readiness of %s (%s): %s", target.name, target.address, target.error
+            )
+        elif target.time_to_ready is not None:
+            LOGGER.info(
+                "Readiness of %s (%s): ssh after %.1fs, ready after %.1fs",
+                target.name,
+                target.address,
+                target.time_to_ssh,
+                target.time_to_ready,
+            )
+        else:
+            LOGGER.info(
+                "Readiness of %s (%s): ssh after %.1fs",
+                target.name,
+                target.address,
+                target.time_to_ssh,
+            )
+
+    for metric, attribute in [
+        ("readiness_time_to_ssh", "time_to_ssh"),
+        ("readiness_time_to_ready", "time_to_ready"),
+    ]:
+        values = [
+            getattr(t, attribute) for t in targets if getattr(t, attribute) is not None
+        ]
+        for value in values:
+            Metrics.record(metric, value)
+        if not values:
+            continue
+        stats = summarize(values)
+        LOGGER.info(
+            "%s: %d/%d machines, %s",
+            metric,
+            len(values),
+            len(targets),
+            LazyStats(stats, "{:.1f}s", ", "),
+        )
+
+    failed = [t for t in targets if t.error]
+    if failed:
+        LOGGER.error("%d/%d machines did not become ready", len(failed), len(targets))
+    return not failed
@@ -0,0 +1,299 @@
+import glob
+import json
+import logging
+import os
+import time
+from array import array
+from typing import Any, Iterator
+
+import yaml
+
+from .metrics import LazyStats, summarize
+
+LOGGER = logging.getLogger()
+
+SEGMENT_SUFFIX = ".owgcol"
+
+# Columns with a small number of distinct values are dictionary encoded
+DICTIONARY_COLUMNS = ["cloud", "domain", "project", "machine", "benchmark", "metric"]
+VALUE_COLUMNS = ["value", "received"]
+
+
+def flatten_numbers(document: Any, prefix: str = "") -> Iterator[tuple[str, float]]:
+    # Benchmark outputs (fio, iperf3, stress-ng) are nested documents, every numeric leaf is a metric
+    if isinstance(document, bool):
+        return
+    if isinstance(document, (int, float)):
+        yield prefix, float(document)
+    elif isinstance(document, dict):
+        for key, value in document.items():
+            yield from flatten_numbers(value, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(document, list):
+        for nr, value in enumerate(document):
+            yield from flatten_numbers(value, f"{prefix}.{nr}" if prefix else str(nr))
+
+
+def parse_documents(body: bytes) -> list[Any]:
+    # A single json document or json lines
+    text = body.decode("utf-8")
+    try:
+        return [json.loads(text)]
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class ResultStore:
+    # Rows are buffered in columns and written as segments: a json header line followed by the raw arrays
+
+    def __init__(self, directory: str, segment_rows: int = 100000):
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self.rows = 0
+        self._segment_nr = 0
+        self._reset()
+        os.makedirs(directory, exist_ok=True)
+
+    def _reset(self):
+        self._dictionaries: dict[str, dict[str, int]] = {
+            column: dict() for column in DICTIONARY_COLUMNS
+        }
+        self._codes: dict[str, array] = {
+            column: array("I") for column in DICTIONARY_COLUMNS
+        }
+        self._values: dict[str, array] = {
+            column: array("d") for column in VALUE_COLUMNS
+        }
+        self._buffered = 0
+
+    def _code(self, column: str, value: str) -> int:
+        dictionary = self._dictionaries[column]
+        if value not in dictionary:
+            dictionary[value] = len(dictionary)
+        return dictionary[value]
+
+    def append(
+        self,
+        domain: str,
+        project: str,
+        machine: str,
+        benchmark: str,
+        document: Any,
+        cloud: str = "",
+    ) -> int:
+        # The cloud is empty if the machine did not report it
+        received = time.time()
+        codes = {
+            "cloud": self._code("cloud", cloud),
+            "domain": self._code("domain", domain),
+            "project": self._code("project", project),
+            "machine": self._code("machine", machine),
+            "benchmark": self._code("benchmark", benchmark),
+        }
+        rows = 0
+        for metric, value in flatten_numbers(document):
+            for column, code in codes.items():
+                self._codes[column].append(code)
+            self._codes["metric"].append(self._code("metric", metric))
+            self._values["value"].append(value)
+            self._values["received"].append(received)
+            rows += 1
+        self._buffered += rows
+        self.rows += rows
+        if self._buffered >= self.segment_rows:
+            self.flush()
+        return rows
+
+    def flush(self):
+        if not self._buffered:
+            return
+        columns: list[tuple[dict[str, Any], array]] = []
+        for column in DICTIONARY_COLUMNS:
+            columns.append(
+                (
+                    {
+                        "name": column,
+                        "typecode": "I",
+                        "dictionary": list(self._dictionaries[column].keys()),
+                    },
+                    self._codes[column],
+                )
+            )
+        for column in VALUE_COLUMNS:
+            columns.append(({"name": column, "typecode": "d"}, self._values[column]))
+        for meta, data in columns:
+            meta["itemsize"] = data.itemsize
+
+        filename = os.path.join(
+            self.directory,
+            f"segment-{int(time.time())}-{os.getpid()}-{self._segment_nr}{SEGMENT_SUFFIX}",
+        )
+        header = {"rows": self._buffered, "columns": [meta for meta, _ in columns]}
+        # Write to a temporary file first, readers never see partial segments
+        with open(f"{filename}.tmp", "wb") as file:
+            file.write(json.dumps(header).encode("utf-8") + b"\n")
+            for _, data in columns:
+                file.write(data.tobytes())
+        os.rename(f"{filename}.tmp", filename)
+        LOGGER.info("Wrote %d result rows to %s", self._buffered, filename)
+        self._segment_nr += 1
+        self._reset()
+
+
+class ResultSegment:
+
+    def __init__(self, filename: str):
+        with open(filename, "rb") as file:
+            header = json.loads(file.readline())
+            self.rows: int = header["rows"]
+            self.dictionaries: dict[str, list[str]] = dict()
+            self.columns: dict[str, array] = dict()
+            for meta in header["columns"]:
+                data = array(meta["typecode"])
+                if data.itemsize != meta["itemsize"]:
+                    raise RuntimeError(
+                        f"Segment {filename} was written on a platform with a different item size"
+                    )
+                data.frombytes(file.read(self.rows * data.itemsize))
+                self.columns[meta["name"]] = data
+                if "dictionary" in meta:
+                    self.dictionaries[meta["name"]] = meta["dictionary"]
+        # Segments of older versions have no cloud column
+        if "cloud" not in self.columns:
+            self.columns["cloud"] = array("I", [0]) * self.rows
+            self.dictionaries["cloud"] = [""]
+
+    @staticmethod
+    def read_directory(directory: str) -> Iterator["ResultSegment"]:
+        for filename in sorted(
+            glob.glob(os.path.join(directory, f"*{SEGMENT_SUFFIX}"))
+        ):
+            yield ResultSegment(filename)
+
+
+# The key of a machine in the inventory metadata: (cloud, domain, project, machine)
+HostKey = tuple[str, str, str, str]
+
+
+def load_inventory_metadata(directory: str) -> dict[HostKey, dict[str, str]]:
+    # The inventory written by --ansible_inventory, the directory names of the hosts are prefixed
+    # with the cloud in multi cloud runs, therefore the key is taken from the host data
+    metadata: dict[HostKey, dict[str, str]] = dict()
+    for filename in glob.glob(os.path.join(directory, "*", "data.yml")):
+        with open(filename, "r") as file:
+            data = yaml.safe_load(file)
+        openstack_data = data.get("openstack", {})
+        key = (
+            str(openstack_data.get("cloud") or ""),
+            str(openstack_data.get("domain")),
+            str(openstack_data.get("project")),
+            str(data.get("hostname")),
+        )
+        metadata[key] = {
+            "hypervisor": str(openstack_data.get("hypervisor") or "unknown"),
+            "domain": key[1],
+            "project": key[2],
+        }
+    return metadata
+
+
+def _with_unqualified_hosts(
+    inventory_metadata: dict[HostKey, dict[str, str]],
+) -> dict[HostKey, dict[str, str]]:
+    # Results without a cloud are joined with the host of the same name if it only exists in one cloud
+    unqualified: dict[HostKey, list[dict[str, str]]] = dict()
+    for (_, domain, project, machine), host_metadata in inventory_metadata.items():
+        unqualified.setdefault(("", domain, project, machine), []).append(host_metadata)
+    result = dict(inventory_metadata)
+    for key, candidates in unqualified.items():
+        if len(candidates) == 1:
+            result.setdefault(key, candidates[0])
+    return result
+
+
+def _group_name(
+    group_by: str,
+    inventory_metadata: dict[HostKey, dict[str, str]],
+    cloud_name: str,
+    domain_name: str,
+    project_name: str,
+    machine_name: str,
+) -> str:
+    if group_by == "domain":
+        return domain_name
+    if group_by == "project":
+        return f"{domain_name}/{project_name}"
+    host = (cloud_name, domain_name, project_name, machine_name)
+    return inventory_metadata.get(host, {}).get(group_by, "unknown")
+
+
+def aggregate_results(
+    directory: str,
+    inventory_metadata: dict[HostKey, dict[str, str]],
+    group_by: str = "hypervisor",
+) -> dict[str, dict[str, dict[str, float]]]:
+    # The rows of a segment are grouped by their integer codes, the names are only resolved once per group
+    groups: dict[tuple[str, str], list[float]] = dict()
+    inventory_metadata = _with_unqualified_hosts(inventory_metadata)
+    segments = 0
+    for segment in ResultSegment.read_directory(directory):
+        segments += 1
+        columns = segment.columns
+        local_groups: dict[tuple[int, ...], list[float]] = dict()
+        for cloud, domain, project, machine, benchmark, metric, value in zip(
+            columns["cloud"],
+            columns["domain"],
+            columns["project"],
+            columns["machine"],
+            columns["benchmark"],
+            columns["metric"],
+            columns["value"],
+        ):
+            local_groups.setdefault(
+                (cloud, domain, project, machine, benchmark, metric), []
+            ).append(value)
+
+        names = segment.dictionaries
+        for (
+            cloud,
+            domain,
+            project,
+            machine,
+            benchmark,
+            metric,
+        ), values in local_groups.items():
+            group = _group_name(
+                group_by,
+                inventory_metadata,
+                names["cloud"][cloud],
+                names["domain"][domain],
+                names["project"][project],
+                names["machine"][machine],
+            )
+            metric_name = f"{names['benchmark'][benchmark]}.{names['metric'][metric]}"
+            groups.setdefault((metric_name, group), []).extend(values)
+
+    LOGGER.info("Aggregated %d result segments from %s", segments, directory)
+    report: dict[str, dict[str, dict[str, float]]] = dict()
+    for (metric_name, group), values in sorted(groups.items()):
+        report.setdefault(metric_name, dict())[group] = summarize(values)
+    return report
+
+
+def log_aggregate_report(report: dict[str, dict[str, dict[str, float]]]):
+    for metric_name, groups in report.items():
+        for group, stats in groups.items():
+            LOGGER.info(
+                "Result %s on %s: count=%d %s",
+                metric_name,
+                group,
+                stats["count"],
+                LazyStats(stats, "{:.6g}"),
+            )
+
+
+def write_aggregate_report(
+    filename: str, report: dict[str, dict[str, dict[str, float]]]
+):
+    LOGGER.info("Writing the aggregated results to %s", filename)
+    with open(filename, "w") as file:
+        yaml.dump(report, file, default_flow_style=False, explicit_start=True)
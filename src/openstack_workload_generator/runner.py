@@ -0,0 +1,620 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable
+
+import yaml
+
+from .coordination import (
+    SHARD_DONE,
+    SHARD_FAILED,
+    LeaseKeeper,
+    WorkQueue,
+)
+from .entities.helpers import (
+    Config,
+    ResourceTags,
+    deep_merge_dict,
+    iso_timestamp,
+    setup_logging,
+)
+from .entities.settings import Settings
+from .metrics import Metrics
+from .readiness import ReadinessProber, ReadinessTarget, report_readiness
+from .results import (
+    HostKey,
+    ResultStore,
+    aggregate_results,
+    load_inventory_metadata,
+    log_aggregate_report,
+    write_aggregate_report,
+)
+
+if TYPE_CHECKING:
+    from openstack.connection import Connection
+
+    from .capacity import CapacitySampler
+
+LOGGER = logging.getLogger()
+
+# The allowed relative change of the median of a metric in percent when comparing runs
+DEFAULT_REGRESSION_THRESHOLD = 10.0
+
+
+class RunResult:
+
+    def __init__(self):
+        self.inventory: dict[str, dict[str, Any]] = dict()
+        self.clouds_yaml: dict[str, dict[str, Any]] = dict()
+        self.metrics: dict[str, list[float]] = dict()
+        self.exit_code: int = 0
+
+    def merge(self, other: "RunResult", prefix: str | None = None):
+        for key, value in sorted(other.inventory.items()):
+            self.inventory[f"{prefix}-{key}" if prefix else key] = value
+        for key, value in sorted(other.clouds_yaml.items()):
+            self.clouds_yaml[f"{prefix}-{key}" if prefix else key] = value
+        for name, samples in sorted(other.metrics.items()):
+            self.metrics.setdefault(f"{prefix}:{name}" if prefix else name, []).extend(
+                samples
+            )
+        self.exit_code = max(self.exit_code, other.exit_code)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "inventory": self.inventory,
+            "clouds_yaml": self.clouds_yaml,
+            "metrics": self.metrics,
+            "exit_code": self.exit_code,
+        }
+
+    @staticmethod
+    def from_dict(data: dict[str, Any]) -> "RunResult":
+        result = RunResult()
+        result.inventory = data.get("inventory", {})
+        result.clouds_yaml = data.get("clouds_yaml", {})
+        result.metrics = data.get("metrics", {})
+        result.exit_code = data.get("exit_code", 0)
+        return result
+
+
+def establish_connection(clouds_yaml: str | None, os_cloud: str) -> "Connection":
+    # openstacksdk is only imported by the modes which use a cloud, --help and the offline modes start fast
+    from openstack.config import loader
+    from openstack.connection import Connection
+
+    if clouds_yaml is None:
+        config = loader.OpenStackConfig()
+    else:
+        LOGGER.info("Loading connection configuration from %s", clouds_yaml)
+        config = loader.OpenStackConfig(config_files=[clouds_yaml])
+    cloud_config = config.get_one(os_cloud)
+    return Connection(config=cloud_config)
+
+
+def execute_run(
+    args: argparse.Namespace,
+    os_cloud: str,
+    domain_names: list[str],
+    checkpoint: Callable[[], None] | None = None,
+) -> RunResult:
+    from .distribution import report_distribution
+    from .entities import WorkloadGeneratorDomain
+    from .image_uploads import run_image_uploads
+    from .object_workload import run_object_workload
+    from .power import run_power_action
+    from .quotas import QuotaReconciler
+    from .sweeper import GarbageSweeper
+    from .token_benchmark import TokenBenchmark, token_targets
+
+    # The checkpoint is called between the stages and may abort the run by an exception
+    check = checkpoint or (lambda: None)
+    result = RunResult()
+    conn = establish_connection(args.clouds_yaml, os_cloud)
+    ResourceTags.set_run_tag(args.run_tag)
+
+    if args.sweep_domains:
+        sweeper = GarbageSweeper(
+            conn,
+            GarbageSweeper.tags_for_domains(domain_names, args.run_tag),
+            concurrency=args.concurrency,
+            dry_run=args.dry_run,
+            timeout=Config.settings().vm.wait_for_server_timeout,
+            domain_tags=GarbageSweeper.domain_tags_for_run(domain_names, args.run_tag),
+        )
+        if not sweeper.sweep():
+            result.exit_code = 1
+        result.metrics = Metrics.export()
+        return result
+
+    if args.delete_domains:
+        for domain_name in domain_names:
+            domain_obj = WorkloadGeneratorDomain(conn, domain_name)
+            domain_obj.delete_domain()
+        result.metrics = Metrics.export()
+        return result
+
+    if args.delete_projects:
+        for domain_name in domain_names:
+            domain_obj = WorkloadGeneratorDomain(conn, domain_name)
+            for project_obj in domain_obj.get_projects(args.delete_projects):
+                project_obj.delete_project()
+        result.metrics = Metrics.export()
+        return result
+
+    workload_domains: dict[str, WorkloadGeneratorDomain] = dict()
+    for domain_name in domain_names:
+        domain = WorkloadGeneratorDomain(conn, domain_name)
+        domain.create_and_get_domain()
+        workload_domains[domain_name] = domain
+
+    if not args.create_projects:
+        result.metrics = Metrics.export()
+        return result
+
+    for workload_domain in workload_domains.values():
+        check()
+        workload_domain.create_and_get_projects(args.create_projects)
+
+    selected_projects = [
+        workload_project
+        for workload_domain in workload_domains.values()
+        for workload_project in workload_domain.get_projects(args.create_projects)
+    ]
+    check()
+    if not QuotaReconciler(
+        conn,
+        [workload_project.obj.id for workload_project in selected_projects],
+        concurrency=args.concurrency,
+    ).reconcile():
+        result.exit_code = 1
+        result.metrics = Metrics.export()
+        return result
+    check()
+    WorkloadGeneratorDomain.setup_projects(selected_projects)
+
+    check()
+    if not run_image_uploads(selected_projects):
+        result.exit_code = 1
+    check()
+    if not run_object_workload(selected_projects):
+        result.exit_code = 1
+
+    for workload_domain in workload_domains.values():
+        for workload_project in workload_domain.get_projects(args.create_projects):
+            check()
+            if args.create_machines:
+                workload_project.get_and_create_machines(
+                    args.create_machines, args.wait_for_machines
+                )
+                if args.ansible_inventory:
+                    for name, data in workload_project.get_inventory_hosts().items():
+                        openstack_data = data["openstack"]
+                        if isinstance(openstack_data, dict):
+                            openstack_data["cloud"] = os_cloud
+                        result.inventory[name] = data
+                if args.generate_clouds_yaml:
+                    result.clouds_yaml[
+                        f"{workload_domain.domain_name}-{workload_project.project_name}"
+                    ] = workload_project.get_clouds_yaml_data()
+            elif args.delete_machines:
+                for machine_obj in workload_project.get_machines(args.delete_machines):
+                    machine_obj.delete_machine()
+
+    check()
+    if args.power_action:
+        if not run_power_action(
+            selected_projects,
+            args.power_action,
+            concurrency=args.concurrency,
+            timeout=Config.settings().vm.wait_for_server_timeout,
+        ):
+            result.exit_code = 1
+
+    if args.benchmark_tokens:
+        if not TokenBenchmark(
+            conn,
+            token_targets(selected_projects),
+            requests_per_target=args.token_requests,
+            rate=args.token_rate,
+            concurrency=args.concurrency,
+        ).run():
+            result.exit_code = 1
+
+    if args.report_distribution:
+        report_distribution(conn, selected_projects)
+
+    if args.measure_readiness:
+        readiness_targets: list[ReadinessTarget] = []
+        for workload_project in selected_projects:
+            readiness_targets.extend(workload_project.get_readiness_targets())
+        if not report_readiness(
+            ReadinessProber(
+                readiness_targets,
+                timeout=Config.settings().readiness.timeout,
+                concurrency=Config.settings().readiness.concurrency,
+                ssh_user=Config.settings().readiness.ssh_user,
+                ready_file=(
+                    Config.settings().readiness.ready_file
+                    if args.check_ready_file
+                    else None
+                ),
+            ).run()
+        ):
+            result.exit_code = 1
+
+    result.metrics = Metrics.export()
+    return result
+
+
+def _execute_run_in_worker(
+    args: argparse.Namespace, settings: Settings, os_cloud: str, domain_names: list[str]
+) -> RunResult:
+    # Workers are spawned processes, they have to initialize their own logging and connection,
+    # the immutable configuration snapshot of the parent is passed to them
+    setup_logging(args.log_level, args.log_format)
+    Config.use_settings(settings)
+    return execute_run(args, os_cloud, domain_names)
+
+
+def execute_runs_in_processes(
+    args: argparse.Namespace, jobs: list[tuple[str, list[str], str | None]]
+) -> RunResult:
+    # Every job (os_cloud, domain names, result prefix) runs in its own worker process,
+    # the results are merged in the order of the jobs to get deterministic output files
+    result = RunResult()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(jobs), mp_context=context) as executor:
+        futures = [
+            executor.submit(
+                _execute_run_in_worker,
+                args,
+                Config.settings(),
+                os_cloud,
+                domain_names,
+            )
+            for os_cloud, domain_names, _ in jobs
+        ]
+        for future, (os_cloud, domain_names, prefix) in zip(futures, jobs):
+            try:
+                result.merge(future.result(), prefix)
+            except Exception as e:
+                LOGGER.error(
+                    "Execution for cloud %s and domains %s failed: %s",
+                    os_cloud,
+                    ", ".join(domain_names),
+                    e,
+                )
+                result.exit_code = 1
+    return result
+
+
+def coordination_run_id(args: argparse.Namespace) -> str | None:
+    # All hosts of a run have to use the same run id, the run tag is the natural candidate
+    return args.coordination_run or args.run_tag
+
+
+def _work_queue(args: argparse.Namespace) -> WorkQueue:
+    run_id = coordination_run_id(args)
+    if run_id is None:
+        raise RuntimeError("The run id of the coordinated run is not set")
+    return WorkQueue(
+        args.coordination_queue, run_id, max_attempts=args.coordination_attempts
+    )
+
+
+def _execute_coordinated_shards(args: argparse.Namespace):
+    queue = _work_queue(args)
+    lease_seconds = args.coordination_lease
+    while True:
+        shard = queue.claim(lease_seconds)
+        if shard is None:
+            if queue.unfinished() == 0:
+                return
+            # Other hosts are still working, wait for their shards to finish or their leases to expire
+            time.sleep(min(lease_seconds / 3, 10))
+            continue
+
+        lease_keeper = LeaseKeeper(queue, shard, lease_seconds)
+        lease_keeper.start()
+        # Every shard starts with empty metrics, the samples are stored in the queue per shard
+        Metrics.replace({})
+        interrupted: BaseException | None = None
+        try:
+            shard_result = execute_run(
+                args,
+                shard.os_cloud,
+                [shard.domain_name],
+                checkpoint=lease_keeper.check,
+            )
+            # A shard with errors is retried like a shard whose run raised
+            status = SHARD_DONE if shard_result.exit_code == 0 else SHARD_FAILED
+        except BaseException as e:
+            # Also sys.exit() and interrupts, the shard must not stay claimed until the lease expires
+            LOGGER.error("Execution of %s failed: %r", shard, e)
+            shard_result = RunResult()
+            shard_result.exit_code = 1
+            status = SHARD_FAILED
+            if isinstance(e, KeyboardInterrupt):
+                interrupted = e
+        finally:
+            lease_keeper.stop()
+
+        if lease_keeper.lost or not queue.finish(shard, status, shard_result.to_dict()):
+            LOGGER.warning(
+                "Discarding the result of %s, it was taken over by another host", shard
+            )
+        if interrupted is not None:
+            raise interrupted
+
+
+def _execute_coordinated_shards_in_worker(
+    args: argparse.Namespace, settings: Settings
+):
+    setup_logging(args.log_level, args.log_format)
+    Config.use_settings(settings)
+    _execute_coordinated_shards(args)
+
+
+def execute_coordinated(
+    args: argparse.Namespace, os_clouds: list[str], domain_names: list[str]
+) -> RunResult:
+    _work_queue(args).add_shards(os_clouds, domain_names)
+
+    if args.workers == 1:
+        _execute_coordinated_shards(args)
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=args.workers, mp_context=context
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _execute_coordinated_shards_in_worker,
+                    args,
+                    Config.settings(),
+                )
+                for _ in range(args.workers)
+            ]
+            for future in futures:
+                future.result()
+
+    # Every host merges the results of all shards, so that all hosts write identical outputs
+    result = RunResult()
+    shard_results = _work_queue(args).results()
+    multiple_clouds = len({shard.os_cloud for shard, _, _ in shard_results}) > 1
+    for shard, status, shard_data in shard_results:
+        if status != SHARD_DONE:
+            LOGGER.error("%s failed after all attempts, status is %s", shard, status)
+            result.exit_code = 1
+        if shard_data is None:
+            continue
+        result.merge(
+            RunResult.from_dict(shard_data), shard.os_cloud if multiple_clouds else None
+        )
+    return result
+
+
+def serve_payloads(args: argparse.Namespace) -> RunResult:
+    from .payload_server import PayloadServer
+
+    host, port = args.serve_payloads
+    try:
+        asyncio.run(
+            PayloadServer(
+                host,
+                port,
+                result_store=(
+                    ResultStore(args.collect_results) if args.collect_results else None
+                ),
+            ).serve(args.serve_duration)
+        )
+    except KeyboardInterrupt:
+        LOGGER.info("Stopped the payload server")
+    result = RunResult()
+    result.metrics = Metrics.export()
+    return result
+
+
+def validate_profile() -> int:
+    # The settings are validated by loading the profile, the templates are rendered with sample values
+    from .entities.cloud_init import render_template, render_user_data
+
+    settings = Config.settings()
+    errors = 0
+    for machine_class in settings.machine_classes:
+        try:
+            render_user_data(
+                machine_class.cloud_init_extra_script,
+                {
+                    "cloud_name": "validate-cloud",
+                    "domain_name": "validate-domain",
+                    "project_name": "validate-project",
+                    "machine_name": "validate-machine",
+                    "machine_index": 0,
+                    "hypervisor_hint": next(iter(settings.vm.availability_zones), None),
+                    "machine_class": machine_class.name,
+                },
+            )
+        except RuntimeError as e:
+            LOGGER.error(
+                "Invalid cloud_init_extra_script of machine class %s: %s",
+                machine_class.name,
+                e,
+            )
+            errors += 1
+    for name, source in settings.payload_scripts:
+        try:
+            render_template(
+                source,
+                {
+                    "script_name": name,
+                    "domain_name": "validate-domain",
+                    "project_name": "validate-project",
+                },
+            )
+        except RuntimeError as e:
+            LOGGER.error("Invalid payload script %s: %s", name, e)
+            errors += 1
+    if errors:
+        return 1
+    LOGGER.info("The profile %s is valid", Config.file())
+    return 0
+
+
+def aggregate(args: argparse.Namespace) -> int:
+    inventory_metadata: dict[HostKey, dict[str, str]] = dict()
+    if args.ansible_inventory:
+        inventory_metadata = load_inventory_metadata(args.ansible_inventory)
+        LOGGER.info(
+            "Loaded the metadata of %d hosts from %s",
+            len(inventory_metadata),
+            args.ansible_inventory,
+        )
+    elif args.aggregate_by not in ("project", "domain"):
+        LOGGER.error(
+            "Aggregating by %s needs the inventory, specify --ansible_inventory",
+            args.aggregate_by,
+        )
+        return 1
+
+    report = aggregate_results(
+        args.aggregate_results, inventory_metadata, args.aggregate_by
+    )
+    if not report:
+        LOGGER.error("No results found in %s", args.aggregate_results)
+        return 1
+    log_aggregate_report(report)
+    if args.metrics_file:
+        write_aggregate_report(args.metrics_file, report)
+    return 0
+
+
+def compare(args: argparse.Namespace) -> int:
+    from .compare import (
+        compare_runs,
+        load_metrics_samples,
+        log_comparisons,
+        write_comparisons,
+    )
+
+    baseline_file, current_file = args.compare_metrics
+    try:
+        baseline = load_metrics_samples(baseline_file)
+        current = load_metrics_samples(current_file)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        LOGGER.error("Unable to load the metrics: %s", e)
+        return 2
+
+    comparisons = compare_runs(
+        baseline,
+        current,
+        [("*", DEFAULT_REGRESSION_THRESHOLD), *args.regression_threshold],
+    )
+    log_comparisons(comparisons)
+    if args.metrics_file:
+        write_comparisons(args.metrics_file, comparisons)
+    regressed = [c.name for c in comparisons if c.verdict == "regressed"]
+    if regressed:
+        LOGGER.error(
+            "%d of %d metrics regressed: %s",
+            len(regressed),
+            len(comparisons),
+            ", ".join(regressed),
+        )
+        return 1
+    LOGGER.info("No regression in %d metrics", len(comparisons))
+    return 0
+
+
+def write_ansible_inventory(directory_location: str, inventory: dict[str, Any]):
+    for name, data in sorted(inventory.items()):
+        base_dir = f"{directory_location}/{name}"
+        filename = f"{base_dir}/data.yml"
+        os.makedirs(base_dir, exist_ok=True)
+        with open(filename, "w") as file:
+            LOGGER.info(
+                "Creating ansible_inventory_file %s for host %s",
+                filename,
+                data["hostname"],
+            )
+            yaml.dump(data, file, default_flow_style=False, explicit_start=True)
+
+
+def write_clouds_yaml(filename: str, clouds_yaml_data: dict[str, Any]):
+    LOGGER.info("Creating a clouds yaml : %s", filename)
+    clouds_yaml_data_new = {"clouds": clouds_yaml_data}
+
+    if os.path.exists(filename):
+        with open(filename, "r") as file:
+            existing_data = yaml.safe_load(file)
+        backup_file = f"{filename}_{iso_timestamp()}"
+        LOGGER.warning(
+            "File %s, making an backup to %s and adding the new values",
+            filename,
+            backup_file,
+        )
+        shutil.copy2(filename, backup_file)
+        clouds_yaml_data_new = deep_merge_dict(existing_data, clouds_yaml_data_new)
+
+    with open(filename, "w") as file:
+        yaml.dump(
+            clouds_yaml_data_new,
+            file,
+            default_flow_style=False,
+            explicit_start=True,
+        )
+
+
+def start_capacity_samplers(
+    args: argparse.Namespace, os_clouds: list[str], domain_names: list[str]
+) -> list[tuple[str, "CapacitySampler"]]:
+    # The capacity is sampled once per cloud by the main process, independent of the workers
+    if not args.sample_capacity:
+        return []
+    from .capacity import CapacitySampler
+    from .sweeper import GarbageSweeper
+
+    samplers = []
+    for os_cloud in os_clouds:
+        filename = args.sample_capacity
+        if len(os_clouds) > 1:
+            base, extension = os.path.splitext(filename)
+            filename = f"{base}-{os_cloud}{extension}"
+        sampler = CapacitySampler(
+            establish_connection(args.clouds_yaml, os_cloud),
+            GarbageSweeper.tags_for_domains(domain_names, args.run_tag),
+            filename,
+            interval=args.sample_interval,
+        )
+        sampler.start()
+        samplers.append((os_cloud, sampler))
+    return samplers
+
+
+def stop_capacity_samplers(samplers: list[tuple[str, "CapacitySampler"]]) -> RunResult:
+    result = RunResult()
+    for os_cloud, sampler in samplers:
+        sampler.stop()
+        sampler.log_peaks()
+        other = RunResult()
+        other.metrics = sampler.metrics()
+        result.merge(other, os_cloud if len(samplers) > 1 else None)
+    return result
+
+
+def write_results(args: argparse.Namespace, result: RunResult):
+    if args.ansible_inventory and args.create_machines:
+        write_ansible_inventory(args.ansible_inventory, result.inventory)
+    if args.generate_clouds_yaml and args.create_projects:
+        write_clouds_yaml(args.generate_clouds_yaml, result.clouds_yaml)
+
+    Metrics.replace(result.metrics)
+    Metrics.log_summary()
+    if args.metrics_file:
+        Metrics.dump(args.metrics_file)
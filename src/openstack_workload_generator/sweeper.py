@@ -0,0 +1,258 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from openstack.connection import Connection
+from openstack.exceptions import ResourceNotFound
+
+from .entities.helpers import ResourceTags
+
+LOGGER = logging.getLogger()
+
+
+class GarbageSweeper:
+
+    def __init__(
+        self,
+        conn: Connection,
+        tags: list[str],
+        concurrency: int,
+        dry_run: bool = False,
+        timeout: int = 300,
+        domain_tags: list[str] | None = None,
+    ):
+        self.conn = conn
+        self.tags = tags
+        # If set, only the resources tagged with one of these tags are deleted
+        self.domain_tags = set(domain_tags) if domain_tags else None
+        self.concurrency = concurrency
+        self.dry_run = dry_run
+        self.timeout = timeout
+        self.resources: dict[str, list[Any]] = dict()
+
+    @staticmethod
+    def tags_for_domains(domain_names: list[str], run_name: str | None) -> list[str]:
+        if run_name:
+            return [ResourceTags.run_tag(run_name)]
+        if "all" in domain_names:
+            return [ResourceTags.BASE_TAG]
+        return [ResourceTags.domain_tag(domain_name) for domain_name in domain_names]
+
+    @staticmethod
+    def domain_tags_for_run(
+        domain_names: list[str], run_name: str | None
+    ) -> list[str] | None:
+        # The list calls only filter by any of the tags, the resources of a run in specific
+        # domains are selected by the run tag and filtered by the domain tags on the client
+        if not run_name or "all" in domain_names:
+            return None
+        return [ResourceTags.domain_tag(domain_name) for domain_name in domain_names]
+
+    def _in_domains(self, resources: Any) -> list[Any]:
+        if self.domain_tags is None:
+            return list(resources)
+        return [
+            resource
+            for resource in resources
+            if self.domain_tags.intersection(resource.tags or [])
+        ]
+
+    def discover(self) -> dict[str, list[Any]]:
+        # Every resource type is fetched with one tag filtered list call for all domains
+        any_tags = ",".join(self.tags)
+        network = self.conn.network
+        self.resources = {
+            "servers": self._in_domains(
+                self.conn.compute.servers(all_projects=True, any_tags=any_tags)
+            ),
+            "floating_ips": self._in_domains(network.ips(any_tags=any_tags)),
+            "routers": self._in_domains(network.routers(any_tags=any_tags)),
+            "networks": self._in_domains(network.networks(any_tags=any_tags)),
+            "subnets": self._in_domains(network.subnets(any_tags=any_tags)),
+            "security_groups": self._in_domains(
+                network.security_groups(any_tags=any_tags)
+            ),
+            "projects": self._in_domains(
+                self.conn.identity.projects(any_tags=any_tags)
+            ),
+        }
+
+        # Ports created by nova are not tagged, find the leftovers in the tagged networks
+        ports = {
+            port.id: port for port in self._in_domains(network.ports(any_tags=any_tags))
+        }
+        network_ids = [n.id for n in self.resources["networks"]]
+        if network_ids:
+            for port in network.ports(network_id=network_ids):
+                ports[port.id] = port
+        self.resources["ports"] = [
+            port
+            for port in ports.values()
+            if not str(port.device_owner).startswith("network:")
+        ]
+
+        project_ids = {project.id for project in self.resources["projects"]}
+        self._discover_volumes()
+        # Server groups cannot be tagged either
+        self.resources["server_groups"] = [
+            server_group
+            for server_group in self.conn.compute.server_groups(all_projects=True)
+            if server_group.project_id in project_ids
+        ]
+        # Images can be tagged, but glance only filters by all of the given tags
+        self.resources["images"] = [
+            image for image in self.conn.image.images() if image.owner in project_ids
+        ]
+        # The snapshots of golden volumes have to be deleted before the volumes
+        self.resources["snapshots"] = [
+            snapshot
+            for snapshot in self.conn.block_storage.snapshots(all_projects=True)
+            if snapshot.project_id in project_ids
+        ]
+
+        for resource_type, resources in self.resources.items():
+            LOGGER.info(
+                "Found %d %s tagged with any of %s",
+                len(resources),
+                resource_type.replace("_", " "),
+                any_tags,
+            )
+        return self.resources
+
+    def _discover_volumes(self):
+        # Volumes cannot be tagged, unattached volumes in generator projects are leftovers.
+        # The data volumes of the servers are only detached when the servers are deleted,
+        # therefore the volumes are discovered again afterwards.
+        project_ids = {project.id for project in self.resources.get("projects", [])}
+        self.resources["volumes"] = [
+            volume
+            for volume in self.conn.block_storage.volumes(
+                all_projects=True, status="available"
+            )
+            if volume.project_id in project_ids
+        ]
+
+    def _delete_concurrently(
+        self, resource_type: str, delete_function: Callable[[Any], Any]
+    ) -> int:
+        resources = self.resources.get(resource_type, [])
+        if not resources:
+            return 0
+        if self.dry_run:
+            for resource in resources:
+                LOGGER.warning(
+                    "Dry run, not deleting %s %s (%s)",
+                    resource_type,
+                    resource.id,
+                    resource.name,
+                )
+            return 0
+
+        def delete(resource) -> bool:
+            try:
+                delete_function(resource)
+                LOGGER.warning(
+                    "Deleted %s %s (%s)", resource_type, resource.id, resource.name
+                )
+                return True
+            except ResourceNotFound:
+                return True
+            except Exception as e:
+                LOGGER.error(
+                    "Unable to delete %s %s: %s", resource_type, resource.id, e
+                )
+                return False
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            failed = list(executor.map(delete, resources)).count(False)
+        return failed
+
+    def _wait_for_servers_deleted(self):
+        server_ids = {server.id for server in self.resources.get("servers", [])}
+        deadline = time.monotonic() + self.timeout
+        while server_ids and time.monotonic() < deadline:
+            time.sleep(2)
+            existing = {
+                server.id
+                for server in self.conn.compute.servers(
+                    all_projects=True, any_tags=",".join(self.tags)
+                )
+            }
+            server_ids &= existing
+        if server_ids:
+            LOGGER.error(
+                "%d servers are not deleted after %s seconds",
+                len(server_ids),
+                self.timeout,
+            )
+
+    def _wait_for_snapshots_deleted(self):
+        for snapshot in self.resources.get("snapshots", []):
+            try:
+                self.conn.block_storage.wait_for_delete(snapshot, wait=self.timeout)
+            except Exception as e:
+                LOGGER.error("Snapshot %s is not deleted: %s", snapshot.id, e)
+
+    def _delete_project(self, project):
+        # The default security group of a project can only be deleted after the project
+        self.conn.identity.delete_project(project, ignore_missing=False)
+        for security_group in self.conn.network.security_groups(project_id=project.id):
+            self.conn.network.delete_security_group(security_group)
+
+    def _detach_router(self, router):
+        for port in self.conn.network.ports(device_id=router.id):
+            if port.device_owner == "network:router_interface":
+                self.conn.network.remove_interface_from_router(router, port_id=port.id)
+        self.conn.network.update_router(router, external_gateway_info=None)
+        self.conn.network.delete_router(router, ignore_missing=False)
+
+    def sweep(self) -> bool:
+        self.discover()
+        network = self.conn.network
+        failed = self._delete_concurrently(
+            "servers",
+            lambda r: self.conn.compute.delete_server(r, ignore_missing=False),
+        )
+        if not self.dry_run:
+            self._wait_for_servers_deleted()
+            self._discover_volumes()
+        failed += self._delete_concurrently(
+            "server_groups",
+            lambda r: self.conn.compute.delete_server_group(r, ignore_missing=False),
+        )
+        failed += self._delete_concurrently(
+            "floating_ips", lambda r: network.delete_ip(r, ignore_missing=False)
+        )
+        failed += self._delete_concurrently("routers", self._detach_router)
+        failed += self._delete_concurrently(
+            "ports", lambda r: network.delete_port(r, ignore_missing=False)
+        )
+        failed += self._delete_concurrently(
+            "subnets", lambda r: network.delete_subnet(r, ignore_missing=False)
+        )
+        failed += self._delete_concurrently(
+            "networks", lambda r: network.delete_network(r, ignore_missing=False)
+        )
+        failed += self._delete_concurrently(
+            "security_groups",
+            lambda r: network.delete_security_group(r, ignore_missing=False),
+        )
+        failed += self._delete_concurrently(
+            "images",
+            lambda r: self.conn.image.delete_image(r, ignore_missing=False),
+        )
+        failed += self._delete_concurrently(
+            "snapshots",
+            lambda r: self.conn.block_storage.delete_snapshot(r, ignore_missing=False),
+        )
+        if not self.dry_run:
+            self._wait_for_snapshots_deleted()
+        failed += self._delete_concurrently(
+            "volumes",
+            lambda r: self.conn.block_storage.delete_volume(r, ignore_missing=False),
+        )
+        failed += self._delete_concurrently("projects", self._delete_project)
+        if failed:
+            LOGGER.error("Unable to delete %d resources", failed)
+        return failed == 0
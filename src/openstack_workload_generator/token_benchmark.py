@@ -0,0 +1,168 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from .entities.helpers import DomainCache
+from .metrics import LazyStats, Metrics, summarize
+
+if TYPE_CHECKING:
+    from openstack.connection import Connection
+
+    from .entities.project import WorkloadGeneratorProject
+
+LOGGER = logging.getLogger()
+
+
+@dataclass(slots=True)
+class TokenTarget:
+    user_name: str
+    password: str
+    domain_id: str
+    project_id: str
+
+
+def _auth_body(target: TokenTarget) -> dict[str, Any]:
+    return {
+        "auth": {
+            "identity": {
+                "methods": ["password"],
+                "password": {
+                    "user": {
+                        "name": target.user_name,
+                        "domain": {"id": target.domain_id},
+                        "password": target.password,
+                    }
+                },
+            },
+            "scope": {"project": {"id": target.project_id}},
+        }
+    }
+
+
+class TokenBenchmark:
+    # Requests project scoped tokens for the users of the generated projects with a fixed rate
+    # (open loop, request n is started n / rate seconds after the start, independent of the
+    # latency of the previous requests) and validates every issued token with the admin token
+
+    def __init__(
+        self,
+        conn: "Connection",
+        targets: list[TokenTarget],
+        requests_per_target: int,
+        rate: int,
+        concurrency: int,
+    ):
+        self.conn = conn
+        self.targets = targets
+        self.requests_per_target = requests_per_target
+        self.rate = rate
+        self.concurrency = concurrency
+        self.tokens_url = f"{conn.identity.get_endpoint().rstrip('/')}/auth/tokens"
+
+    def _issue_and_validate(self, target: TokenTarget, scheduled: float) -> bool:
+        delay = scheduled - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        elif -delay > 1 / self.rate:
+            # More than one request interval late, the parallelism limits the rate
+            Metrics.record("token_schedule_lag", -delay)
+
+        started = time.monotonic()
+        response = self.conn.session.post(
+            self.tokens_url,
+            json=_auth_body(target),
+            authenticated=False,
+            raise_exc=False,
+        )
+        Metrics.record("token_issue", time.monotonic() - started)
+        if response.status_code != 201:
+            LOGGER.error(
+                "Unable to issue a token for %s in %s: %s",
+                target.user_name,
+                DomainCache.lazy_ident(target.domain_id),
+                response.status_code,
+                extra={"project_id": target.project_id, "domain_id": target.domain_id},
+            )
+            return False
+
+        started = time.monotonic()
+        response = self.conn.session.get(
+            self.tokens_url,
+            headers={"X-Subject-Token": response.headers["X-Subject-Token"]},
+            raise_exc=False,
+        )
+        Metrics.record("token_validate", time.monotonic() - started)
+        if response.status_code != 200:
+            LOGGER.error(
+                "Unable to validate the token of %s in %s: %s",
+                target.user_name,
+                DomainCache.lazy_ident(target.domain_id),
+                response.status_code,
+                extra={"project_id": target.project_id, "domain_id": target.domain_id},
+            )
+            return False
+        return True
+
+    def run(self) -> bool:
+        requests = [
+            target for _ in range(self.requests_per_target) for target in self.targets
+        ]
+        LOGGER.info(
+            "Requesting %d tokens for %d projects with %s requests/s and a parallelism of %d",
+            len(requests),
+            len(self.targets),
+            self.rate,
+            self.concurrency,
+        )
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [
+                executor.submit(
+                    self._issue_and_validate, target, started + nr / self.rate
+                )
+                for nr, target in enumerate(requests)
+            ]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    LOGGER.error("Unable to request a token: %s", e)
+                    results.append(False)
+        duration = time.monotonic() - started
+
+        errors = results.count(False)
+        Metrics.record("token_errors", errors)
+        for name in ("token_issue", "token_validate"):
+            stats = summarize(Metrics.samples(name))
+            if stats["count"]:
+                LOGGER.info("%s: %s", name, LazyStats(stats, "{:.3f}s"))
+        if Metrics.samples("token_schedule_lag"):
+            LOGGER.warning(
+                "%d requests started late, the parallelism is too low for the requested rate",
+                len(Metrics.samples("token_schedule_lag")),
+            )
+        LOGGER.info(
+            "Token benchmark finished: %d of %d tokens issued and validated in %.1f seconds "
+            "(%.1f requests/s), %d errors",
+            len(results) - errors,
+            len(results),
+            duration,
+            len(results) / duration,
+            errors,
+        )
+        return errors == 0
+
+
+def token_targets(projects: list["WorkloadGeneratorProject"]) -> list[TokenTarget]:
+    return [
+        TokenTarget(
+            user_name=project.user.user_name,
+            password=project.user.user_password,
+            domain_id=project.obj.domain_id,
+            project_id=project.obj.id,
+        )
+        for project in projects
+    ]
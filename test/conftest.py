@@ -0,0 +1,39 @@
+import sys
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import pytest
+
+# The tool is started from the source tree, see the openstack_workload_generator wrapper
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from openstack_workload_generator.entities.helpers import Config  # noqa: E402
+from openstack_workload_generator.entities.settings import Settings  # noqa: E402
+from openstack_workload_generator.metrics import Metrics  # noqa: E402
+
+
+def profile(**overrides: Any) -> dict[str, Any]:
+    config: dict[str, Any] = dict(Config._defaults)
+    config["admin_vm_ssh_key"] = "ssh-rsa AAAAB3NzaC1yc2E test@example.com"
+    config.update(overrides)
+    return config
+
+
+@pytest.fixture
+def use_profile() -> Iterator[Callable[..., Settings]]:
+    # Activates a profile with the defaults and the given overrides for the test
+    def activate(**overrides: Any) -> Settings:
+        settings = Settings.from_dict(profile(**overrides))
+        Config.use_settings(settings)
+        return settings
+
+    yield activate
+    Config._settings = None
+    Config._file = None
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics() -> Iterator[None]:
+    Metrics.replace({})
+    yield
+    Metrics.replace({})
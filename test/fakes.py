@@ -0,0 +1,441 @@
+import itertools
+import types
+from collections import defaultdict
+from typing import Any
+
+from openstack.exceptions import ResourceNotFound
+
+# An in-memory cloud for the entity classes, the proxies implement the openstacksdk calls used by
+# the tool with the same names and keyword arguments. List calls filter by the attributes of the
+# resources, filters for attributes which a resource does not have are ignored.
+
+IGNORED_FILTERS = {"all_projects", "details"}
+
+# Cinder works asynchronously, a volume reaches the next status when the volumes are listed again
+VOLUME_TRANSITIONS = {
+    "creating": "available",
+    "attaching": "in-use",
+    "detaching": "available",
+}
+
+
+class FakeResource(types.SimpleNamespace):
+    pass
+
+
+class FakeCloud:
+
+    def __init__(self, name: str = "admin"):
+        self.resources: dict[str, list[FakeResource]] = defaultdict(list)
+        self.calls: list[tuple[str, dict[str, Any]]] = []
+        self.config = types.SimpleNamespace(name=name)
+        # The project of a project scoped connection, owns the created resources
+        self.project_id: str | None = None
+        self._ids = itertools.count(1)
+        self.identity = FakeIdentity(self)
+        self.network = FakeNetwork(self)
+        self.compute = FakeCompute(self)
+        self.image = FakeImage(self)
+        self.block_storage = FakeBlockStorage(self)
+        self.object_store = FakeObjectStore(self)
+        self.session = FakeSession(self)
+
+    def add(self, kind: str, **attributes: Any) -> FakeResource:
+        attributes.setdefault("id", f"{kind}-{next(self._ids)}")
+        attributes.setdefault("name", "")
+        attributes.setdefault("tags", [])
+        resource = FakeResource(**attributes)
+        self.resources[kind].append(resource)
+        return resource
+
+    def query(self, kind: str, **filters: Any) -> list[FakeResource]:
+        return [
+            resource
+            for resource in self.resources[kind]
+            if all(
+                _matches(resource, name, value)
+                for name, value in filters.items()
+                if name not in IGNORED_FILTERS
+            )
+        ]
+
+    def find(self, kind: str, name_or_id: str, **filters: Any) -> FakeResource | None:
+        for resource in self.query(kind, **filters):
+            if name_or_id in (resource.id, getattr(resource, "name", None)):
+                return resource
+        return None
+
+    def get(self, kind: str, resource: Any) -> FakeResource:
+        resource_id = getattr(resource, "id", resource)
+        for candidate in self.resources[kind]:
+            if candidate.id == resource_id:
+                return candidate
+        raise KeyError(f"No {kind} {resource_id}")
+
+    def delete(self, kind: str, resource: Any, ignore_missing: bool = True):
+        resource_id = getattr(resource, "id", resource)
+        self.record(f"delete_{kind}", id=resource_id)
+        remaining = [
+            candidate
+            for candidate in self.resources[kind]
+            if candidate.id != resource_id
+        ]
+        if len(remaining) == len(self.resources[kind]) and not ignore_missing:
+            raise ResourceNotFound(f"No {kind} {resource_id}")
+        self.resources[kind] = remaining
+
+    def record(self, call: str, **arguments: Any):
+        self.calls.append((call, arguments))
+
+    def called(self, call: str) -> list[dict[str, Any]]:
+        return [arguments for name, arguments in self.calls if name == call]
+
+
+def _matches(resource: FakeResource, name: str, value: Any) -> bool:
+    if name == "any_tags":
+        return bool(set(value.split(",")) & set(resource.tags))
+    if name == "tags":
+        return set(value.split(",")) <= set(resource.tags)
+    if not hasattr(resource, name):
+        return True
+    if isinstance(value, list):
+        return getattr(resource, name) in value
+    return getattr(resource, name) == value
+
+
+class FakeProxy:
+
+    def __init__(self, cloud: FakeCloud):
+        self.cloud = cloud
+
+
+class FakeIdentity(FakeProxy):
+
+    def get_endpoint(self) -> str:
+        return "https://keystone.example.com/v3/"
+
+    def find_domain(self, name_or_id: str) -> FakeResource | None:
+        return self.cloud.find("domain", name_or_id)
+
+    def find_project(self, name_or_id: str, domain_id: str) -> FakeResource | None:
+        return self.cloud.find("project", name_or_id, domain_id=domain_id)
+
+    def projects(self, **filters: Any) -> list[FakeResource]:
+        return self.cloud.query("project", **filters)
+
+    def create_project(self, **attributes: Any) -> FakeResource:
+        return self.cloud.add("project", **attributes)
+
+    def delete_project(self, project: Any, ignore_missing: bool = True):
+        self.cloud.delete("project", project, ignore_missing)
+
+
+class FakeSession(FakeProxy):
+    # Keystone issues tokens for the users with matching passwords and validates the issued tokens
+
+    def __init__(self, cloud: FakeCloud):
+        super().__init__(cloud)
+        self.issued: set[str] = set()
+
+    def post(self, url: str, json: dict[str, Any], **arguments: Any):
+        self.cloud.record("post", url=url, **arguments)
+        user = json["auth"]["identity"]["password"]["user"]
+        known = self.cloud.find("user", user["name"], domain_id=user["domain"]["id"])
+        if known is None or known.password != user["password"]:
+            return types.SimpleNamespace(status_code=401, headers={})
+        token = f"token-{next(self.cloud._ids)}"
+        self.issued.add(token)
+        return types.SimpleNamespace(
+            status_code=201, headers={"X-Subject-Token": token}
+        )
+
+    def get(self, url: str, headers: dict[str, str], **arguments: Any):
+        self.cloud.record("get", url=url, **arguments)
+        valid = headers["X-Subject-Token"] in self.issued
+        return types.SimpleNamespace(status_code=200 if valid else 404, headers={})
+
+
+class FakeNetwork(FakeProxy):
+
+    def agents(self, **filters: Any) -> list[FakeResource]:
+        return self.cloud.query("agent", **filters)
+
+    def networks(self, **filters: Any) -> list[FakeResource]:
+        return self.cloud.query("network", **filters)
+
+    def find_network(self, name_or_id: str, **filters: Any) -> FakeResource | None:
+        return self.cloud.find("network", name_or_id, **filters)
+
+    def subnets(self, **filters: Any) -> list[FakeResource]:
+        return self.cloud.query("subnet", **filters)
+
+    def routers(self, **filters: Any) -> list[FakeResource]:
+        return self.cloud.query("router", **filters)
+
+    def ports(self, **filters: Any) -> list[FakeResource]:
+        self.cloud.record("ports", **filters)
+        return self.cloud.query("port", **filters)
+
+    def create_ports(self, data: list[dict[str, Any]]) -> list[FakeResource]:
+        self.cloud.record("create_ports", data=data)
+        return [
+            self.cloud.add("port", device_id="", **attributes) for attributes in data
+        ]
+
+    def set_tags(self, resource: Any, tags: list[str]):
+        self.cloud.record("set_tags", id=resource.id, tags=tags)
+        resource.tags = list(tags)
+
+    def find_extension(self, name_or_id: str) -> FakeResource | None:
+        return self.cloud.find("extension", name_or_id)
+
+    def security_groups(self, **filters: Any) -> list[FakeResource]:
+        return self.cloud.query("security_group", **filters)
+
+    def ips(self, **filters: Any) -> list[FakeResource]:
+        return self.cloud.query("floating_ip", **filters)
+
+    def delete_ip(self, ip: Any, ignore_missing: bool = True):
+        self.cloud.delete("floating_ip", ip, ignore_missing)
+
+    def delete_port(self, port: Any, ignore_missing: bool = True):
+        self.cloud.delete("port", port, ignore_missing)
+
+    def delete_subnet(self, subnet: Any, ignore_missing: bool = True):
+        self.cloud.delete("subnet", subnet, ignore_missing)
+
+    def delete_network(self, network: Any, ignore_missing: bool = True):
+        self.cloud.delete("network", network, ignore_missing)
+
+    def delete_router(self, router: Any, ignore_missing: bool = True):
+        self.cloud.delete("router", router, ignore_missing)
+
+    def delete_security_group(self, security_group: Any, ignore_missing: bool = True):
+        self.cloud.delete("security_group", security_group, ignore_missing)
+
+    def update_router(self, router: Any, **attributes: Any):
+        self.cloud.record(
+            "update_router", id=getattr(router, "id", router), **attributes
+        )
+
+    def remove_interface_from_router(self, router: Any, **attributes: Any):
+        self.cloud.record(
+            "remove_interface_from_router",
+            id=getattr(router, "id", router),
+            **attributes,
+        )
+
+
+class FakeCompute(FakeProxy):
+
+    def servers(self, **filters: Any) -> list[FakeResource]:
+        return self.cloud.query("server", **filters)
+
+    def find_server(self, name_or_id: str) -> FakeResource | None:
+        return self.cloud.find("server", name_or_id)
+
+    def delete_server(self, server: Any, ignore_missing: bool = True):
+        self.cloud.delete("server", server, ignore_missing)
+        # Nova detaches the volumes of a deleted server
+        server_id = getattr(server, "id", server)
+        for volume in self.cloud.resources["volume"]:
+            if getattr(volume, "server_id", None) == server_id:
+                volume.status = "available"
+                volume.server_id = None
+
+    def server_groups(self, **filters: Any) -> list[FakeResource]:
+        return self.cloud.query("server_group", **filters)
+
+    def create_server_group(self, **attributes: Any) -> FakeResource:
+        self.cloud.record("create_server_group", **attributes)
+        return self.cloud.add("server_group", **attributes)
+
+    def hypervisors(self, **filters: Any) -> list[FakeResource]:
+        return self.cloud.query("hypervisor", **filters)
+
+    def get_quota_set(self, project_id: str, usage: bool = False) -> FakeResource:
+        # The quota sets are stored with the id of their project
+        self.cloud.record("get_quota_set", project_id=project_id, usage=usage)
+        return self.cloud.find("quota_set", project_id) or FakeResource(usage={})
+
+    def delete_server_group(self, server_group: Any, ignore_missing: bool = True):
+        self.cloud.delete("server_group", server_group, ignore_missing)
+
+    def _power(self, call: str, server_id: str, status: str):
+        self.cloud.record(call, server_id=server_id)
+        server = self.cloud.get("server", server_id)
+        # A server can be prepared to fail by setting its fail_power_action attribute
+        server.status = (
+            "ERROR" if getattr(server, "fail_power_action", False) else status
+        )
+
+    def start_server(self, server_id: str):
+        self._power("start_server", server_id, "ACTIVE")
+
+    def stop_server(self, server_id: str):
+        self._power("stop_server", server_id, "SHUTOFF")
+
+    def reboot_server(self, server_id: str, reboot_type: str):
+        self._power("reboot_server", server_id, "ACTIVE")
+
+    def create_volume_attachment(self, server_id: str, volume_id: str):
+        self.cloud.record(
+            "create_volume_attachment", server_id=server_id, volume_id=volume_id
+        )
+        volume = self.cloud.get("volume", volume_id)
+        volume.status = "attaching"
+        volume.server_id = server_id
+        volume.attachments = [{"server_id": server_id}]
+
+    def delete_volume_attachment(self, server_id: str, volume_id: str):
+        self.cloud.record(
+            "delete_volume_attachment", server_id=server_id, volume_id=volume_id
+        )
+        volume = self.cloud.get("volume", volume_id)
+        volume.status = "detaching"
+        volume.server_id = None
+        volume.attachments = []
+
+
+class FakeImage(FakeProxy):
+
+    def images(self, **filters: Any) -> list[FakeResource]:
+        return self.cloud.query("image", **filters)
+
+    def create_image(self, name: str, data: Any, **attributes: Any) -> FakeResource:
+        # The data is consumed like the upload of the sdk, only the sizes of the chunks are kept
+        chunks = [len(chunk) for chunk in data]
+        self.cloud.record("create_image", name=name, chunks=chunks, **attributes)
+        return self.cloud.add(
+            "image",
+            name=name,
+            owner=self.cloud.project_id,
+            tags=attributes.get("tags", []),
+        )
+
+    def delete_image(self, image: Any, ignore_missing: bool = True):
+        self.cloud.delete("image", image, ignore_missing)
+
+
+class FakeBlockStorage(FakeProxy):
+
+    def volumes(self, **filters: Any) -> list[FakeResource]:
+        volumes = self.cloud.query("volume", **filters)
+        for volume in volumes:
+            volume.status = VOLUME_TRANSITIONS.get(volume.status, volume.status)
+        return volumes
+
+    def snapshots(self, **filters: Any) -> list[FakeResource]:
+        return self.cloud.query("snapshot", **filters)
+
+    def find_volume(self, name_or_id: str, **filters: Any) -> FakeResource | None:
+        return self.cloud.find("volume", name_or_id, **filters)
+
+    def find_snapshot(self, name_or_id: str, **filters: Any) -> FakeResource | None:
+        return self.cloud.find("snapshot", name_or_id, **filters)
+
+    def create_volume(self, **attributes: Any) -> FakeResource:
+        self.cloud.record("create_volume", **attributes)
+        attributes.setdefault("status", "creating")
+        attributes.setdefault("metadata", {})
+        attributes.setdefault("attachments", [])
+        attributes.setdefault("project_id", self.cloud.project_id)
+        return self.cloud.add("volume", **attributes)
+
+    def create_snapshot(self, **attributes: Any) -> FakeResource:
+        self.cloud.record("create_snapshot", **attributes)
+        attributes.setdefault("status", "creating")
+        attributes.setdefault("project_id", self.cloud.project_id)
+        return self.cloud.add("snapshot", **attributes)
+
+    def wait_for_status(self, resource: Any, status: str, **arguments: Any):
+        # The resource becomes ready immediately
+        self.cloud.record("wait_for_status", id=resource.id, status=status)
+        resource.status = status
+        return resource
+
+    def delete_volume(self, volume: Any, ignore_missing: bool = True):
+        self.cloud.delete("volume", volume, ignore_missing)
+
+    def delete_snapshot(self, snapshot: Any, ignore_missing: bool = True):
+        self.cloud.delete("snapshot", snapshot, ignore_missing)
+
+    def wait_for_delete(self, resource: Any, **arguments: Any):
+        pass
+
+
+class FakeObjectStore(FakeProxy):
+
+    def __init__(self, cloud: FakeCloud):
+        super().__init__(cloud)
+        # The creation of these containers fails like a rejected request of swift
+        self.failing_containers: set[str] = set()
+
+    def create_container(self, name: str) -> FakeResource:
+        self.cloud.record("create_container", name=name)
+        if name in self.failing_containers:
+            raise RuntimeError(f"Unable to create container {name}")
+        return self.cloud.find("container", name) or self.cloud.add(
+            "container", name=name
+        )
+
+    def containers(self, prefix: str = "") -> list[FakeResource]:
+        return [
+            container
+            for container in self.cloud.resources["container"]
+            if container.name.startswith(prefix)
+        ]
+
+    def objects(self, container: str) -> list[FakeResource]:
+        return self.cloud.query("object", container=container)
+
+    def upload_object(self, container: str, name: str, data: Any) -> FakeResource:
+        self.cloud.record("upload_object", container=container, name=name)
+        return self.cloud.add(
+            "object", name=name, container=container, data=bytes(data)
+        )
+
+    def stream_object(self, obj: Any, container: str, chunk_size: int):
+        name = getattr(obj, "name", obj)
+        for candidate in self.objects(container):
+            if candidate.name == name:
+                data = candidate.data
+                while data:
+                    yield data[:chunk_size]
+                    data = data[chunk_size:]
+                return
+        raise ResourceNotFound(f"No object {container}/{name}")
+
+    def delete_object(self, obj: Any, container: str, ignore_missing: bool = True):
+        name = getattr(obj, "name", obj)
+        for candidate in self.objects(container):
+            if candidate.name == name:
+                self.cloud.delete("object", candidate, ignore_missing)
+                return
+        if not ignore_missing:
+            raise ResourceNotFound(f"No object {container}/{name}")
+
+    def delete_container(self, container: Any):
+        name = getattr(container, "name", container)
+        self.cloud.delete("container", self.cloud.find("container", name))
+
+
+def fake_project(cloud: FakeCloud, domain_name: str, project_name: str):
+    # The domain is registered in the cache like WorkloadGeneratorDomain does
+    from openstack_workload_generator.entities.helpers import DomainCache, ProjectCache
+
+    domain = cloud.find("domain", domain_name) or cloud.add("domain", name=domain_name)
+    DomainCache.add(domain.id, domain.name)
+    project = cloud.add("project", name=project_name, domain_id=domain.id)
+    ProjectCache.add(project.id, {"name": project_name, "domain_id": domain.id})
+    return domain, project
+
+
+def fake_server(cloud: FakeCloud, name: str, project_id: str, **attributes: Any):
+    attributes.setdefault("status", "ACTIVE")
+    attributes.setdefault("task_state", None)
+    attributes.setdefault("hypervisor_hostname", "compute1")
+    attributes.setdefault("availability_zone", "nova")
+    attributes.setdefault("created_at", "2026-01-01T00:00:00Z")
+    attributes.setdefault("addresses", {})
+    return cloud.add("server", name=name, project_id=project_id, **attributes)
@@ -0,0 +1,40 @@
+import pytest
+
+from openstack_workload_generator.entities.addressing import CidrAllocator
+
+
+def test_allocates_in_ascending_order():
+    allocator = CidrAllocator("10.0.0.0/22", 24)
+    assert [str(allocator.allocate()) for _ in range(4)] == [
+        "10.0.0.0/24",
+        "10.0.1.0/24",
+        "10.0.2.0/24",
+        "10.0.3.0/24",
+    ]
+    with pytest.raises(RuntimeError):
+        allocator.allocate()
+
+
+def test_skips_used_networks():
+    allocator = CidrAllocator(
+        "10.0.0.0/16", 24, used=["10.0.1.0/24", "10.0.2.128/25", "192.168.0.0/24"]
+    )
+    assert str(allocator.allocate()) == "10.0.0.0/24"
+    assert str(allocator.allocate()) == "10.0.3.0/24"
+
+
+def test_merges_adjacent_reservations():
+    allocator = CidrAllocator("10.0.0.0/16", 24)
+    for network in ("10.0.2.0/24", "10.0.0.0/24", "10.0.1.0/24", "10.0.0.0/8"):
+        allocator.reserve(network)
+    assert allocator._starts == [0]
+    assert allocator._ends == [255]
+    with pytest.raises(RuntimeError):
+        allocator.allocate()
+
+
+def test_rejects_invalid_settings():
+    with pytest.raises(ValueError):
+        CidrAllocator("10.0.0.0/16", 8)
+    with pytest.raises(ValueError):
+        CidrAllocator("no network", 24)
@@ -0,0 +1,97 @@
+import pytest
+
+from fakes import FakeCloud, fake_project
+from openstack_workload_generator.entities.boot_source import (
+    WorkloadGeneratorBootSource,
+)
+from openstack_workload_generator.entities.records import ProjectRecord
+
+
+def _boot_source(use_profile, boot_source: str):
+    settings = use_profile(vm_boot_source=boot_source)
+    cloud = FakeCloud(f"cloud-{boot_source}")
+    cloud.add("image", name="Ubuntu 24.04", id="image-ubuntu")
+    _, project = fake_project(cloud, "domain1", "project1")
+    cloud.project_id = project.id
+    record = ProjectRecord(
+        id=project.id, name=project.name, domain_id=project.domain_id
+    )
+    machine_class = settings.machine_class("project1", "machine1")
+    return cloud, WorkloadGeneratorBootSource(cloud, record, machine_class)
+
+
+def _root_disk(arguments):
+    (root_disk,) = arguments["block_device_mapping_v2"]
+    return root_disk
+
+
+def test_image_and_volume_strategies(use_profile):
+    _, boot_source = _boot_source(use_profile, "image")
+    boot_source.create_and_get_boot_source()
+    assert boot_source.server_arguments("machine1") == {"image_id": "image-ubuntu"}
+
+    cloud, boot_source = _boot_source(use_profile, "volume")
+    boot_source.create_and_get_boot_source()
+    root_disk = _root_disk(boot_source.server_arguments("machine1"))
+    assert (root_disk["source_type"], root_disk["uuid"]) == ("image", "image-ubuntu")
+    assert root_disk["delete_on_termination"]
+    assert not cloud.called("create_volume")
+
+
+def test_golden_volumes_are_cloned_before_waiting(use_profile):
+    cloud, boot_source = _boot_source(use_profile, "golden_volume")
+    boot_source.create_and_get_boot_source()
+    (golden,) = cloud.query("volume", name="golden-volume-project1")
+    assert golden.status == "available"
+
+    boot_source.clone_golden_volumes(["machine1", "machine2"])
+    calls = [
+        name for name, _ in cloud.calls if name in ("create_volume", "wait_for_status")
+    ]
+    # The golden volume, then both clones are requested before the first wait
+    assert calls == [
+        "create_volume",
+        "wait_for_status",
+        "create_volume",
+        "create_volume",
+        "wait_for_status",
+        "wait_for_status",
+    ]
+    clones = cloud.called("create_volume")[1:]
+    assert {clone["source_volume_id"] for clone in clones} == {golden.id}
+
+    first = _root_disk(boot_source.server_arguments("machine1"))
+    assert first["source_type"] == "volume"
+    assert first["uuid"] == cloud.query("volume", name="machine1-root")[0].id
+    # A machine which was not cloned in advance gets its clone on demand
+    _root_disk(boot_source.server_arguments("machine3"))
+    assert cloud.query("volume", name="machine3-root")
+    assert list(boot_source.root_volumes) == ["machine2"]
+
+
+def test_reused_golden_volume_is_waited_for(use_profile):
+    cloud, boot_source = _boot_source(use_profile, "golden_volume")
+    golden = cloud.add(
+        "volume",
+        name="golden-volume-project1",
+        status="downloading",
+        project_id=cloud.project_id,
+    )
+    boot_source.create_and_get_boot_source()
+    assert boot_source.obj_golden_volume.id == golden.id
+    assert cloud.called("wait_for_status") == [{"id": golden.id, "status": "available"}]
+    assert not cloud.called("create_volume")
+
+
+def test_golden_snapshot(use_profile):
+    cloud, boot_source = _boot_source(use_profile, "golden_snapshot")
+    boot_source.clone_golden_volumes(["machine1"])
+    assert not cloud.called("create_volume")
+    with pytest.raises(RuntimeError, match="golden snapshot is not created"):
+        boot_source.server_arguments("machine1")
+
+    boot_source.create_and_get_boot_source()
+    (snapshot,) = cloud.query("snapshot")
+    assert snapshot.volume_id == boot_source.obj_golden_volume.id
+    root_disk = _root_disk(boot_source.server_arguments("machine1"))
+    assert (root_disk["source_type"], root_disk["uuid"]) == ("snapshot", snapshot.id)
@@ -0,0 +1,110 @@
+import csv
+import logging
+
+from fakes import FakeCloud, fake_server
+from openstack_workload_generator.capacity import CAPACITY_COLUMNS, CapacitySampler
+
+TAGS = ["openstack-workload-generator"]
+
+
+def _cloud() -> FakeCloud:
+    cloud = FakeCloud()
+    for hypervisor in ("compute1", "compute2"):
+        cloud.add(
+            "hypervisor",
+            name=hypervisor,
+            vcpus=32,
+            vcpus_used=8,
+            memory_size=65536,
+            memory_used=16384,
+        )
+    for nr in range(3):
+        project = cloud.add("project", name=f"project{nr}", tags=TAGS)
+        cloud.add("quota_set", id=project.id, usage={"instances": 2, "cores": 4})
+        fake_server(cloud, f"machine{nr}", project.id, tags=TAGS)
+    fake_server(cloud, "building", "project-1", tags=TAGS, status="BUILD")
+    fake_server(cloud, "migrating", "project-1", tags=TAGS, status="MIGRATING")
+    # Servers which are not created by the tool are not counted
+    fake_server(cloud, "foreign", "project-1")
+    cloud.add("agent", is_alive=True)
+    cloud.add("agent", is_alive=False)
+    return cloud
+
+
+def test_sample_sums_the_cloud_state(tmp_path):
+    cloud = _cloud()
+    sampler = CapacitySampler(cloud, TAGS, str(tmp_path / "capacity.csv"), interval=1)
+
+    row = sampler.sample()
+    assert set(row) == set(CAPACITY_COLUMNS)
+    assert row["hypervisor_vcpus"] == 64
+    assert row["hypervisor_memory_used_mb"] == 32768
+    assert row["servers_active"] == 3
+    assert row["servers_build"] == 1
+    assert row["servers_other"] == 1
+    assert row["network_agents_alive"] == 1
+    assert row["network_agents_down"] == 1
+    # The first sample only knows the usage of two projects
+    assert row["quota_instances_used"] == 4
+
+
+def test_quota_usage_is_sampled_round_robin(tmp_path):
+    cloud = _cloud()
+    sampler = CapacitySampler(cloud, TAGS, str(tmp_path / "capacity.csv"), interval=1)
+
+    rows = [sampler.sample() for _ in range(3)]
+    assert [row["quota_cores_used"] for row in rows] == [8, 12, 12]
+    # At most two quota requests per sample, the project list is fetched again after a round
+    assert len(cloud.called("get_quota_set")) == 5
+    assert cloud.called("get_quota_set")[2:4] == [
+        {"project_id": cloud.resources["project"][2].id, "usage": True},
+        {"project_id": cloud.resources["project"][0].id, "usage": True},
+    ]
+
+
+def test_peaks_are_kept_and_flushed(tmp_path):
+    cloud = _cloud()
+    filename = tmp_path / "capacity.csv"
+    sampler = CapacitySampler(cloud, TAGS, str(filename), interval=1, buffer_size=2)
+
+    sampler.buffer.append(sampler.sample())
+    cloud.resources["server"][0].status = "ERROR"
+    sampler.buffer.append(sampler.sample())
+    sampler.flush()
+    cloud.resources["server"][1].status = "ERROR"
+    sampler.buffer.append(sampler.sample())
+    sampler.flush()
+
+    assert sampler.peaks["servers_active"] == 3
+    assert sampler.peaks["servers_error"] == 2
+    assert sampler.metrics()["capacity_peak_servers_error"] == [2]
+    with open(filename) as file:
+        rows = list(csv.DictReader(file))
+    # The header is only written once
+    assert [row["servers_error"] for row in rows] == ["0", "1", "2"]
+
+
+def test_sampler_thread_writes_the_samples(tmp_path):
+    cloud = _cloud()
+    filename = tmp_path / "capacity.csv"
+    sampler = CapacitySampler(cloud, TAGS, str(filename), interval=0.01)
+
+    sampler.start()
+    sampler.stop()
+    with open(filename) as file:
+        assert len(list(csv.DictReader(file))) >= 1
+    assert len(sampler.metrics()["capacity_sample"]) >= 1
+
+
+def test_log_peaks_reports_the_utilization(tmp_path, caplog):
+    cloud = _cloud()
+    sampler = CapacitySampler(cloud, TAGS, str(tmp_path / "capacity.csv"), interval=1)
+
+    with caplog.at_level(logging.INFO):
+        sampler.log_peaks()
+        sampler.sample()
+        sampler.log_peaks()
+    assert caplog.records[0].getMessage() == "No capacity samples were collected"
+    assert (
+        "peak utilization: vcpus=25.0% memory=25.0%" in caplog.records[1].getMessage()
+    )
@@ -0,0 +1,80 @@
+import base64
+import email
+import gzip
+import random
+import string
+
+import pytest
+
+from openstack_workload_generator.entities import cloud_init
+from openstack_workload_generator.entities.cloud_init import (
+    NOVA_USER_DATA_LIMIT,
+    encode_user_data,
+    render_template,
+    render_user_data,
+)
+
+CONTEXT = {
+    "project_name": "project1",
+    "machine_name": "machine1",
+    "machine_index": 0,
+}
+
+
+def _decode(encoded: str) -> bytes:
+    payload = base64.b64decode(encoded)
+    if payload[:2] == b"\x1f\x8b":
+        payload = gzip.decompress(payload)
+    return payload
+
+
+def _script(encoded: str) -> str:
+    (part,) = email.message_from_bytes(_decode(encoded)).get_payload()
+    return part.get_payload(decode=True).decode("utf-8")
+
+
+def test_template_is_rendered_with_shell_comments():
+    script = "#!/bin/bash\n{## a jinja comment ##}echo ${#HOME} {{ project_name }}\n"
+    assert render_template(script, CONTEXT) == "#!/bin/bash\necho ${#HOME} project1\n"
+
+
+def test_undefined_variables_fail():
+    with pytest.raises(RuntimeError, match="Unable to render the script template"):
+        render_template("#!/bin/bash\necho {{ unknown }}", CONTEXT)
+    with pytest.raises(RuntimeError, match="Unable to render the script template"):
+        render_user_data("#!/bin/bash\necho {{ unknown }}", CONTEXT)
+
+
+def test_content_type_is_detected_from_the_first_line():
+    payload = _decode(encode_user_data("#cloud-config\nruncmd: []\n"))
+    assert b"Content-Type: text/cloud-config" in payload
+    payload = _decode(encode_user_data("echo hello\n"))
+    assert b"Content-Type: text/x-shellscript" in payload
+
+
+def test_large_payloads_are_compressed():
+    script = "#!/bin/bash\n" + "echo hello\n" * 10000
+    encoded = encode_user_data(script)
+    assert len(encoded) <= NOVA_USER_DATA_LIMIT
+    assert _script(encoded) == script
+    assert encode_user_data(script) == encoded
+
+    noise = "".join(random.Random(1).choices(string.ascii_letters, k=100000))
+    with pytest.raises(RuntimeError, match="too large"):
+        encode_user_data(f"#!/bin/bash\n# {noise}\n")
+
+
+def test_cache_is_keyed_by_the_used_variables():
+    cloud_init._cached_user_data.cache_clear()
+    script = "#!/bin/bash\necho {{ project_name }}\n"
+    for index in range(10):
+        render_user_data(
+            script,
+            CONTEXT | {"machine_name": f"machine{index}", "machine_index": index},
+        )
+    assert cloud_init._cached_user_data.cache_info().currsize == 1
+
+    per_machine = "#!/bin/bash\necho {{ machine_name }}\n"
+    for index in range(200):
+        render_user_data(per_machine, CONTEXT | {"machine_name": f"machine{index}"})
+    assert cloud_init._cached_user_data.cache_info().currsize <= 64
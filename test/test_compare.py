@@ -0,0 +1,48 @@
+from openstack_workload_generator.compare import (
+    compare_metric,
+    compare_runs,
+    threshold_for,
+)
+
+BASELINE = [1.0, 1.1, 1.2, 1.3, 1.4, 1.5, 1.6, 1.7]
+
+
+def test_regression_beyond_the_threshold():
+    slower = [value * 2 for value in BASELINE]
+    assert compare_metric("server_create_api", BASELINE, slower, 10).verdict == (
+        "regressed"
+    )
+    assert compare_metric("server_create_api", BASELINE, slower, 200).verdict == (
+        "within threshold"
+    )
+    assert compare_metric("server_create_api", slower, BASELINE, 10).verdict == (
+        "improved"
+    )
+
+
+def test_higher_throughput_is_better():
+    faster = [value * 2 for value in BASELINE]
+    comparison = compare_metric("upload_mb_per_s", BASELINE, faster, 10)
+    assert comparison.verdict == "improved"
+    assert comparison.p50_change > 0
+
+
+def test_insignificant_and_small_samples():
+    assert compare_metric("a", BASELINE, list(BASELINE), 10).verdict == "unchanged"
+    comparison = compare_metric("a", [1.0, 2.0], [3.0, 4.0], 10)
+    assert comparison.verdict == "too few samples"
+    assert comparison.p_value is None
+
+
+def test_last_matching_threshold_wins():
+    thresholds = [("*", 10.0), ("server_*", 25.0), ("server_teardown", 50.0)]
+    assert threshold_for("project_teardown", thresholds) == 10.0
+    assert threshold_for("server_create_api", thresholds) == 25.0
+    assert threshold_for("server_teardown", thresholds) == 50.0
+
+
+def test_only_common_metrics_are_compared():
+    comparisons = compare_runs(
+        {"a": BASELINE, "b": BASELINE}, {"b": BASELINE, "c": BASELINE}, [("*", 10.0)]
+    )
+    assert [comparison.name for comparison in comparisons] == ["b"]
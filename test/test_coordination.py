@@ -0,0 +1,138 @@
+import argparse
+import time
+
+import pytest
+
+from openstack_workload_generator.coordination import (
+    SHARD_CLAIMED,
+    SHARD_DONE,
+    SHARD_FAILED,
+    SHARD_PENDING,
+    LeaseKeeper,
+    LeaseLost,
+    WorkQueue,
+)
+from openstack_workload_generator.runner import RunResult, execute_coordinated
+
+
+def test_claims_every_shard_once(tmp_path):
+    filename = str(tmp_path / "queue.sqlite")
+    first = WorkQueue(filename, "run1", owner="host1")
+    second = WorkQueue(filename, "run1", owner="host2")
+    first.add_shards(["cloud1"], ["domain1", "domain2"])
+    # Adding the shards again, e.g. by another host, does not duplicate them
+    second.add_shards(["cloud1"], ["domain1", "domain2"])
+
+    shard1 = first.claim(60)
+    shard2 = second.claim(60)
+    assert shard1 is not None and shard2 is not None
+    assert {shard1.domain_name, shard2.domain_name} == {"domain1", "domain2"}
+    assert first.claim(60) is None
+    assert first.unfinished() == 2
+
+    assert first.finish(shard1, SHARD_DONE, {"exit_code": 0})
+    assert first.unfinished() == 1
+    assert [(status, result) for _, status, result in first.results()] == [
+        (SHARD_DONE, {"exit_code": 0}),
+        (SHARD_CLAIMED, None),
+    ]
+
+
+def test_a_new_run_reuses_the_queue_file(tmp_path):
+    filename = str(tmp_path / "queue.sqlite")
+    previous = WorkQueue(filename, "run1", owner="host1")
+    previous.add_shards(["cloud1"], ["domain1"])
+    shard = previous.claim(60)
+    assert shard is not None and previous.finish(shard, SHARD_DONE, {})
+
+    queue = WorkQueue(filename, "run2", owner="host1")
+    queue.add_shards(["cloud1"], ["domain1"])
+    assert [status for _, status, _ in queue.results()] == [SHARD_PENDING]
+    assert queue.claim(60) is not None
+    assert [status for _, status, _ in previous.results()] == [SHARD_DONE]
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    filename = str(tmp_path / "queue.sqlite")
+    first = WorkQueue(filename, "run1", owner="host1")
+    second = WorkQueue(filename, "run1", owner="host2")
+    first.add_shards(["cloud1"], ["domain1"])
+
+    shard = first.claim(0.01)
+    assert shard is not None
+    time.sleep(0.05)
+    taken_over = second.claim(60)
+    assert taken_over is not None and taken_over.shard_id == shard.shard_id
+
+    # The previous owner can neither renew nor finish the shard anymore
+    assert not first.heartbeat(shard, 60)
+    assert not first.finish(shard, SHARD_DONE)
+    assert second.heartbeat(taken_over, 60)
+
+
+def test_failed_shards_are_retried(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), "run1", max_attempts=2)
+    queue.add_shards(["cloud1"], ["domain1"])
+
+    shard = queue.claim(60)
+    assert shard is not None and queue.finish(shard, SHARD_FAILED, {"exit_code": 1})
+    assert [status for _, status, _ in queue.results()] == [SHARD_PENDING]
+
+    shard = queue.claim(60)
+    assert shard is not None and queue.finish(shard, SHARD_FAILED, {"exit_code": 1})
+    assert queue.results()[0][1:] == (SHARD_FAILED, {"exit_code": 1})
+    assert queue.claim(60) is None
+    assert queue.unfinished() == 0
+
+
+def test_expired_leases_use_up_the_attempts(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), "run1", max_attempts=1)
+    queue.add_shards(["cloud1"], ["domain1"])
+    assert queue.claim(0.01) is not None
+    time.sleep(0.05)
+    assert queue.claim(60) is None
+    assert [status for _, status, _ in queue.results()] == [SHARD_FAILED]
+
+
+def test_lease_keeper_detects_the_lost_lease(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), "run1", owner="host1")
+    queue.add_shards(["cloud1"], ["domain1"])
+    shard = queue.claim(60)
+    assert shard is not None
+
+    keeper = LeaseKeeper(queue, shard, 60)
+    keeper.check()
+    keeper.expires = time.time() - 1
+    with pytest.raises(LeaseLost):
+        keeper.check()
+    assert keeper.lost
+
+
+def test_coordinated_run_retries_failed_domains(tmp_path, use_profile, monkeypatch):
+    use_profile()
+    attempts: list[str] = []
+
+    def execute_run(args, os_cloud, domain_names, checkpoint=None):
+        checkpoint()
+        attempts.extend(domain_names)
+        result = RunResult()
+        result.inventory = {domain_names[0]: {}}
+        # The first attempt of domain2 fails
+        result.exit_code = 1 if attempts.count("domain2") == 1 else 0
+        if domain_names == ["domain3"]:
+            raise RuntimeError("fatal")
+        return result
+
+    monkeypatch.setattr("openstack_workload_generator.runner.execute_run", execute_run)
+    args = argparse.Namespace(
+        coordination_queue=str(tmp_path / "queue.sqlite"),
+        coordination_run=None,
+        run_tag="run1",
+        coordination_attempts=2,
+        coordination_lease=60,
+        workers=1,
+    )
+    result = execute_coordinated(args, ["cloud1"], ["domain1", "domain2", "domain3"])
+    assert sorted(attempts) == ["domain1", "domain2", "domain2", "domain3", "domain3"]
+    assert sorted(result.inventory) == ["domain1", "domain2"]
+    assert result.exit_code == 1
@@ -0,0 +1,66 @@
+from fakes import FakeCloud, fake_project, fake_server
+from openstack_workload_generator.entities.data_volumes import (
+    DATA_VOLUME_METADATA_KEY,
+    WorkloadGeneratorDataVolumes,
+)
+from openstack_workload_generator.entities.project import WorkloadGeneratorProject
+
+
+def _machines(cloud: FakeCloud):
+    domain, project = fake_project(cloud, "domain1", "project1")
+    for name in ("machine1", "machine2"):
+        fake_server(cloud, name, project.id)
+    workload_project = WorkloadGeneratorProject(cloud, "project1", domain, user=None)
+    return workload_project, list(workload_project.workload_machines.values())
+
+
+def test_data_volumes_are_matched_by_metadata(use_profile):
+    use_profile(vm_data_volumes="2", vm_data_volume_size_gb="5")
+    cloud = FakeCloud()
+    workload_project, machines = _machines(cloud)
+    # A volume of the user which looks like a data volume by its name
+    foreign = cloud.add(
+        "volume",
+        name="machine1-data-0",
+        status="available",
+        metadata={},
+        attachments=[],
+    )
+    data_volumes = WorkloadGeneratorDataVolumes(
+        cloud, workload_project.obj, poll_interval=0
+    )
+
+    assert data_volumes.create_and_attach(machines)
+    created = cloud.called("create_volume")
+    assert sorted(volume["name"] for volume in created) == [
+        "machine1-data-0",
+        "machine1-data-1",
+        "machine2-data-0",
+        "machine2-data-1",
+    ]
+    assert all(
+        volume["metadata"] == {DATA_VOLUME_METADATA_KEY: "true"} for volume in created
+    )
+    assert len(cloud.called("create_volume_attachment")) == 4
+    assert foreign.status == "available" and not foreign.attachments
+
+    # A second run finds the attached data volumes
+    assert data_volumes.create_and_attach(machines)
+    assert len(cloud.called("create_volume")) == 4
+    assert len(cloud.called("create_volume_attachment")) == 4
+
+    assert data_volumes.detach_and_delete()
+    assert len(cloud.called("delete_volume_attachment")) == 4
+    assert cloud.query("volume") == [foreign]
+
+
+def test_no_data_volumes_configured(use_profile):
+    use_profile()
+    cloud = FakeCloud()
+    workload_project, machines = _machines(cloud)
+    data_volumes = WorkloadGeneratorDataVolumes(
+        cloud, workload_project.obj, poll_interval=0
+    )
+    assert data_volumes.create_and_attach(machines)
+    assert data_volumes.detach_and_delete()
+    assert not cloud.called("create_volume")
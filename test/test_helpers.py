@@ -0,0 +1,15 @@
+from openstack_workload_generator.entities.helpers import shard_list
+
+
+def test_shard_list_is_round_robin():
+    assert shard_list(["a", "b", "c", "d", "e"], 2) == [["a", "c", "e"], ["b", "d"]]
+    # No empty shards if there are more workers than items
+    assert shard_list(["a", "b"], 4) == [["a"], ["b"]]
+
+
+def test_shard_list_keeps_every_item_once():
+    items = [f"domain{nr}" for nr in range(23)]
+    shards = shard_list(items, 5)
+    assert len(shards) == 5
+    assert sorted(item for shard in shards for item in shard) == sorted(items)
+    assert max(map(len, shards)) - min(map(len, shards)) <= 1
@@ -0,0 +1,78 @@
+import types
+
+from fakes import FakeCloud, fake_project
+from openstack_workload_generator.entities.helpers import ResourceTags
+from openstack_workload_generator.entities.image_upload import (
+    WorkloadGeneratorImageUpload,
+    file_chunks,
+    synthetic_chunks,
+)
+from openstack_workload_generator.entities.records import ProjectRecord
+from openstack_workload_generator.image_uploads import run_image_uploads
+from openstack_workload_generator.metrics import Metrics
+
+
+def _project(cloud: FakeCloud, name: str) -> types.SimpleNamespace:
+    _, project = fake_project(cloud, "domain1", name)
+    record = ProjectRecord(id=project.id, name=name, domain_id=project.domain_id)
+    return types.SimpleNamespace(project_conn=cloud, obj=record)
+
+
+def test_synthetic_chunks_reuse_one_buffer():
+    chunks = list(synthetic_chunks(10, 4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert chunks[0] is chunks[1]
+    assert bytes(chunks[2]) == chunks[0][:2]
+    assert [len(chunk) for chunk in synthetic_chunks(3, 4)] == [3]
+
+
+def test_file_chunks(tmp_path):
+    filename = tmp_path / "image.raw"
+    filename.write_bytes(b"0123456789")
+    assert list(file_chunks(str(filename), 4)) == [b"0123", b"4567", b"89"]
+    empty = tmp_path / "empty.raw"
+    empty.write_bytes(b"")
+    assert list(file_chunks(str(empty), 4)) == []
+
+
+def test_missing_images_are_uploaded_once(use_profile):
+    use_profile(
+        image_uploads_per_project="2",
+        image_upload_size_mb="1",
+        image_upload_chunk_size_kb="256",
+    )
+    cloud = FakeCloud()
+    projects = [_project(cloud, "project1"), _project(cloud, "project2")]
+    # The first image of project1 exists from a previous run
+    cloud.add("image", name="upload-project1-0", owner=projects[0].obj.id)
+    cloud.project_id = projects[0].obj.id
+
+    assert run_image_uploads(projects)
+    uploads = cloud.called("create_image")
+    assert sorted(upload["name"] for upload in uploads) == [
+        "upload-project1-1",
+        "upload-project2-0",
+        "upload-project2-1",
+    ]
+    assert all(upload["chunks"] == [256 * 1024] * 4 for upload in uploads)
+    assert all(
+        upload["tags"] == ResourceTags.for_domain_id(projects[0].obj.domain_id)
+        for upload in uploads
+    )
+    assert len(Metrics.samples("image_upload")) == 3
+    assert len(Metrics.samples("image_upload_aggregate_mb_per_s")) == 1
+
+
+def test_delete_images_of_the_project(use_profile):
+    use_profile()
+    cloud = FakeCloud()
+    project = _project(cloud, "project1")
+    cloud.add("image", name="upload-project1-0", owner=project.obj.id)
+    cloud.add("image", name="upload-project10-0", owner=project.obj.id)
+    cloud.add("image", name="Ubuntu 24.04", owner=project.obj.id)
+
+    WorkloadGeneratorImageUpload(cloud, project.obj).delete_images()
+    assert [image.name for image in cloud.query("image")] == [
+        "upload-project10-0",
+        "Ubuntu 24.04",
+    ]
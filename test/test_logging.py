@@ -0,0 +1,71 @@
+import json
+import logging
+
+from fakes import FakeCloud, fake_project, fake_server
+from openstack_workload_generator.entities.helpers import (
+    JsonLinesFormatter,
+    LazyIdent,
+    ProjectCache,
+)
+from openstack_workload_generator.entities.project import WorkloadGeneratorProject
+from openstack_workload_generator.metrics import LazyStats
+
+LOGGER = logging.getLogger()
+
+
+def _record(message: str, *args, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("", logging.INFO, "test.py", 1, message, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_lines_contain_the_extra_fields():
+    _, project = fake_project(FakeCloud(), "domain1", "project1")
+    record = _record(
+        "Created %s in %s",
+        "machine1",
+        ProjectCache.lazy_ident(project.id),
+        server_id="server-1",
+        project_id=project.id,
+    )
+    data = json.loads(JsonLinesFormatter().format(record))
+    assert data["message"] == (
+        f"Created machine1 in project 'project1/{project.id}' in domain 'domain1/domain-1'"
+    )
+    assert (data["server_id"], data["project_id"]) == ("server-1", project.id)
+    assert data["level"] == "INFO"
+
+
+def test_arguments_are_only_formatted_for_enabled_levels(caplog):
+    resolved = []
+
+    def resolve(resource_id: str) -> str:
+        resolved.append(resource_id)
+        return resource_id
+
+    with caplog.at_level(logging.INFO):
+        LOGGER.debug("Skipped %s", LazyIdent(resolve, "debug"))
+        LOGGER.info("Logged %s", LazyIdent(resolve, "info"))
+    assert set(resolved) == {"info"}
+    assert caplog.messages == ["Logged info"]
+
+
+def test_lazy_stats():
+    stats = {"count": 3, "min": 1.0, "p50": 2.25}
+    assert str(LazyStats(stats)) == "min=1.00 p50=2.25"
+    assert str(LazyStats(stats, "{:.1f}s", ", ")) == "min=1.0s, p50=2.2s"
+
+
+def test_missing_public_network_is_logged_by_name(use_profile, caplog):
+    use_profile(public_network="external")
+    cloud = FakeCloud()
+    domain, project = fake_project(cloud, "domain1", "project1")
+    fake_server(cloud, "machine1", project.id)
+    workload_project = WorkloadGeneratorProject(cloud, "project1", domain, user=None)
+    machine = workload_project.workload_machines["machine1"]
+
+    with caplog.at_level(logging.ERROR):
+        machine.add_floating_ip()
+    (record,) = caplog.records
+    assert record.getMessage() == "There is no 'external' network"
+    assert record.project_id == project.id
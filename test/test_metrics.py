@@ -0,0 +1,36 @@
+import pytest
+
+from openstack_workload_generator.metrics import (
+    Metrics,
+    mann_whitney_p_value,
+    metric_unit,
+    percentile,
+)
+
+
+def test_percentile_interpolates():
+    assert percentile([4.0, 1.0, 3.0, 2.0], 50) == 2.5
+    assert percentile([1.0, 2.0, 3.0], 100) == 3.0
+    with pytest.raises(ValueError):
+        percentile([], 50)
+
+
+def test_mann_whitney_p_value():
+    baseline = [1.0, 1.1, 1.2, 1.3, 1.4, 1.5, 1.6, 1.7]
+    assert mann_whitney_p_value(baseline, baseline) == 1.0
+    assert mann_whitney_p_value(baseline, [value + 10 for value in baseline]) < 0.01
+    # Only ties, there is no variance
+    assert mann_whitney_p_value([1.0] * 5, [1.0] * 5) == 1.0
+
+
+def test_metric_unit():
+    assert metric_unit("server_time_to_active") == "s"
+    assert metric_unit("payload_requests_per_second") == ""
+    assert metric_unit("cloud1:capacity_peak_servers_active") == ""
+
+
+def test_measure_records_a_sample():
+    with Metrics.measure("block"):
+        pass
+    assert len(Metrics.samples("block")) == 1
+    assert Metrics.names() == ["block"]
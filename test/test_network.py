@@ -0,0 +1,91 @@
+import pytest
+
+from fakes import FakeCloud, fake_project
+from openstack_workload_generator.entities.helpers import ResourceTags
+from openstack_workload_generator.entities.network import WorkloadGeneratorNetwork
+from openstack_workload_generator.entities.records import (
+    NetworkRecord,
+    ProjectRecord,
+)
+
+
+def _network(cloud: FakeCloud) -> WorkloadGeneratorNetwork:
+    _, project = fake_project(cloud, "domain1", "project1")
+    for name in ("ingress", "egress"):
+        cloud.add("security_group", name=name, project_id=project.id)
+    record = ProjectRecord(
+        id=project.id, name=project.name, domain_id=project.domain_id
+    )
+    return WorkloadGeneratorNetwork(cloud, record, "ingress", "egress")
+
+
+@pytest.mark.parametrize("tags_in_body", [True, False])
+def test_bulk_created_ports_are_tagged(use_profile, tags_in_body):
+    use_profile()
+    cloud = FakeCloud()
+    if tags_in_body:
+        cloud.add("extension", name="tag-ports-during-bulk-creation")
+    network = _network(cloud)
+    machine_network = NetworkRecord(
+        id="network-1", name="localnet-project1", project_id="", subnet_ids=()
+    )
+    # The unattached port of a previous run is reused
+    existing = cloud.add("port", name="port-machine1", device_id="")
+
+    port_ids = network.create_and_get_ports(
+        {"machine1": machine_network, "machine2": machine_network}
+    )
+
+    (bulk,) = cloud.called("create_ports")
+    assert [port["name"] for port in bulk["data"]] == ["port-machine2"]
+    (created,) = cloud.query("port", name="port-machine2")
+    assert port_ids == {"machine1": existing.id, "machine2": created.id}
+    assert created.tags == ResourceTags.for_domain_id(network.project.domain_id)
+    assert bool(cloud.called("set_tags")) is not tags_in_body
+
+
+def test_delete_network_lists_the_ports_once(use_profile):
+    use_profile()
+    cloud = FakeCloud()
+    network = _network(cloud)
+    subnets = [cloud.add("subnet", name=f"subnet{nr}") for nr in range(2)]
+    cloud.get_subnet_by_id = lambda subnet_id: cloud.get("subnet", subnet_id)
+    obj_network = NetworkRecord(
+        id="network-a",
+        name="localnet-project1",
+        project_id=network.project.id,
+        subnet_ids=tuple(subnet.id for subnet in subnets),
+    )
+    cloud.add("network", id="network-a", name="localnet-project1")
+    for nr, subnet in enumerate(subnets):
+        cloud.add(
+            "port",
+            name=f"port{nr}",
+            network_id="network-a",
+            device_owner="compute:nova",
+            fixed_ips=[{"subnet_id": subnet.id}],
+        )
+    router_port = cloud.add(
+        "port",
+        network_id="network-a",
+        device_owner="network:router_interface",
+        device_id="router-1",
+        fixed_ips=[{"subnet_id": subnets[0].id}],
+    )
+    other = cloud.add(
+        "port",
+        network_id="network-b",
+        device_owner="compute:nova",
+        fixed_ips=[{"subnet_id": "subnet-b"}],
+    )
+
+    network._delete_network(obj_network)
+
+    assert cloud.called("ports") == [{"network_id": "network-a"}]
+    assert cloud.query("port") == [router_port, other]
+    assert cloud.called("remove_interface_from_router") == [
+        {"id": "router-1", "port_id": router_port.id}
+    ]
+    assert [call["id"] for call in cloud.called("delete_router")] == ["router-1"]
+    assert not cloud.query("subnet")
+    assert not cloud.query("network")
@@ -0,0 +1,97 @@
+import math
+import types
+
+from fakes import FakeCloud, fake_project
+from openstack_workload_generator.entities.records import ProjectRecord
+from openstack_workload_generator.metrics import Metrics, histogram
+from openstack_workload_generator.object_workload import run_object_workload
+
+
+def _projects(*names: str) -> list[types.SimpleNamespace]:
+    # Every project user has an own connection, like WorkloadGeneratorProject.project_conn
+    projects = []
+    for name in names:
+        cloud = FakeCloud()
+        domain, project = fake_project(cloud, "domain1", name)
+        projects.append(
+            types.SimpleNamespace(
+                project_conn=cloud,
+                obj=ProjectRecord(id=project.id, name=name, domain_id=domain.id),
+            )
+        )
+    return projects
+
+
+def _object_profile(use_profile):
+    use_profile(
+        object_workload_objects="6",
+        object_workload_containers="2",
+        object_workload_sizes_kb="4:60,64:40",
+        object_workload_concurrency="1",
+    )
+
+
+def test_object_workload_runs_all_operations(use_profile):
+    _object_profile(use_profile)
+    projects = _projects("project1", "project2")
+
+    assert run_object_workload(projects)
+    for project in projects:
+        cloud = project.project_conn
+        assert [call["name"] for call in cloud.called("create_container")] == [
+            f"owg-{project.obj.name}-0",
+            f"owg-{project.obj.name}-1",
+        ]
+        assert len(cloud.called("upload_object")) == 6
+        assert cloud.resources["object"] == []
+        assert cloud.resources["container"] == []
+    for operation in ("put", "get", "delete"):
+        assert len(Metrics.samples(f"object_{operation}")) == 12
+
+
+def test_object_workload_is_disabled_without_objects(use_profile):
+    use_profile(object_workload_objects="0")
+    projects = _projects("project1")
+
+    assert run_object_workload(projects)
+    assert projects[0].project_conn.calls == []
+
+
+def test_failed_setup_deletes_the_containers_of_all_projects(use_profile):
+    _object_profile(use_profile)
+    projects = _projects("project1", "project2")
+    projects[1].project_conn.object_store.failing_containers.add("owg-project2-1")
+
+    assert not run_object_workload(projects)
+    # No object was stored, the containers created before the failure are removed
+    for project in projects:
+        assert project.project_conn.called("upload_object") == []
+        assert project.project_conn.resources["container"] == []
+    assert len(projects[0].project_conn.called("delete_container")) == 2
+
+
+def test_failed_objects_are_not_read(use_profile):
+    _object_profile(use_profile)
+    projects = _projects("project1")
+    cloud = projects[0].project_conn
+    upload = cloud.object_store.upload_object
+
+    def failing_upload(container: str, name: str, data):
+        if name == "object-0":
+            raise RuntimeError("Service unavailable")
+        return upload(container=container, name=name, data=data)
+
+    cloud.object_store.upload_object = failing_upload
+
+    assert not run_object_workload(projects)
+    assert len(Metrics.samples("object_get")) == 5
+    assert cloud.resources["container"] == []
+
+
+def test_histogram_buckets():
+    assert histogram([0.1, 0.5, 1.0, 2.0, 7.0], (0.5, 1.0, 5.0)) == [
+        (0.5, 2),
+        (1.0, 1),
+        (5.0, 1),
+        (math.inf, 1),
+    ]
@@ -0,0 +1,117 @@
+import asyncio
+import contextlib
+import os
+
+import yaml
+
+from conftest import profile
+
+from openstack_workload_generator.entities.helpers import Config
+from openstack_workload_generator.payload_server import PayloadServer
+
+SCRIPTS = {"stress.sh": "#!/bin/bash\necho {{ domain_name }}/{{ project_name }}\n"}
+
+
+def test_serves_the_rendered_variant(use_profile):
+    use_profile(payload_scripts=SCRIPTS)
+    server = PayloadServer("127.0.0.1", 0)
+
+    status, headers, body = server.respond("GET", "/domain1/project1/stress.sh", {})
+    assert status == 200
+    assert body == b"#!/bin/bash\necho domain1/project1\n"
+    assert headers["ETag"].startswith('"')
+
+    _, other_headers, other_body = server.respond("GET", "/stress.sh", {})
+    assert other_body == b"#!/bin/bash\necho None/None\n"
+    assert other_headers["ETag"] != headers["ETag"]
+
+
+def test_not_modified_for_a_matching_etag(use_profile):
+    use_profile(payload_scripts=SCRIPTS)
+    server = PayloadServer("127.0.0.1", 0)
+    _, headers, _ = server.respond("GET", "/stress.sh", {})
+
+    status, _, body = server.respond(
+        "GET", "/stress.sh", {"if-none-match": f'"other", {headers["ETag"]}'}
+    )
+    assert (status, body) == (304, b"")
+    status, _, _ = server.respond("GET", "/stress.sh", {"if-none-match": '"other"'})
+    assert status == 200
+
+
+def test_rejects_unknown_scripts_and_methods(use_profile):
+    use_profile(payload_scripts=SCRIPTS)
+    server = PayloadServer("127.0.0.1", 0)
+    assert server.respond("GET", "/missing.sh", {})[0] == 404
+    assert server.respond("GET", "/a/b/c/stress.sh", {})[0] == 404
+    assert server.respond("POST", "/stress.sh", {})[0] == 405
+
+
+async def _request(port: int, request: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return response
+
+
+def test_http_on_localhost(use_profile, tmp_path):
+    profile_file = tmp_path / "profile.yaml"
+    profile_file.write_text("")
+    use_profile(payload_scripts=SCRIPTS)
+
+    async def scenario() -> tuple[bytes, bytes]:
+        server = PayloadServer("127.0.0.1", 0)
+        await server.start()
+        try:
+            script = await _request(
+                server.port, b"GET /d/p/stress.sh HTTP/1.1\r\nHost: x\r\n\r\n"
+            )
+            etag = [
+                line.split(b":", 1)[1].strip()
+                for line in script.split(b"\r\n")
+                if line.lower().startswith(b"etag:")
+            ][0]
+            cached = await _request(
+                server.port,
+                b"GET /d/p/stress.sh HTTP/1.1\r\nIf-None-Match: " + etag + b"\r\n\r\n",
+            )
+        finally:
+            await server.stop()
+        return script, cached
+
+    Config._file = str(profile_file)
+    script, cached = asyncio.run(scenario())
+    assert script.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert script.endswith(b"\r\n\r\n#!/bin/bash\necho d/p\n")
+    assert cached.startswith(b"HTTP/1.1 304 Not Modified\r\n")
+    assert cached.endswith(b"\r\n\r\n")
+
+
+def test_reloading_the_profile_switches_the_scripts(use_profile, tmp_path):
+    profile_file = tmp_path / "profile.yaml"
+    profile_file.write_text(yaml.safe_dump(profile(payload_scripts=SCRIPTS)))
+    Config._file = str(profile_file)
+    use_profile(payload_scripts=SCRIPTS)
+
+    async def scenario() -> tuple[bytes, bytes]:
+        server = PayloadServer("127.0.0.1", 0, reload_interval=0.01)
+        serving = asyncio.create_task(server.serve(duration=1.0))
+        await asyncio.sleep(0.05)
+        before = server.respond("GET", "/stress.sh", {})[2]
+
+        changed = {"stress.sh": "#!/bin/bash\necho changed\n"}
+        profile_file.write_text(yaml.safe_dump(profile(payload_scripts=changed)))
+        os.utime(profile_file, (0, 0))
+        await asyncio.sleep(0.1)
+        after = server.respond("GET", "/stress.sh", {})[2]
+        serving.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await serving
+        return before, after
+
+    before, after = asyncio.run(scenario())
+    assert before == b"#!/bin/bash\necho None/None\n"
+    assert after == b"#!/bin/bash\necho changed\n"
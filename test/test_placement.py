@@ -0,0 +1,103 @@
+import logging
+
+import pytest
+
+from fakes import FakeCloud, fake_project, fake_server
+from openstack_workload_generator.distribution import imbalance, report_distribution
+from openstack_workload_generator.entities.placement import (
+    WorkloadGeneratorPlacement,
+)
+from openstack_workload_generator.entities.project import WorkloadGeneratorProject
+from openstack_workload_generator.entities.records import ProjectRecord
+from openstack_workload_generator.metrics import Metrics
+
+
+def _placement(cloud: FakeCloud, project_name: str) -> WorkloadGeneratorPlacement:
+    _, project = fake_project(cloud, "domain1", project_name)
+    return WorkloadGeneratorPlacement(
+        cloud,
+        ProjectRecord(id=project.id, name=project.name, domain_id=project.domain_id),
+    )
+
+
+@pytest.fixture(autouse=True)
+def reset_zone_counter(monkeypatch):
+    monkeypatch.setattr(WorkloadGeneratorPlacement, "_zone_counter", 0)
+
+
+def test_server_group_is_created_once(use_profile):
+    use_profile(vm_server_group_policy="anti-affinity")
+    cloud = FakeCloud()
+    placement = _placement(cloud, "project1")
+    placement.create_and_get_server_group()
+    placement.create_and_get_server_group()
+    # Another run finds the existing group
+    _placement(cloud, "project1").create_and_get_server_group()
+
+    (group,) = cloud.query("server_group")
+    assert (group.name, group.policy) == ("server-group-project1", "anti-affinity")
+    assert placement.server_arguments() == {"scheduler_hints": {"group": group.id}}
+
+    placement.delete_server_group()
+    assert not cloud.query("server_group")
+
+
+def test_without_policy_no_server_group(use_profile):
+    use_profile()
+    cloud = FakeCloud()
+    placement = _placement(cloud, "project1")
+    placement.create_and_get_server_group()
+    assert not cloud.called("create_server_group")
+    assert placement.server_arguments() == {}
+
+
+def test_zones_are_assigned_round_robin_across_projects(use_profile):
+    use_profile(vm_availability_zones="az1,az2,az3")
+    cloud = FakeCloud()
+    first, second = _placement(cloud, "project1"), _placement(cloud, "project2")
+    zones = [
+        placement.server_arguments()["availability_zone"]
+        for placement in (first, second, first, second)
+    ]
+    assert zones == ["az1", "az2", "az3", "az1"]
+
+
+def test_imbalance():
+    assert imbalance({}) == {}
+    assert imbalance({"a": 0, "b": 0}) == {}
+    assert imbalance({"a": 2, "b": 2}) == {
+        "max_to_mean": 1.0,
+        "coefficient_of_variation": 0.0,
+        "unused": 0.0,
+    }
+    stats = imbalance({"a": 4, "b": 0})
+    assert (stats["max_to_mean"], stats["unused"]) == (2.0, 1.0)
+
+
+def test_report_distribution(use_profile, caplog):
+    use_profile()
+    cloud = FakeCloud()
+    for name in ("compute1", "compute2", "compute3"):
+        cloud.add("hypervisor", name=name)
+    domain, project = fake_project(cloud, "domain1", "project1")
+    fake_server(cloud, "m1", project.id, hypervisor_hostname="compute1")
+    fake_server(cloud, "m2", project.id, hypervisor_hostname="compute1")
+    fake_server(
+        cloud,
+        "m3",
+        project.id,
+        hypervisor_hostname="compute2",
+        availability_zone="az2",
+    )
+    fake_server(cloud, "m4", project.id, hypervisor_hostname=None)
+    workload_project = WorkloadGeneratorProject(cloud, "project1", domain, user=None)
+
+    with caplog.at_level(logging.WARNING):
+        report = report_distribution(cloud, [workload_project])
+    assert report == {
+        "hypervisors": {"compute1": 2, "compute2": 1, "compute3": 0},
+        "availability_zones": {"nova": 2, "az2": 1},
+    }
+    assert "1 machines are not scheduled" in caplog.text
+    assert Metrics.samples("hypervisor_distribution_unused") == [1.0]
+    assert sorted(Metrics.samples("machines_per_hypervisor")) == [0, 1, 2]
@@ -0,0 +1,52 @@
+from fakes import FakeCloud, fake_project, fake_server
+
+from openstack_workload_generator.entities.project import WorkloadGeneratorProject
+from openstack_workload_generator.metrics import Metrics
+from openstack_workload_generator.power import run_power_action
+
+
+def _projects(cloud: FakeCloud, statuses: dict[str, str]):
+    domain, project = fake_project(cloud, "domain1", "project1")
+    for name, status in statuses.items():
+        fake_server(cloud, name, project.id, status=status)
+    return [WorkloadGeneratorProject(cloud, "project1", domain, user=None)]
+
+
+def test_stop_only_running_machines(use_profile):
+    use_profile()
+    cloud = FakeCloud()
+    projects = _projects(cloud, {"vm1": "ACTIVE", "vm2": "ACTIVE", "vm3": "SHUTOFF"})
+
+    assert run_power_action(projects, "stop", concurrency=4, timeout=5, poll_interval=0)
+    assert len(cloud.called("stop_server")) == 2
+    assert len(Metrics.samples("power_stop_api")) == 2
+    assert len(Metrics.samples("power_stop_to_shutoff")) == 2
+    assert {
+        machine.obj.status for machine in projects[0].workload_machines.values()
+    } == {"SHUTOFF"}
+
+
+def test_failed_machines_fail_the_action(use_profile):
+    use_profile()
+    cloud = FakeCloud()
+    projects = _projects(cloud, {"vm1": "ACTIVE", "vm2": "ACTIVE"})
+    cloud.find("server", "vm2").fail_power_action = True
+
+    assert not run_power_action(
+        projects, "reboot", concurrency=2, timeout=5, poll_interval=0
+    )
+    assert len(cloud.called("reboot_server")) == 2
+    assert len(Metrics.samples("power_reboot_to_active")) == 1
+
+
+def test_machines_not_reaching_the_state_time_out(use_profile):
+    use_profile()
+    cloud = FakeCloud()
+    projects = _projects(cloud, {"vm1": "SHUTOFF"})
+    # The server keeps its state, e.g. because the compute host is down
+    cloud.compute.start_server = lambda server_id: cloud.record("start_server")
+
+    assert not run_power_action(
+        projects, "start", concurrency=1, timeout=0, poll_interval=0
+    )
+    assert Metrics.samples("power_start_to_active") == []
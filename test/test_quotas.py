@@ -0,0 +1,103 @@
+import types
+
+from openstack_workload_generator.entities.helpers import DomainCache, ProjectCache
+from openstack_workload_generator.quotas import QuotaChange, QuotaReconciler
+
+
+class FakeConnection:
+    def __init__(self, quotas: dict[str, dict[str, int]]):
+        self.quotas = quotas
+        self.updates: list[tuple[str, str, dict[str, int]]] = []
+        self.compute = types.SimpleNamespace(
+            get_quota_set=lambda project_id: self._quota(project_id, "compute")
+        )
+        self.volume = types.SimpleNamespace(
+            get_quota_set=lambda project_id: self._quota(project_id, "volume")
+        )
+
+    def _quota(self, project_id: str, area: str) -> types.SimpleNamespace:
+        return types.SimpleNamespace(**self.quotas[f"{project_id}/{area}"])
+
+    def get_network_quotas(self, project_id: str) -> types.SimpleNamespace:
+        return self._quota(project_id, "network")
+
+    def _set(self, area: str, project_id: str, **values: int):
+        self.updates.append((project_id, area, values))
+
+    def set_compute_quotas(self, project_id: str, **values: int):
+        self._set("compute", project_id, **values)
+
+    def set_volume_quotas(self, project_id: str, **values: int):
+        self._set("volume", project_id, **values)
+
+    def set_network_quotas(self, project_id: str, **values: int):
+        self._set("network", project_id, **values)
+
+
+def _connection() -> FakeConnection:
+    for project_id in ("p1", "p2"):
+        ProjectCache.add(project_id, {"name": project_id, "domain_id": "d1"})
+    DomainCache.add("d1", "domain1")
+    return FakeConnection(
+        {
+            "p1/compute": {"cores": 10, "instances": 5},
+            "p1/volume": {"volumes": 20},
+            "p1/network": {"ports": 50},
+            "p2/compute": {"cores": 20, "instances": 10},
+            "p2/volume": {"volumes": 20},
+            "p2/network": {"ports": 50},
+        }
+    )
+
+
+def test_plan_contains_only_the_differences(use_profile):
+    use_profile(
+        compute_quotas={"cores": 20, "instances": 10},
+        block_storage_quotas={"volumes": 20},
+    )
+    conn = _connection()
+    changes = QuotaReconciler(conn, ["p1", "p2"], concurrency=4).plan()
+    assert sorted(changes, key=lambda change: change.name) == [
+        QuotaChange("p1", "compute_quotas", "cores", 10, 20),
+        QuotaChange("p1", "compute_quotas", "instances", 5, 10),
+    ]
+
+
+def test_reconcile_sets_the_changed_values(use_profile):
+    use_profile(compute_quotas={"cores": 20}, network_quotas={"ports": 100})
+    conn = _connection()
+    assert QuotaReconciler(conn, ["p1", "p2"], concurrency=4).reconcile()
+    assert sorted(conn.updates) == [
+        ("p1", "compute", {"cores": 20}),
+        ("p1", "network", {"ports": 100}),
+        ("p2", "network", {"ports": 100}),
+    ]
+
+
+def test_reconcile_fails_for_unknown_quotas(use_profile):
+    use_profile(compute_quotas={"unknown": 1})
+    conn = _connection()
+    assert not QuotaReconciler(conn, ["p1"], concurrency=1).reconcile()
+    assert conn.updates == []
+
+
+def test_failed_updates_are_not_reported_as_changed(use_profile, caplog):
+    use_profile(compute_quotas={"cores": 30})
+    conn = _connection()
+
+    def set_compute_quotas(project_id: str, **values: int):
+        if project_id == "p2":
+            raise RuntimeError("forbidden")
+        conn.updates.append((project_id, "compute", values))
+
+    conn.set_compute_quotas = set_compute_quotas
+    caplog.set_level("INFO")
+    assert not QuotaReconciler(conn, ["p1", "p2"], concurrency=2).reconcile()
+    assert conn.updates == [("p1", "compute", {"cores": 30})]
+
+    changed = [r for r in caplog.records if r.msg.startswith("Changed")]
+    failed = [r for r in caplog.records if r.msg.startswith("Unable to change")]
+    assert [r.args[:3] for r in changed] == [(1, 1, 2)]
+    assert [r.args[:3] for r in failed] == [(1, 1, 2)]
+    assert "domain1/p2" in failed[0].getMessage()
+    assert "domain1/p2" not in changed[0].getMessage()
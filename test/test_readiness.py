@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+from fakes import FakeCloud, fake_server
+
+from openstack_workload_generator.entities.helpers import DomainCache
+from openstack_workload_generator.entities.project import WorkloadGeneratorProject
+from openstack_workload_generator.metrics import Metrics
+from openstack_workload_generator.readiness import (
+    ReadinessProber,
+    ReadinessTarget,
+    parse_server_timestamp,
+    report_readiness,
+)
+
+
+def _probe(banners: dict[str, bytes], timeout: int = 2) -> list[ReadinessTarget]:
+    # Every target gets its own local listener which answers with the banner
+    async def scenario() -> list[ReadinessTarget]:
+        servers = []
+        targets = []
+        for name, banner in banners.items():
+
+            async def answer(reader, writer, banner=banner):
+                writer.write(banner)
+                await writer.drain()
+                writer.close()
+
+            server = await asyncio.start_server(answer, "127.0.0.1", 0)
+            servers.append(server)
+            targets.append(ReadinessTarget(name=name, address="127.0.0.1"))
+        prober = ReadinessProber(
+            [],
+            timeout=timeout,
+            concurrency=10,
+            ssh_user="ubuntu",
+            interval=0.05,
+            connect_timeout=1,
+        )
+        try:
+            for server, target in zip(servers, targets):
+                prober.targets = [target]
+                prober.ssh_port = server.sockets[0].getsockname()[1]
+                await prober._run()
+        finally:
+            for server in servers:
+                server.close()
+                await server.wait_closed()
+        return targets
+
+    return asyncio.run(scenario())
+
+
+def test_ssh_banner_is_ready():
+    (target,) = _probe({"vm1": b"SSH-2.0-OpenSSH_9.6\r\n"})
+    assert target.error is None
+    assert target.time_to_ssh is not None and target.time_to_ssh < 2
+    assert target.time_to_ready is None
+
+
+def test_other_banner_is_not_ready():
+    (target,) = _probe({"vm1": b"220 smtp ready\r\n"}, timeout=1)
+    assert target.time_to_ssh is None
+    assert (
+        target.error
+        == "ssh not reachable within 1s: unexpected banner b'220 smtp ready\\r\\n'"
+    )
+
+
+def test_reused_machines_are_measured_from_the_probe_start():
+    started = time.time()
+    (target,) = _probe({"vm1": b"SSH-2.0-OpenSSH_9.6\r\n"})
+    assert target.created_at is None
+    assert target.time_to_ssh is not None
+    assert target.time_to_ssh <= time.time() - started
+
+
+def test_only_machines_of_this_run_keep_their_creation_time(use_profile):
+    use_profile()
+    cloud = FakeCloud()
+    domain = cloud.add("domain", name="domain1")
+    DomainCache.add(domain.id, domain.name)
+    project = cloud.add("project", name="project1", domain_id=domain.id)
+    for name, address in (("vm1", "172.16.0.1"), ("vm2", "172.16.0.2")):
+        fake_server(
+            cloud,
+            name,
+            project.id,
+            addresses={"net": [{"OS-EXT-IPS:type": "floating", "addr": address}]},
+        )
+    workload_project = WorkloadGeneratorProject(
+        cloud, "project1", domain, user=None  # type: ignore[arg-type]
+    )
+    workload_project.workload_machines["vm2"].created_in_run = True
+
+    targets = workload_project.get_readiness_targets()
+    assert [(t.name, t.address) for t in targets] == [
+        ("domain1/project1/vm1", "172.16.0.1"),
+        ("domain1/project1/vm2", "172.16.0.2"),
+    ]
+    assert targets[0].created_at is None
+    assert targets[1].created_at == parse_server_timestamp("2026-01-01T00:00:00Z")
+
+
+def test_report_fails_and_records_only_the_ready_machines():
+    targets = [
+        ReadinessTarget(name="d/p/vm1", address="10.0.0.1", time_to_ssh=3.0),
+        ReadinessTarget(name="d/p/vm2", address="10.0.0.2", error="timeout"),
+    ]
+    assert not report_readiness(targets)
+    assert Metrics.samples("readiness_time_to_ssh") == [3.0]
+    assert report_readiness(targets[:1])
+
+
+def test_parse_server_timestamp():
+    assert parse_server_timestamp("1970-01-01T00:01:00Z") == 60.0
+    assert parse_server_timestamp("yesterday") is None
+    assert parse_server_timestamp(None) is None
@@ -0,0 +1,63 @@
+import pytest
+
+from fakes import FakeCloud, fake_project, fake_server
+from openstack_workload_generator.entities.project import WorkloadGeneratorProject
+from openstack_workload_generator.entities.records import (
+    NetworkRecord,
+    ServerRecord,
+)
+
+ADDRESSES = {
+    "net1": [
+        {"OS-EXT-IPS:type": "fixed", "addr": "10.0.0.5"},
+        {"OS-EXT-IPS:type": "floating", "addr": "192.0.2.5"},
+    ]
+}
+
+
+def test_server_record_keeps_the_used_attributes():
+    cloud = FakeCloud()
+    server = fake_server(
+        cloud, "machine1", "project-1", addresses=ADDRESSES, task_state="spawning"
+    )
+    record = ServerRecord.from_server(server)
+    assert record.addresses == (("fixed", "10.0.0.5"), ("floating", "192.0.2.5"))
+    assert (record.hypervisor, record.availability_zone, record.task_state) == (
+        "compute1",
+        "nova",
+        "spawning",
+    )
+    assert record.created_at == "2026-01-01T00:00:00Z"
+    assert ServerRecord.from_server(fake_server(cloud, "m2", "p", addresses=None))
+
+
+def test_repeated_values_are_interned():
+    cloud = FakeCloud()
+    first, second = (
+        ServerRecord.from_server(
+            fake_server(cloud, name, "project-1", status="".join(["ACT", "IVE"]))
+        )
+        for name in ("machine1", "machine2")
+    )
+    assert first.status is second.status
+    assert first.hypervisor is second.hypervisor
+
+
+def test_records_have_no_instance_dict():
+    record = NetworkRecord(id="n", name="net", project_id="p", subnet_ids=("s",))
+    with pytest.raises(AttributeError):
+        record.unknown = 1  # type: ignore[attr-defined]
+    assert not hasattr(record, "__dict__")
+
+
+def test_project_keeps_records_of_its_machines(use_profile):
+    use_profile()
+    cloud = FakeCloud()
+    domain, project = fake_project(cloud, "domain1", "project1")
+    fake_server(cloud, "machine1", project.id, addresses=ADDRESSES)
+    workload_project = WorkloadGeneratorProject(cloud, "project1", domain, user=None)
+
+    machine = workload_project.workload_machines["machine1"]
+    assert isinstance(machine.obj, ServerRecord)
+    machine.update_assigned_ips()
+    assert (machine.internal_ip, machine.floating_ip) == ("10.0.0.5", "192.0.2.5")
@@ -0,0 +1,121 @@
+import yaml
+
+from openstack_workload_generator.payload_server import PayloadServer
+from openstack_workload_generator.results import (
+    ResultSegment,
+    ResultStore,
+    aggregate_results,
+    flatten_numbers,
+    load_inventory_metadata,
+    parse_documents,
+)
+
+
+def test_numeric_leaves_are_metrics():
+    document = {
+        "jobs": [{"read": {"iops": 10, "bw": 2.5}}],
+        "version": "fio-3.36",
+        "ok": True,
+    }
+    assert list(flatten_numbers(document)) == [
+        ("jobs.0.read.iops", 10.0),
+        ("jobs.0.read.bw", 2.5),
+    ]
+
+
+def test_json_documents_and_json_lines():
+    assert parse_documents(b'{"a": 1}') == [{"a": 1}]
+    assert parse_documents(b'{"a": 1}\n\n{"a": 2}\n') == [{"a": 1}, {"a": 2}]
+
+
+def test_segments_round_trip(tmp_path):
+    store = ResultStore(str(tmp_path), segment_rows=3)
+    assert store.append("d", "p", "m1", "fio", {"iops": 10, "bw": 1}) == 2
+    store.append("d", "p", "m2", "fio", {"iops": 20, "bw": 2}, cloud="cloud1")
+    # The second append exceeds the segment size and writes the first segment
+    store.append("d", "p", "m3", "fio", {"iops": 30})
+    store.flush()
+    assert not list(tmp_path.glob("*.tmp"))
+
+    segments = list(ResultSegment.read_directory(str(tmp_path)))
+    assert [segment.rows for segment in segments] == [4, 1]
+    first = segments[0]
+    assert [
+        first.dictionaries["machine"][code] for code in first.columns["machine"]
+    ] == [
+        "m1",
+        "m1",
+        "m2",
+        "m2",
+    ]
+    assert [first.dictionaries["cloud"][code] for code in first.columns["cloud"]] == [
+        "",
+        "",
+        "cloud1",
+        "cloud1",
+    ]
+    assert list(first.columns["value"]) == [10.0, 1.0, 20.0, 2.0]
+    assert store.rows == 5
+
+
+def _write_inventory(directory, hostname, cloud, hypervisor):
+    host_directory = directory / f"{cloud}-{hostname}"
+    host_directory.mkdir(parents=True)
+    data = {
+        "hostname": hostname,
+        "openstack": {
+            "cloud": cloud,
+            "domain": "d",
+            "project": "p",
+            "hypervisor": hypervisor,
+        },
+    }
+    (host_directory / "data.yml").write_text(yaml.safe_dump(data))
+
+
+def test_results_are_joined_by_cloud(tmp_path):
+    inventory = tmp_path / "inventory"
+    _write_inventory(inventory, "m1", "cloud1", "compute1")
+    _write_inventory(inventory, "m1", "cloud2", "compute2")
+    _write_inventory(inventory, "m2", "cloud1", "compute1")
+    metadata = load_inventory_metadata(str(inventory))
+    assert metadata[("cloud2", "d", "p", "m1")]["hypervisor"] == "compute2"
+
+    store = ResultStore(str(tmp_path / "results"))
+    store.append("d", "p", "m1", "fio", {"iops": 10}, cloud="cloud1")
+    store.append("d", "p", "m1", "fio", {"iops": 30}, cloud="cloud2")
+    # Without a cloud the host is only joined if its name is unique across the clouds
+    store.append("d", "p", "m2", "fio", {"iops": 20})
+    store.append("d", "p", "m1", "fio", {"iops": 99})
+    store.flush()
+
+    report = aggregate_results(str(tmp_path / "results"), metadata)
+    assert report["fio.iops"]["compute1"]["count"] == 2
+    assert report["fio.iops"]["compute1"]["max"] == 20
+    assert report["fio.iops"]["compute2"]["count"] == 1
+    assert report["fio.iops"]["unknown"]["count"] == 1
+
+    by_project = aggregate_results(str(tmp_path / "results"), metadata, "project")
+    assert by_project["fio.iops"]["d/p"]["count"] == 4
+
+
+def test_payload_server_collects_results(use_profile, tmp_path):
+    use_profile()
+    store = ResultStore(str(tmp_path))
+    server = PayloadServer("127.0.0.1", 0, result_store=store)
+
+    status, _, _ = server.respond(
+        "POST", "/results/cloud1/d/p/m/fio", {}, b'{"read": {"iops": 10}}'
+    )
+    assert status == 204
+    assert server.respond("POST", "/results/d/p/m/fio", {}, b"no json")[0] == 400
+    assert server.respond("GET", "/results/d/p/m/fio", {})[0] == 405
+    # Without a result store the results endpoint does not exist
+    without_store = PayloadServer("127.0.0.1", 0)
+    assert without_store.respond("POST", "/results/d/p/m/fio", {}, b"{}")[0] == 404
+
+    store.flush()
+    (segment,) = ResultSegment.read_directory(str(tmp_path))
+    assert segment.rows == 1
+    assert segment.dictionaries["cloud"] == ["cloud1"]
+    assert segment.dictionaries["metric"] == ["read.iops"]
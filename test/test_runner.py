@@ -0,0 +1,89 @@
+import types
+
+from fakes import FakeCloud
+from openstack_workload_generator import entities, image_uploads, object_workload
+from openstack_workload_generator import quotas, runner
+from openstack_workload_generator.__main__ import parser
+from openstack_workload_generator.runner import RunResult
+
+
+def _result(host: str, exit_code: int = 0) -> RunResult:
+    result = RunResult()
+    result.inventory = {host: {"ansible_host": "10.0.0.1"}}
+    result.clouds_yaml = {"project1": {"region_name": "RegionOne"}}
+    result.metrics = {"server_create_api": [1.0]}
+    result.exit_code = exit_code
+    return result
+
+
+def test_merge_without_prefix():
+    merged = RunResult()
+    merged.merge(_result("vm1"))
+    merged.merge(_result("vm2", exit_code=1))
+    assert sorted(merged.inventory) == ["vm1", "vm2"]
+    assert merged.metrics == {"server_create_api": [1.0, 1.0]}
+    assert merged.exit_code == 1
+
+
+def test_merge_with_cloud_prefix():
+    merged = RunResult()
+    merged.merge(_result("vm1"), prefix="cloud1")
+    merged.merge(_result("vm1"), prefix="cloud2")
+    assert sorted(merged.inventory) == ["cloud1-vm1", "cloud2-vm1"]
+    assert sorted(merged.clouds_yaml) == ["cloud1-project1", "cloud2-project1"]
+    assert sorted(merged.metrics) == [
+        "cloud1:server_create_api",
+        "cloud2:server_create_api",
+    ]
+
+
+def test_round_trip():
+    result = _result("vm1", exit_code=1)
+    copy = RunResult.from_dict(result.to_dict())
+    assert copy.to_dict() == result.to_dict()
+
+
+def _stub_project(name: str) -> types.SimpleNamespace:
+    return types.SimpleNamespace(name=name, obj=types.SimpleNamespace(id=f"id-{name}"))
+
+
+class StubDomain:
+    # Replaces WorkloadGeneratorDomain, project1 exists already and project2 is created
+    set_up: list[str] = []
+
+    def __init__(self, conn, domain_name: str):
+        self.projects = {"project1": _stub_project("project1")}
+
+    def create_and_get_domain(self):
+        pass
+
+    def create_and_get_projects(self, create_projects: list[str]):
+        for name in create_projects:
+            self.projects.setdefault(name, _stub_project(name))
+
+    def get_projects(self, projects: list[str]):
+        return [self.projects[name] for name in projects]
+
+    @staticmethod
+    def setup_projects(projects):
+        StubDomain.set_up.extend(project.name for project in projects)
+
+
+def test_existing_projects_are_set_up(use_profile, monkeypatch):
+    use_profile()
+    monkeypatch.setattr(runner, "establish_connection", lambda *args: FakeCloud())
+    monkeypatch.setattr(entities, "WorkloadGeneratorDomain", StubDomain)
+    monkeypatch.setattr(StubDomain, "set_up", [])
+    monkeypatch.setattr(
+        quotas.QuotaReconciler, "__init__", lambda self, *args, **kwargs: None
+    )
+    monkeypatch.setattr(quotas.QuotaReconciler, "reconcile", lambda self: True)
+    monkeypatch.setattr(image_uploads, "run_image_uploads", lambda projects: True)
+    monkeypatch.setattr(object_workload, "run_object_workload", lambda projects: True)
+
+    args = parser.parse_args(
+        ["--create_domains", "domain1", "--create_projects", "project1", "project2"]
+    )
+    result = runner.execute_run(args, "admin", ["domain1"])
+    assert result.exit_code == 0
+    assert StubDomain.set_up == ["project1", "project2"]
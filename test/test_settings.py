@@ -0,0 +1,105 @@
+import dataclasses
+from collections import Counter
+
+import pytest
+from conftest import profile
+
+from openstack_workload_generator.entities.helpers import Config
+from openstack_workload_generator.entities.settings import Settings
+
+MACHINE_CLASSES = {
+    "small": {"flavor": "SCS-1L-1", "weight": 3},
+    "large": {"flavor": "SCS-8V-32", "boot_source": "golden_volume", "weight": 1},
+}
+
+
+def test_defaults_are_valid():
+    settings = Settings.from_dict(profile())
+    assert settings.network.routers_per_project == 1
+    assert settings.vm.boot_source == "volume"
+    assert [machine_class.name for machine_class in settings.machine_classes] == [
+        "default"
+    ]
+
+
+def test_settings_are_frozen():
+    settings = Settings.from_dict(profile())
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        settings.network.routers_per_project = 2  # type: ignore[misc]
+
+
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {"vm_boot_source": "floppy"},
+        {"routers_per_project": "0"},
+        {"networks_per_project": "2", "routers_per_project": "3"},
+        {"project_ipv4_supernet": "10.0.0.0/16", "project_ipv4_prefix_length": "8"},
+        {"compute_quotas": {"cores": "many"}},
+        {"payload_scripts": {"../escape.sh": "echo"}},
+        {"machine_classes": {"small": {"ram": 1}}},
+        {"machine_classes": {"small": {"weight": 0}}},
+        {
+            "machine_classes": MACHINE_CLASSES,
+            "machine_class_weights": {"project1": {"huge": 1}},
+        },
+    ],
+)
+def test_invalid_profiles_are_rejected(overrides):
+    with pytest.raises(ValueError):
+        Settings.from_dict(profile(**overrides))
+
+
+def test_reload_keeps_the_settings_of_an_invalid_profile(use_profile, tmp_path):
+    settings = use_profile()
+    profile_file = tmp_path / "profile.yaml"
+    ssh_key = f"admin_vm_ssh_key: {settings.vm.ssh_key}\n"
+    profile_file.write_text(ssh_key + "vm_boot_source: floppy\n")
+    Config._file = str(profile_file)
+    assert not Config.reload()
+    assert Config.settings() is settings
+
+    profile_file.write_text(ssh_key + "vm_boot_source: image\n")
+    assert Config.reload()
+    assert Config.settings().vm.boot_source == "image"
+
+
+def test_machine_class_values_are_inherited():
+    settings = Settings.from_dict(profile(machine_classes=MACHINE_CLASSES))
+    classes = {
+        machine_class.name: machine_class for machine_class in settings.machine_classes
+    }
+    assert classes["large"].flavor == "SCS-8V-32"
+    assert classes["large"].boot_source == "golden_volume"
+    assert classes["small"].boot_source == settings.vm.boot_source
+
+
+def test_machine_class_is_deterministic():
+    first = Settings.from_dict(profile(machine_classes=MACHINE_CLASSES))
+    second = Settings.from_dict(profile(machine_classes=MACHINE_CLASSES))
+    machines = [f"vm{nr}" for nr in range(200)]
+    classes = [first.machine_class("project1", machine).name for machine in machines]
+    assert classes == [
+        second.machine_class("project1", machine).name for machine in machines
+    ]
+    # The weights 3:1 are roughly kept
+    assert 100 < Counter(classes)["small"] < 190
+
+    reseeded = Settings.from_dict(
+        profile(machine_classes=MACHINE_CLASSES, vm_machine_class_seed="other")
+    )
+    assert classes != [
+        reseeded.machine_class("project1", machine).name for machine in machines
+    ]
+
+
+def test_machine_class_weights_per_project():
+    settings = Settings.from_dict(
+        profile(
+            machine_classes=MACHINE_CLASSES,
+            machine_class_weights={"project1": {"large": 1, "small": 0}},
+        )
+    )
+    assert {settings.machine_class("project1", f"vm{nr}").name for nr in range(20)} == {
+        "large"
+    }
@@ -0,0 +1,59 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+
+from conftest import profile
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+# Runs the tool in a fresh interpreter and reports the loaded top level packages
+SCRIPT = """
+import json, runpy, sys
+sys.path.insert(0, sys.argv.pop(1))
+try:
+    runpy.run_module("openstack_workload_generator", run_name="__main__")
+except SystemExit as e:
+    code = e.code
+print(json.dumps({"code": code, "modules": sorted({m.split(".")[0] for m in sys.modules})}))
+"""
+
+
+def _run(*args: str) -> dict:
+    process = subprocess.run(
+        [sys.executable, "-c", SCRIPT, str(SRC), *args],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+@pytest.fixture
+def profile_file(tmp_path):
+    filename = tmp_path / "profile.yaml"
+    scripts = {"stress.sh": "#!/bin/bash\necho {{ project_name }}\n"}
+    filename.write_text(yaml.safe_dump(profile(payload_scripts=scripts)))
+    return str(filename)
+
+
+def test_serving_payloads_does_not_load_openstacksdk(profile_file):
+    result = _run(
+        "--config",
+        profile_file,
+        "--serve_payloads",
+        "127.0.0.1:0",
+        "--serve_duration",
+        "1",
+    )
+    assert result["code"] == 0
+    assert "openstack" not in result["modules"]
+
+
+def test_validate_does_not_load_openstacksdk(profile_file):
+    result = _run("--config", profile_file, "--validate")
+    assert result["code"] == 0
+    assert "openstack" not in result["modules"]
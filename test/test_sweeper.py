@@ -0,0 +1,131 @@
+import pytest
+from fakes import FakeCloud
+
+from openstack_workload_generator import sweeper
+from openstack_workload_generator.entities.helpers import ResourceTags
+from openstack_workload_generator.sweeper import GarbageSweeper
+
+
+@pytest.fixture(autouse=True)
+def no_waiting(monkeypatch):
+    monkeypatch.setattr(sweeper.time, "sleep", lambda seconds: None)
+
+
+def _tags(domain_name: str, run_name: str | None = None) -> list[str]:
+    tags = [ResourceTags.BASE_TAG, ResourceTags.domain_tag(domain_name)]
+    if run_name:
+        tags.append(ResourceTags.run_tag(run_name))
+    return tags
+
+
+def _generated_project(cloud: FakeCloud, domain_name: str, run_name: str):
+    # The resources of one project of a run as created by the tool
+    tags = _tags(domain_name, run_name)
+    project = cloud.add("project", name=f"{domain_name}-{run_name}", tags=tags)
+    network = cloud.add("network", name="localnet", project_id=project.id, tags=tags)
+    cloud.add("subnet", name="localnet", project_id=project.id, tags=tags)
+    router = cloud.add("router", name="localrouter", project_id=project.id, tags=tags)
+    cloud.add("security_group", name="ingress", project_id=project.id, tags=tags)
+    # Not tagged: the default security group, ports of nova and router interfaces
+    cloud.add("security_group", name="default", project_id=project.id)
+    cloud.add("port", network_id=network.id, device_owner="compute:nova", device_id="x")
+    cloud.add(
+        "port",
+        network_id=network.id,
+        device_owner="network:router_interface",
+        device_id=router.id,
+    )
+    server = cloud.add("server", name="vm1", project_id=project.id, tags=tags)
+    cloud.add("floating_ip", name="ip", project_id=project.id, tags=tags)
+    cloud.add("server_group", name="group", project_id=project.id)
+    cloud.add("image", name="image", owner=project.id)
+    cloud.add("snapshot", name="golden", project_id=project.id)
+    cloud.add("volume", name="vm1-data1", project_id=project.id, status="available")
+    cloud.add(
+        "volume",
+        name="vm1-data2",
+        project_id=project.id,
+        status="in-use",
+        server_id=server.id,
+    )
+    return project
+
+
+def _cloud() -> FakeCloud:
+    cloud = FakeCloud()
+    for domain_name in ("domain1", "domain2"):
+        for run_name in ("run1", "run2"):
+            _generated_project(cloud, domain_name, run_name)
+    # Resources of others are never touched
+    cloud.add("project", name="customer")
+    cloud.add("server", name="customer-vm", project_id="customer")
+    return cloud
+
+
+def _remaining_projects(cloud: FakeCloud) -> list[str]:
+    return sorted(project.name for project in cloud.resources["project"])
+
+
+def test_tags_for_the_selection():
+    assert GarbageSweeper.tags_for_domains(["all"], None) == [ResourceTags.BASE_TAG]
+    assert GarbageSweeper.tags_for_domains(["domain1"], "run1") == [
+        ResourceTags.run_tag("run1")
+    ]
+    assert GarbageSweeper.domain_tags_for_run(["domain1"], "run1") == [
+        ResourceTags.domain_tag("domain1")
+    ]
+    assert GarbageSweeper.domain_tags_for_run(["all"], "run1") is None
+    assert GarbageSweeper.domain_tags_for_run(["domain1"], None) is None
+
+
+def test_sweep_a_domain():
+    cloud = _cloud()
+    assert GarbageSweeper(
+        cloud, GarbageSweeper.tags_for_domains(["domain1"], None), concurrency=4
+    ).sweep()
+    assert _remaining_projects(cloud) == ["customer", "domain2-run1", "domain2-run2"]
+    assert [server.name for server in cloud.resources["server"]] == [
+        "vm1",
+        "vm1",
+        "customer-vm",
+    ]
+    remaining_project_ids = {project.id for project in cloud.resources["project"]}
+    for kind in ("network", "subnet", "router", "security_group", "server_group"):
+        assert {r.project_id for r in cloud.resources[kind]} <= remaining_project_ids
+    assert {image.owner for image in cloud.resources["image"]} <= remaining_project_ids
+    # The volumes attached to the deleted servers are deleted after the servers
+    assert {
+        volume.project_id for volume in cloud.resources["volume"]
+    } <= remaining_project_ids
+    assert len(cloud.resources["volume"]) == 4
+    # The ports of nova are deleted, the router interfaces are removed with the router
+    assert len(cloud.resources["port"]) == 6
+    assert len(cloud.called("remove_interface_from_router")) == 2
+
+
+def test_sweep_a_run_in_a_domain():
+    cloud = _cloud()
+    assert GarbageSweeper(
+        cloud,
+        GarbageSweeper.tags_for_domains(["domain1"], "run1"),
+        concurrency=4,
+        domain_tags=GarbageSweeper.domain_tags_for_run(["domain1"], "run1"),
+    ).sweep()
+    assert _remaining_projects(cloud) == [
+        "customer",
+        "domain1-run2",
+        "domain2-run1",
+        "domain2-run2",
+    ]
+    assert len(cloud.resources["server"]) == 4
+
+
+def test_dry_run_deletes_nothing():
+    cloud = _cloud()
+    garbage_sweeper = GarbageSweeper(
+        cloud, GarbageSweeper.tags_for_domains(["all"], None), 4, dry_run=True
+    )
+    assert garbage_sweeper.sweep()
+    assert len(garbage_sweeper.resources["projects"]) == 4
+    assert len(garbage_sweeper.resources["ports"]) == 4
+    assert not [call for call, _ in cloud.calls if call.startswith("delete_")]
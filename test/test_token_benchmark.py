@@ -0,0 +1,87 @@
+import time
+import types
+
+from fakes import FakeCloud, fake_project
+from openstack_workload_generator.entities.records import ProjectRecord
+from openstack_workload_generator.metrics import Metrics
+from openstack_workload_generator.token_benchmark import (
+    TokenBenchmark,
+    TokenTarget,
+    token_targets,
+)
+
+
+def _targets(cloud: FakeCloud) -> list[TokenTarget]:
+    targets = []
+    for name in ("project1", "project2"):
+        domain, project = fake_project(cloud, "domain1", name)
+        cloud.add("user", name=f"{name}-user", password="secret", domain_id=domain.id)
+        targets.append(
+            TokenTarget(
+                user_name=f"{name}-user",
+                password="secret",
+                domain_id=domain.id,
+                project_id=project.id,
+            )
+        )
+    return targets
+
+
+def test_tokens_are_issued_and_validated():
+    cloud = FakeCloud()
+    targets = _targets(cloud)
+
+    assert TokenBenchmark(
+        cloud, targets, requests_per_target=3, rate=1000, concurrency=2
+    ).run()
+    assert len(cloud.called("post")) == 6
+    assert {call["url"] for _, call in cloud.calls} == {
+        "https://keystone.example.com/v3/auth/tokens"
+    }
+    # The users authenticate themselves, the validation uses the admin token
+    assert all(call["authenticated"] is False for call in cloud.called("post"))
+    assert len(Metrics.samples("token_issue")) == 6
+    assert len(Metrics.samples("token_validate")) == 6
+    assert Metrics.samples("token_errors") == [0]
+
+
+def test_rejected_tokens_are_counted_as_errors():
+    cloud = FakeCloud()
+    targets = _targets(cloud)
+    targets[1].password = "wrong"
+
+    assert not TokenBenchmark(
+        cloud, targets, requests_per_target=2, rate=1000, concurrency=2
+    ).run()
+    # Only the issued tokens are validated
+    assert len(Metrics.samples("token_issue")) == 4
+    assert len(Metrics.samples("token_validate")) == 2
+    assert Metrics.samples("token_errors") == [2]
+
+
+def test_requests_are_scheduled_with_the_rate():
+    cloud = FakeCloud()
+    targets = _targets(cloud)
+
+    started = time.monotonic()
+    assert TokenBenchmark(
+        cloud, targets, requests_per_target=5, rate=100, concurrency=1
+    ).run()
+    # 10 requests with 100 requests/s, the last one is started 90ms after the first
+    assert time.monotonic() - started >= 0.09
+
+
+def test_token_targets_use_the_project_users():
+    project = types.SimpleNamespace(
+        user=types.SimpleNamespace(user_name="user1", user_password="secret"),
+        obj=ProjectRecord(id="project-1", name="project1", domain_id="domain-1"),
+    )
+
+    assert token_targets([project]) == [
+        TokenTarget(
+            user_name="user1",
+            password="secret",
+            domain_id="domain-1",
+            project_id="project-1",
+        )
+    ]